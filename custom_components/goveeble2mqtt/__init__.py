@@ -2,13 +2,48 @@
 from __future__ import annotations
 from homeassistant.components import bluetooth
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.discovery import async_load_platform
+import voluptuous as vol
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
 from homeassistant.const import Platform
-from .const import DOMAIN
+from .const import (
+    DOMAIN,
+    CONF_DEVICES,
+    CONF_WARMUP_BUDGET,
+    CONF_WARMUP_WAVE_SIZE,
+    DEFAULT_WARMUP_BUDGET,
+    DEFAULT_WARMUP_WAVE_SIZE,
+    CONF_SYNC,
+    CONF_SYNC_MIN_INTERVAL,
+    CONF_SYNC_MAX_INTERVAL,
+    CONF_SYNC_AIRTIME_BUDGET,
+    DEFAULT_SYNC_MIN_INTERVAL,
+    DEFAULT_SYNC_MAX_INTERVAL,
+    DEFAULT_SYNC_AIRTIME_BUDGET,
+    CONF_STREAM_TIMEOUT,
+    DEFAULT_STREAM_TIMEOUT,
+    CONF_RECORD,
+    CONF_TRACE,
+    CONF_STATE_WRITE_INTERVAL,
+    DEFAULT_STATE_WRITE_INTERVAL,
+    CONF_DEBOUNCE_WINDOW,
+    DEFAULT_DEBOUNCE_WINDOW,
+    CONF_COMMAND_TTL,
+    CONF_SYNCHRONIZED,
+    SERVICE_DUMP_TRACE,
+    SERVICE_CAPTURE_SCENE,
+    SERVICE_ACTIVATE_SCENE,
+    SERVICE_DELETE_SCENE,
+    SERVICE_START_EFFECT,
+    SERVICE_STOP_EFFECT,
+)
+from .effects import DEFAULT_CHASE_WIDTH, DEFAULT_PERIOD, EFFECTS
 from .govee_controller import GoveeBluetoothController
 from .govee_ble_light import Client
 from .govee2mqtt import Govee2Mqtt
+from .tracing import TRACER
 
 import logging
 _LOGGER = logging.getLogger(__name__)
@@ -31,10 +66,127 @@ async def async_setup(hass: HomeAssistant, config: dict) -> bool:
         "mqtt_port": mqtt_port,
         "mqtt_user": mqtt_user,
         "mqtt_password": mqtt_password,
+        "mqtt_v5": config[DOMAIN].get("mqtt_v5", False),
+        "devices": config[DOMAIN].get(CONF_DEVICES, []),
+        "warmup_budget": config[DOMAIN].get(CONF_WARMUP_BUDGET, DEFAULT_WARMUP_BUDGET),
+        "warmup_wave_size": config[DOMAIN].get(CONF_WARMUP_WAVE_SIZE, DEFAULT_WARMUP_WAVE_SIZE),
+        "sync": config[DOMAIN].get(CONF_SYNC, False),
+        "sync_min_interval": config[DOMAIN].get(CONF_SYNC_MIN_INTERVAL, DEFAULT_SYNC_MIN_INTERVAL),
+        "sync_max_interval": config[DOMAIN].get(CONF_SYNC_MAX_INTERVAL, DEFAULT_SYNC_MAX_INTERVAL),
+        "sync_airtime_budget": config[DOMAIN].get(CONF_SYNC_AIRTIME_BUDGET, DEFAULT_SYNC_AIRTIME_BUDGET),
+        "stream_timeout": config[DOMAIN].get(CONF_STREAM_TIMEOUT, DEFAULT_STREAM_TIMEOUT),
+        "record": config[DOMAIN].get(CONF_RECORD),
+        "state_write_interval": config[DOMAIN].get(CONF_STATE_WRITE_INTERVAL, DEFAULT_STATE_WRITE_INTERVAL),
+        "debounce_window": config[DOMAIN].get(CONF_DEBOUNCE_WINDOW, DEFAULT_DEBOUNCE_WINDOW),
+        "command_ttl": config[DOMAIN].get(CONF_COMMAND_TTL),
+        "synchronized": config[DOMAIN].get(CONF_SYNCHRONIZED, False),
     }
 
+    TRACER.enabled = config[DOMAIN].get(CONF_TRACE, False)
+
+    async def _async_dump_trace(call: ServiceCall) -> ServiceResponse:
+        """Return the buffered trace events of one or all lights."""
+        address = call.data.get("address")
+        return {"devices": TRACER.dump(address.upper() if address else None)}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_DUMP_TRACE,
+        _async_dump_trace,
+        schema=vol.Schema({vol.Optional("address"): cv.string}),
+        supports_response=SupportsResponse.ONLY,
+    )
+
     main = Govee2Mqtt(hass)
+    hass.data[DOMAIN]["bridge"] = main
+
+    async def _async_capture_scene(call: ServiceCall) -> ServiceResponse:
+        """Snapshot the acknowledged state of the given or all lights."""
+        return main.capture_scene(call.data["name"], call.data.get("addresses"))
+
+    async def _async_activate_scene(call: ServiceCall) -> ServiceResponse:
+        """Restore a scene snapshot and return how long it took."""
+        synchronized = call.data.get("synchronized", hass.data[DOMAIN]["synchronized"])
+        if (activation := await main.async_activate_scene(call.data["name"], synchronized)) is None:
+            raise HomeAssistantError(f"Unknown scene: {call.data['name']}")
+        return activation
+
+    async def _async_delete_scene(call: ServiceCall) -> None:
+        """Delete a scene snapshot."""
+        if not main.scenes.remove(call.data["name"]):
+            raise HomeAssistantError(f"Unknown scene: {call.data['name']}")
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CAPTURE_SCENE,
+        _async_capture_scene,
+        schema=vol.Schema({
+            vol.Required("name"): cv.string,
+            vol.Optional("addresses"): vol.All(cv.ensure_list, [cv.string]),
+        }),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_ACTIVATE_SCENE,
+        _async_activate_scene,
+        schema=vol.Schema({
+            vol.Required("name"): cv.string,
+            vol.Optional("synchronized"): cv.boolean,
+        }),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_DELETE_SCENE,
+        _async_delete_scene,
+        schema=vol.Schema({vol.Required("name"): cv.string}),
+    )
+
+    async def _async_start_effect(call: ServiceCall) -> ServiceResponse:
+        """Run an effect over the given or all lights."""
+        unknown = main.start_effect(
+            call.data.get("name", call.data["effect"]),
+            call.data["effect"],
+            call.data.get("addresses"),
+            period=call.data["period"],
+            rgb_color=call.data.get("rgb_color"),
+            kelvin=call.data.get("color_temp_kelvin"),
+            width=call.data["width"],
+        )
+        return {"unknown": unknown}
+
+    async def _async_stop_effect(call: ServiceCall) -> ServiceResponse:
+        """Stop one or every effect and return the engine statistics."""
+        return main.effects.stop(call.data.get("name"))
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_START_EFFECT,
+        _async_start_effect,
+        schema=vol.Schema({
+            vol.Required("effect"): vol.In(EFFECTS),
+            vol.Optional("name"): cv.string,
+            vol.Optional("addresses"): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional("period", default=DEFAULT_PERIOD): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+            vol.Exclusive("rgb_color", "color"): vol.All(vol.Coerce(tuple), vol.ExactSequence((cv.byte,) * 3)),
+            vol.Exclusive("color_temp_kelvin", "color"): cv.positive_int,
+            vol.Optional("width", default=DEFAULT_CHASE_WIDTH): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+        }),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_STOP_EFFECT,
+        _async_stop_effect,
+        schema=vol.Schema({vol.Optional("name"): cv.string}),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
     hass.async_create_task(main.async_start())
+    # The light entities and their controller come with config entries, the
+    # configured lights of the bridge still get their presence sensors
+    hass.async_create_task(async_load_platform(hass, Platform.SENSOR, DOMAIN, {}, config))
 
     return True
 
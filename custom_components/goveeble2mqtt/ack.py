@@ -0,0 +1,95 @@
+"""Match Govee notification frames to the commands they acknowledge."""
+
+from __future__ import annotations
+import asyncio
+import logging
+from collections import deque
+
+from .protocol import frame_key, is_valid_frame
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AckTracker:
+    """Track in-flight frames for one light until the light answers them.
+
+    Govee lights answer every 0x33 command and 0xAA query on the notify
+    characteristic with a frame that starts with the same head and command
+    byte. Replies arrive in order, so frames waiting on the same key are
+    resolved first in, first out.
+    """
+
+    def __init__(self, timeout: float = 1.0) -> None:
+        """Initialize the tracker."""
+        self.timeout = timeout
+        self.enabled = False # set once notifications are subscribed
+        self._in_flight: dict[tuple[int, int], deque[asyncio.Future]] = {}
+        self.acked = 0
+        self.timeouts = 0
+        self.unsolicited = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Return the number of frames waiting for a reply."""
+        return sum(len(futures) for futures in self._in_flight.values())
+
+    def expect(self, frame: bytes) -> asyncio.Future:
+        """Register a frame that is about to be written."""
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight.setdefault(frame_key(frame), deque()).append(future)
+        return future
+
+    def handle_notification(self, _sender, data: bytearray) -> None:
+        """Resolve the oldest in-flight frame the notification answers."""
+        data = bytes(data)
+        if not is_valid_frame(data):
+            _LOGGER.debug("Ignoring malformed notification %s", data.hex())
+            return
+
+        futures = self._in_flight.get(frame_key(data))
+        while futures:
+            future = futures.popleft()
+            if not future.done():
+                future.set_result(data)
+                self.acked += 1
+                return
+        self.unsolicited += 1
+
+    async def async_wait(self, future: asyncio.Future, timeout: float | None = None) -> bytes | None:
+        """Wait for the reply to a frame, returning None on timeout or if the frame was dropped."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._discard(future)
+            return None
+        except asyncio.CancelledError:
+            # Only a dropped frame is no reply, cancelling the waiter still cancels it
+            if future.cancelled():
+                return None
+            raise
+
+    def _discard(self, future: asyncio.Future) -> None:
+        future.cancel()
+        for futures in self._in_flight.values():
+            if future in futures:
+                futures.remove(future)
+                return
+
+    def reset(self) -> None:
+        """Drop every in-flight frame, e.g. after a disconnect, their waiters get no reply."""
+        for futures in self._in_flight.values():
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+        self._in_flight.clear()
+        self.enabled = False
+
+    def as_dict(self) -> dict:
+        """Return tracker statistics for state attributes."""
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "acked": self.acked,
+            "timeouts": self.timeouts,
+        }
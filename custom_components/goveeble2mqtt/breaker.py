@@ -0,0 +1,114 @@
+"""Per-light circuit breaker for BLE connection attempts."""
+
+from __future__ import annotations
+import random
+import time
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stop spending connection attempts on a light that keeps failing.
+
+    The breaker opens after `failure_threshold` consecutive failures and stays
+    open for an exponentially growing, jittered backoff. Once the backoff has
+    elapsed, or as soon as the light is heard advertising again, a single
+    cheap probe is allowed (half open). A successful probe closes the breaker,
+    a failed one reopens it with a longer backoff.
+    """
+
+    def __init__(
+            self,
+            failure_threshold: int = 3,
+            base_backoff: float = 5,
+            max_backoff: float = 300,
+            jitter: float = 0.3,
+            ) -> None:
+        """Initialize the breaker."""
+        self._failure_threshold = failure_threshold
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._jitter = jitter
+
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """Return true if requests are currently rejected."""
+        return self.state == STATE_OPEN and time.monotonic() < self.retry_at
+
+    @property
+    def is_probe(self) -> bool:
+        """Return true if the next attempt is a half-open probe."""
+        return self.state == STATE_HALF_OPEN
+
+    def seconds_until_retry(self) -> float:
+        """Return how long the breaker stays open."""
+        if self.state != STATE_OPEN:
+            return 0.0
+        return max(self.retry_at - time.monotonic(), 0.0)
+
+    def allow_request(self) -> bool:
+        """Return whether a connection attempt may be made now."""
+        if self.state == STATE_CLOSED:
+            return True
+
+        if self.state == STATE_OPEN:
+            if time.monotonic() < self.retry_at:
+                return False
+            self.state = STATE_HALF_OPEN
+            self._probing = False
+
+        # Half open: only let a single probe through
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def on_advertisement(self) -> bool:
+        """Move an open breaker to half open because the light is advertising.
+
+        Returns true if a probe should be scheduled.
+        """
+        if self.state != STATE_OPEN:
+            return False
+        self.state = STATE_HALF_OPEN
+        self._probing = False
+        return True
+
+    def record_success(self) -> None:
+        """Close the breaker after a successful connection."""
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a failed connection and open the breaker if needed."""
+        self.failures += 1
+        self._probing = False
+        if self.state == STATE_HALF_OPEN or self.failures >= self._failure_threshold:
+            self._trip()
+
+    def _trip(self) -> None:
+        """Open the breaker with exponential, jittered backoff."""
+        self.trips += 1
+        backoff = min(self._max_backoff, self._base_backoff * 2 ** (self.trips - 1))
+        backoff *= random.uniform(1 - self._jitter, 1 + self._jitter)
+        self.state = STATE_OPEN
+        self.retry_at = time.monotonic() + backoff
+
+    def as_dict(self) -> dict:
+        """Return the breaker state for state attributes."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(self.seconds_until_retry(), 1),
+        }
@@ -0,0 +1,85 @@
+"""Adaptive connection concurrency per Bluetooth adapter."""
+
+from __future__ import annotations
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = DOMAIN + ".concurrency"
+STORAGE_VERSION = 1
+SAVE_DELAY = 30 # seconds, limits change in bursts
+
+INITIAL_LIMIT = 2 # concurrent connections of an adapter not seen before
+MIN_LIMIT = 1
+MAX_LIMIT = 10
+SLOW_CONNECT = 5.0 # seconds, a connect slower than this counts as congestion
+DECREASE_FACTOR = 0.5
+
+
+class AdapterLimits:
+    """Learn how many lights each adapter connects to at a time.
+
+    Additive increase, multiplicative decrease: once an adapter completed
+    as many fast connects in a row as its limit, the limit grows by one. A
+    failed or slow connect halves it. A local HCI adapter that thrashes
+    settles low, a strong proxy climbs towards MAX_LIMIT. The learned
+    limits are kept in a Home Assistant store and survive restarts.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the limits."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._limits: dict[str, int] = {}
+        self._streaks: dict[str, int] = {}
+        self._stats: dict[str, dict] = {}
+
+    async def async_load(self) -> None:
+        """Restore the limits learned before the last restart."""
+        data = await self._store.async_load() or {}
+        for adapter, limit in data.get("limits", {}).items():
+            self._limits[adapter] = max(MIN_LIMIT, min(int(limit), MAX_LIMIT))
+        if self._limits:
+            _LOGGER.debug("Restored adapter concurrency limits: %s", self._limits)
+
+    def limit(self, adapter: str) -> int:
+        """Return the number of concurrent connections allowed on an adapter."""
+        return self._limits.get(adapter, INITIAL_LIMIT)
+
+    @callback
+    def record_connect(self, adapter: str, connected: bool, seconds: float) -> None:
+        """Adapt the adapter's limit to a connection attempt."""
+        stats = self._stats.setdefault(adapter, {"connects": 0, "failed": 0, "slow": 0, "last_connect_s": None})
+        stats["connects"] += 1
+        stats["last_connect_s"] = round(seconds, 2)
+        limit = self.limit(adapter)
+
+        if connected and seconds <= SLOW_CONNECT:
+            streak = self._streaks.get(adapter, 0) + 1
+            if streak >= limit and limit < MAX_LIMIT:
+                self._set(adapter, limit + 1)
+                streak = 0
+            self._streaks[adapter] = streak
+            return
+
+        stats["failed" if not connected else "slow"] += 1
+        self._streaks[adapter] = 0
+        self._set(adapter, max(MIN_LIMIT, int(limit * DECREASE_FACTOR)))
+
+    def _set(self, adapter: str, limit: int) -> None:
+        if limit == self.limit(adapter) and adapter in self._limits:
+            return
+        _LOGGER.debug("Concurrency of adapter %s: %d -> %d", adapter, self.limit(adapter), limit)
+        self._limits[adapter] = limit
+        self._store.async_delay_save(lambda: {"limits": dict(self._limits)}, SAVE_DELAY)
+
+    def as_dict(self) -> dict:
+        """Return the limits and connect statistics for diagnostics."""
+        return {
+            adapter: {"limit": self.limit(adapter), **self._stats.get(adapter, {})}
+            for adapter in sorted(set(self._limits) | set(self._stats))
+        }
@@ -6,15 +6,75 @@ from homeassistant.const import CONF_ADDRESS, CONF_NAME, CONF_MODEL
 NAME = "Govee BLE2MQTT"
 DOMAIN = "goveeble2mqtt"
 
+SERVICE_SET_SEGMENT_COLORS = "set_segment_colors"
+SERVICE_DUMP_TRACE = "dump_trace"
+SERVICE_CAPTURE_SCENE = "capture_scene"
+SERVICE_ACTIVATE_SCENE = "activate_scene"
+SERVICE_DELETE_SCENE = "delete_scene"
+SERVICE_START_EFFECT = "start_effect"
+SERVICE_STOP_EFFECT = "stop_effect"
+
+CONF_DEVICES = "devices"
+CONF_WARMUP_BUDGET = "warmup_budget"
+CONF_WARMUP_WAVE_SIZE = "warmup_wave_size"
+CONF_SYNC = "sync"
+CONF_SYNC_MIN_INTERVAL = "sync_min_interval"
+CONF_SYNC_MAX_INTERVAL = "sync_max_interval"
+CONF_SYNC_AIRTIME_BUDGET = "sync_airtime_budget"
+CONF_STREAM_TIMEOUT = "stream_timeout"
+CONF_RECORD = "record" # path of a traffic recording, see recorder.py
+CONF_TRACE = "trace"
+CONF_STATE_WRITE_INTERVAL = "state_write_interval"
+CONF_DEBOUNCE_WINDOW = "debounce_window"
+CONF_COMMAND_TTL = "command_ttl" # seconds an MQTT command may wait for its light, unset keeps it until sent
+CONF_SYNCHRONIZED = "synchronized" # release the final frames of lights updated together at one instant
+
+DEFAULT_WARMUP_BUDGET = 30 # seconds to spread the startup connections over
+DEFAULT_WARMUP_WAVE_SIZE = 3 # concurrent connects per adapter in one wave
+DEFAULT_SYNC_MIN_INTERVAL = 30 # seconds between polls of a light that just changed
+DEFAULT_SYNC_MAX_INTERVAL = 600 # seconds between polls of a light that never changes
+DEFAULT_SYNC_AIRTIME_BUDGET = 1.0 # status queries per second per adapter
+DEFAULT_STREAM_TIMEOUT = 5 # seconds without a frame before streaming mode ends
+DEFAULT_STATE_WRITE_INTERVAL = 1.0 # seconds between state writes of a light entity
+DEFAULT_DEBOUNCE_WINDOW = 0.3 # seconds a dragged brightness or color is collapsed over
+
+# A single window, or one per debounced attribute
+DEBOUNCE_WINDOW_SCHEMA = vol.Any(
+    vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Schema({
+        vol.Optional("brightness"): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional("color"): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }),
+)
+
 DEVICE_SCHEMA = vol.Schema({
     vol.Required(CONF_ADDRESS): cv.string,
     vol.Required(CONF_MODEL): cv.string,
     vol.Required(CONF_NAME): cv.string,
     vol.Optional("area"): cv.string,
+    vol.Optional(CONF_DEBOUNCE_WINDOW): DEBOUNCE_WINDOW_SCHEMA,
 })
 
 CONFIG_SCHEMA = vol.Schema({
     DOMAIN: vol.Schema({
-        vol.Optional('devices'): vol.All(cv.ensure_list, [DEVICE_SCHEMA]),
+        vol.Optional("mqtt_ip"): cv.string,
+        vol.Optional("mqtt_port"): cv.port,
+        vol.Optional("mqtt_user"): cv.string,
+        vol.Optional("mqtt_password"): cv.string,
+        vol.Optional("mqtt_v5", default=False): cv.boolean,
+        vol.Optional(CONF_DEVICES): vol.All(cv.ensure_list, [DEVICE_SCHEMA]),
+        vol.Optional(CONF_WARMUP_BUDGET, default=DEFAULT_WARMUP_BUDGET): cv.positive_int,
+        vol.Optional(CONF_WARMUP_WAVE_SIZE, default=DEFAULT_WARMUP_WAVE_SIZE): cv.positive_int,
+        vol.Optional(CONF_SYNC, default=False): cv.boolean,
+        vol.Optional(CONF_SYNC_MIN_INTERVAL, default=DEFAULT_SYNC_MIN_INTERVAL): cv.positive_int,
+        vol.Optional(CONF_SYNC_MAX_INTERVAL, default=DEFAULT_SYNC_MAX_INTERVAL): cv.positive_int,
+        vol.Optional(CONF_SYNC_AIRTIME_BUDGET, default=DEFAULT_SYNC_AIRTIME_BUDGET): vol.Coerce(float),
+        vol.Optional(CONF_STREAM_TIMEOUT, default=DEFAULT_STREAM_TIMEOUT): cv.positive_int,
+        vol.Optional(CONF_RECORD): cv.string,
+        vol.Optional(CONF_TRACE, default=False): cv.boolean,
+        vol.Optional(CONF_STATE_WRITE_INTERVAL, default=DEFAULT_STATE_WRITE_INTERVAL): vol.Coerce(float),
+        vol.Optional(CONF_DEBOUNCE_WINDOW, default=DEFAULT_DEBOUNCE_WINDOW): DEBOUNCE_WINDOW_SCHEMA,
+        vol.Optional(CONF_COMMAND_TTL): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_SYNCHRONIZED, default=False): cv.boolean,
     }),
 }, extra=vol.ALLOW_EXTRA)
@@ -0,0 +1,95 @@
+"""Debounce of rapidly changing light attributes, such as a dragged slider."""
+
+from __future__ import annotations
+from collections.abc import Callable
+import time
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+DEBOUNCED_ATTRIBUTES = ("brightness", "color")
+
+_NOTHING = object()
+
+
+def debounce_windows(value: float | dict | None, default: float) -> dict[str, float]:
+    """Return the window of every debounced attribute from a single window or a per-attribute mapping."""
+    if value is None:
+        value = default
+    if isinstance(value, dict):
+        return {attribute: float(value.get(attribute, default)) for attribute in DEBOUNCED_ATTRIBUTES}
+    return dict.fromkeys(DEBOUNCED_ATTRIBUTES, float(value))
+
+
+class AttributeDebouncer:
+    """Collapse a burst of values of one attribute of one light.
+
+    The first value after a quiet window is applied at once. Values during
+    the following window only replace each other, the last one is applied
+    when the window ends and opens the next window. The final value of a
+    burst therefore lands at most one window after it was offered, every
+    value it replaced is a write saved.
+    """
+
+    def __init__(self, hass: HomeAssistant, apply: Callable[[Any, bool], None], window: float) -> None:
+        """Initialize the debouncer, apply gets the value and whether it ended a window."""
+        self._hass = hass
+        self._apply = apply
+        self._window = window
+        self._last_apply = 0.0
+        self._pending: Any = _NOTHING
+        self._unsub: CALLBACK_TYPE | None = None
+        self.offered = 0
+        self.applied = 0
+
+    @property
+    def pending(self) -> bool:
+        """Return true while a value waits for the window to end."""
+        return self._pending is not _NOTHING
+
+    @property
+    def saved(self) -> int:
+        """Return the number of values that were replaced before being applied."""
+        return self.offered - self.applied - (1 if self.pending else 0)
+
+    @callback
+    def async_offer(self, value: Any) -> None:
+        """Apply a value now if the window passed, otherwise once it has."""
+        self.offered += 1
+        if self._unsub is None and time.monotonic() - self._last_apply >= self._window:
+            self._async_apply(value, False)
+            return
+
+        self._pending = value
+        if self._unsub is None:
+            self._unsub = async_call_later(
+                self._hass, self._last_apply + self._window - time.monotonic(), self._async_timer
+            )
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop a pending value."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        if self.pending:
+            self.offered -= 1
+        self._pending = _NOTHING
+
+    @callback
+    def _async_timer(self, _now) -> None:
+        self._unsub = None
+        if self.pending:
+            value, self._pending = self._pending, _NOTHING
+            self._async_apply(value, True)
+
+    @callback
+    def _async_apply(self, value: Any, trailing: bool) -> None:
+        self._last_apply = time.monotonic()
+        self.applied += 1
+        self._apply(value, trailing)
+
+    def as_dict(self) -> dict:
+        """Return the debounce counters."""
+        return {"window": self._window, "offered": self.offered, "applied": self.applied, "saved": self.saved}
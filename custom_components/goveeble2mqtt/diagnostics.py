@@ -0,0 +1,23 @@
+"""Diagnostics support for Govee BLE lights.
+
+Home Assistant only offers the download for config entries. The lights of
+the MQTT bridge show their link times on their diagnostic sensors instead.
+"""
+
+from __future__ import annotations
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .transport import get_transport
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return the controller's dispatcher statistics, learned adapter limits, lights and BLE links."""
+    controller = hass.data[DOMAIN][entry.entry_id]["controller"]
+    return {
+        "controller": controller.as_dict(),
+        "lights": controller.light_diagnostics(),
+        "transport": get_transport(hass).as_dict(),
+    }
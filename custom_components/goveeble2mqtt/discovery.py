@@ -0,0 +1,111 @@
+"""Home Assistant MQTT discovery for the configured lights."""
+
+from __future__ import annotations
+import hashlib
+import json
+import logging
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .registry import REGISTRY
+
+_LOGGER = logging.getLogger(__name__)
+
+DISCOVERY_PREFIX = "homeassistant"
+BIRTH_TOPIC = DISCOVERY_PREFIX + "/status"
+STORAGE_KEY = DOMAIN + ".discovery"
+STORAGE_VERSION = 1
+
+
+def light_topic(address: str, model: str) -> str:
+    """Return the base topic of a light, commands go to /command and state to /state."""
+    return DOMAIN + "/light/" + address.replace(":", "").upper() + "_" + model
+
+
+def discovery_config(device: dict) -> tuple[str, dict]:
+    """Return the discovery topic and the MQTT JSON light config of a device."""
+    address = device["address"].upper()
+    model = device.get("model", "default")
+    capabilities = REGISTRY.get(model)
+    object_id = DOMAIN + "_" + address.replace(":", "").lower()
+    base = light_topic(address, model)
+
+    config = {
+        "name": None,
+        "unique_id": object_id,
+        "object_id": object_id,
+        "schema": "json",
+        "command_topic": base + "/command",
+        "state_topic": base + "/state",
+        "brightness": True,
+        "supported_color_modes": ["rgb", "color_temp"],
+        "min_mireds": round(1000000 / capabilities.max_color_temp_kelvin),
+        "max_mireds": round(1000000 / capabilities.min_color_temp_kelvin),
+        "device": {
+            "identifiers": [object_id],
+            "connections": [["bluetooth", address]],
+            "name": device.get("name", address),
+            "manufacturer": "Govee",
+            "model": model,
+        },
+    }
+    if "area" in device:
+        config["device"]["suggested_area"] = device["area"]
+
+    return DISCOVERY_PREFIX + "/light/" + object_id + "/config", config
+
+
+class DiscoveryPublisher:
+    """Publish discovery configs in one batch and skip the ones the broker already has.
+
+    The hash of every published config is kept in a Home Assistant store, so
+    a restart only republishes configs that changed. The birth message of
+    Home Assistant republishes everything, because a restarted Home Assistant
+    may have lost configs that were not retained.
+    """
+
+    def __init__(self, hass: HomeAssistant, devices: list[dict]) -> None:
+        """Initialize the publisher."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._configs: dict[str, str] = {}
+        self._published: dict[str, str] | None = None
+
+        for device in devices:
+            topic, config = discovery_config(device)
+            self._configs[topic] = json.dumps(config, sort_keys=True, separators=(",", ":"))
+
+    async def async_publish(self, mqttclient, force: bool = False) -> int:
+        """Publish new and changed configs, or all of them if forced.
+
+        The messages are queued with QoS 1 in one go and leave through the
+        client's in-flight window, so hundreds of lights don't flood the broker.
+        Returns the number of published messages.
+        """
+        if self._published is None:
+            self._published = await self._store.async_load() or {}
+
+        published = {}
+        count = 0
+
+        for topic, payload in self._configs.items():
+            digest = hashlib.sha1(payload.encode()).hexdigest()
+            published[topic] = digest
+            if force or self._published.get(topic) != digest:
+                mqttclient.publish(topic, payload, qos=1, retain=True)
+                count += 1
+
+        # Lights that were removed from the configuration
+        for topic in self._published:
+            if topic not in self._configs:
+                mqttclient.publish(topic, "", qos=1, retain=True)
+                count += 1
+
+        _LOGGER.info("Published %d of %d discovery configs", count, len(self._configs))
+
+        if published != self._published:
+            self._published = published
+            await self._store.async_save(published)
+
+        return count
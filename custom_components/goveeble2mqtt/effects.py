@@ -0,0 +1,207 @@
+"""Fleet-wide light effects computed for every light in one vectorized step."""
+
+from __future__ import annotations
+import asyncio
+from collections.abc import Callable
+import logging
+import time
+
+import numpy as np
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+from .kelvin_rgb import kelvin_to_rgb_array
+
+_LOGGER = logging.getLogger(__name__)
+
+EFFECT_TICK = 0.1 # seconds between frames, about what the lights acknowledge
+BREATHE_MIN_LEVEL = 0.05 # share of the color kept at the bottom of a breath
+DEFAULT_PERIOD = 4.0 # seconds per breath, rainbow turn or chase lap
+DEFAULT_CHASE_WIDTH = 0.2 # share of the lights lit around the head of a chase
+
+EFFECTS = ("breathe", "rainbow", "chase")
+
+
+def _hue_to_rgb(hue: np.ndarray) -> np.ndarray:
+    """Return fully saturated colors for hues in [0, 1), one row per hue, channels in [0, 1]."""
+    k = (np.array([5.0, 3.0, 1.0]) + hue[:, None] * 6.0) % 6.0
+    return 1.0 - np.clip(np.minimum(k, 4.0 - k), 0.0, 1.0)
+
+
+class Effect:
+    """One effect over an ordered set of lights.
+
+    The lights' positions in the set spread the rainbow around the color
+    wheel and give the chase its direction. Breathe and chase scale a base
+    color, given as rgb or as a color temperature.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        addresses: list[str],
+        period: float = DEFAULT_PERIOD,
+        rgb_color: tuple[int, int, int] | None = None,
+        kelvin: int | None = None,
+        width: float = DEFAULT_CHASE_WIDTH,
+    ) -> None:
+        """Initialize the effect."""
+        if kind not in EFFECTS:
+            raise ValueError(f"Unknown effect: {kind}")
+        self.kind = kind
+        self.addresses = list(addresses)
+        self.period = max(float(period), EFFECT_TICK)
+        self.rgb_color = rgb_color
+        self.kelvin = kelvin
+        self.width = min(max(float(width), 1 / max(len(self.addresses), 1)), 1.0)
+        self.started = time.monotonic()
+
+        count = len(self.addresses)
+        self._positions = np.arange(count) / max(count, 1)
+        if kelvin is not None:
+            base = kelvin_to_rgb_array(np.full(count, kelvin))
+        else:
+            base = np.tile(np.array(rgb_color or (255, 255, 255), dtype=np.uint8), (count, 1))
+        self._base = base.astype(np.float64)
+
+    def without(self, addresses: set[str]) -> Effect | None:
+        """Return the effect over the remaining lights, in the same phase, or None if none remain."""
+        remaining = [address for address in self.addresses if address not in addresses]
+        if not remaining:
+            return None
+        effect = Effect(self.kind, remaining, self.period, self.rgb_color, self.kelvin, self.width)
+        effect.started = self.started
+        return effect
+
+    def colors(self, now: float) -> np.ndarray:
+        """Return the colors of every light at a monotonic time, one uint8 row per light."""
+        phase = ((now - self.started) / self.period) % 1.0
+
+        if self.kind == "rainbow":
+            colors = _hue_to_rgb((phase + self._positions) % 1.0) * 255.0
+        elif self.kind == "breathe":
+            level = BREATHE_MIN_LEVEL + (1 - BREATHE_MIN_LEVEL) * 0.5 * (1 - np.cos(2 * np.pi * phase))
+            colors = self._base * level
+        else:
+            # Circular distance of every light to the head of the chase
+            distance = np.abs((self._positions - phase + 0.5) % 1.0 - 0.5)
+            colors = self._base * np.clip(1 - distance / self.width, 0.0, 1.0)[:, None]
+
+        return np.rint(colors).astype(np.uint8)
+
+
+class EffectsEngine:
+    """Run effects over the fleet and stream the colors that changed.
+
+    Every tick computes the colors of all lights of all effects as arrays
+    and compares them with the colors sent last. Only the lights whose
+    color changed get a frame, handed to their client's stream mailbox,
+    which keeps the newest frame and paces it to the light. A light is in
+    at most one effect, starting an effect takes its lights from the
+    others. Effects are kept by name, so several rooms can run the same
+    kind of effect.
+    """
+
+    def __init__(self, hass: HomeAssistant, get_client: Callable[[str], object | None], tick: float = EFFECT_TICK) -> None:
+        """Initialize the engine, get_client returns the client of an address or None."""
+        self._hass = hass
+        self._get_client = get_client
+        self._tick = tick
+        self._effects: dict[str, Effect] = {}
+        self._sent: dict[str, np.ndarray] = {}
+        self._task: asyncio.Task | None = None
+        self._stats = {"ticks": 0, "frames": 0, "unchanged": 0, "tick_ms": 0.0, "max_tick_ms": 0.0}
+
+    @callback
+    def start(self, name: str, effect: Effect) -> list[str]:
+        """Run an effect under a name, replacing one of the same name, return the unknown addresses."""
+        unknown = [address for address in effect.addresses if self._get_client(address) is None]
+        if unknown:
+            effect = effect.without(set(unknown))
+            if effect is None:
+                return unknown
+
+        self._effects.pop(name, None)
+        for other_name, other in list(self._effects.items()):
+            if not set(other.addresses).isdisjoint(effect.addresses):
+                self._replace(other_name, other.without(set(effect.addresses)))
+        self._replace(name, effect)
+
+        _LOGGER.info("Starting %s %s on %d lights", effect.kind, name, len(effect.addresses))
+        if self._task is None:
+            self._task = self._hass.async_create_background_task(self._async_run(), f"{DOMAIN} effects")
+        return unknown
+
+    @callback
+    def stop(self, name: str | None = None) -> dict:
+        """Stop one or every effect, return the engine statistics.
+
+        The lights keep their last color, they leave streaming mode once
+        the stream timeout passes.
+        """
+        for effect_name in [name] if name else list(self._effects):
+            self._effects.pop(effect_name, None)
+            self._sent.pop(effect_name, None)
+        if not self._effects and self._task is not None:
+            self._task.cancel()
+            self._task = None
+        return self.as_dict()
+
+    def _replace(self, name: str, effect: Effect | None) -> None:
+        """Set or drop the effect of a name, its lights get a full frame on the next tick."""
+        self._sent.pop(name, None)
+        if effect is None:
+            self._effects.pop(name, None)
+        else:
+            self._effects[name] = effect
+
+    async def _async_run(self) -> None:
+        """Tick on a fixed schedule, a slow tick does not shift the ones after it."""
+        next_tick = time.monotonic()
+        while True:
+            self.tick(time.monotonic())
+            next_tick += self._tick
+            if (delay := next_tick - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Far behind, skip the missed ticks instead of bursting
+                next_tick = time.monotonic()
+                await asyncio.sleep(0)
+
+    @callback
+    def tick(self, now: float) -> int:
+        """Compute every effect's colors and stream the changed ones, return the frames handed out."""
+        started = time.perf_counter()
+        frames = 0
+        unchanged = 0
+
+        for name, effect in list(self._effects.items()):
+            colors = effect.colors(now)
+            sent = self._sent.get(name)
+            changed = np.ones(len(colors), dtype=bool) if sent is None else np.any(colors != sent, axis=1)
+            self._sent[name] = colors
+
+            indexes = np.flatnonzero(changed)
+            unchanged += len(colors) - len(indexes)
+            for index, (red, green, blue) in zip(indexes.tolist(), colors[indexes].tolist()):
+                if (client := self._get_client(effect.addresses[index])) is not None:
+                    client.Stream(red, green, blue)
+                    frames += 1
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self._stats["ticks"] += 1
+        self._stats["frames"] += frames
+        self._stats["unchanged"] += unchanged
+        self._stats["tick_ms"] += (elapsed - self._stats["tick_ms"]) * 0.1
+        self._stats["max_tick_ms"] = max(self._stats["max_tick_ms"], elapsed)
+        return frames
+
+    def as_dict(self) -> dict:
+        """Return the running effects and the tick statistics."""
+        return {
+            "effects": {name: len(effect.addresses) for name, effect in self._effects.items()},
+            **self._stats,
+            "tick_ms": round(self._stats["tick_ms"], 3),
+            "max_tick_ms": round(self._stats["max_tick_ms"], 3),
+        }
@@ -2,13 +2,25 @@
 import asyncio
 import json
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 import logging
 from .govee_ble_light import Client;
 import sys
 import getopt
 import time
 import signal
-from .const import DOMAIN
+from .const import CONF_DEBOUNCE_WINDOW, DOMAIN
+from .warmup import WarmupScheduler
+from .poller import StatePoller
+from .presence import PresenceTracker
+from .streaming import parse_stream_payload
+from .response import STATUS_EXPIRED, CommandReply, command_expired
+from .effects import Effect, EffectsEngine
+from .discovery import BIRTH_TOPIC, DiscoveryPublisher, light_topic
+from .recorder import TrafficRecorder
+from .scenes import SceneStore
+from .tracing import TRACER
 
 _LOGGER = logging.getLogger(__name__);
 
@@ -16,11 +28,16 @@ MQTT_SERVER: str = "core-mosquitto";
 MQTT_PORT: int = 1883;
 MQTT_USER: str = None;
 MQTT_PASSWORD: str = None;
+MQTT_V5: bool = False;
 
 CLIENTS = {};
 MESSAGE_QUEUE = [];
 RUNNING = True;
 
+def _format_address(device_id):
+    """Return the mac address of a device id without colons."""
+    return ":".join(device_id[i:i+2] for i in range (0, len(device_id), 2)).upper();
+
 class Govee2Mqtt:
     """Class to convert Govee BLE messages to MQTT messages."""
 
@@ -32,11 +49,46 @@ class Govee2Mqtt:
         global MQTT_PORT;
         global MQTT_USER;
         global MQTT_PASSWORD;
+        global MQTT_V5;
 
         MQTT_SERVER = hass.data[DOMAIN]["mqtt_ip"];
         MQTT_PORT = hass.data[DOMAIN]["mqtt_port"];
         MQTT_USER = hass.data[DOMAIN]["mqtt_user"];
         MQTT_PASSWORD = hass.data[DOMAIN]["mqtt_password"];
+        MQTT_V5 = hass.data[DOMAIN].get("mqtt_v5", False);
+
+        self._devices = hass.data[DOMAIN].get("devices", []);
+        self._warmup = WarmupScheduler(
+            hass,
+            hass.data[DOMAIN]["warmup_budget"],
+            hass.data[DOMAIN]["warmup_wave_size"],
+        );
+        self._warmupTask = None;
+        self._mqttclient = None;
+        self.scenes = SceneStore(hass, hass.data[DOMAIN]["warmup_wave_size"]);
+        self.effects = EffectsEngine(hass, lambda address: CLIENTS.get(address));
+        self._discovery = DiscoveryPublisher(hass, self._devices);
+        # Advertisements of the configured lights, for the presence sensors
+        self.presence = PresenceTracker(hass);
+        # Hooks for the record/replay harness, see recorder.py and test/replay.py
+        self.recorder = None;
+        self.client_class = None;
+        self.mqtt_client_class = None;
+
+        if hass.data[DOMAIN].get("record"):
+            self.recorder = TrafficRecorder(hass.data[DOMAIN]["record"]);
+        self._poller = None;
+        self._streamTimeout = hass.data[DOMAIN]["stream_timeout"];
+        self._commandTtl = hass.data[DOMAIN].get("command_ttl");
+        # Queued messages that expired before they were handled
+        self.expiredMessages = 0;
+
+        if hass.data[DOMAIN].get("sync"):
+            self._poller = StatePoller(
+                hass.data[DOMAIN]["sync_min_interval"],
+                hass.data[DOMAIN]["sync_max_interval"],
+                hass.data[DOMAIN]["sync_airtime_budget"],
+            );
 
     async def async_start(self):
         """Start."""
@@ -44,7 +96,13 @@ class Govee2Mqtt:
         global MESSAGE_QUEUE;
         global RUNNING;
 
-        _MqttClient = mqtt.Client();
+        await self.scenes.async_load();
+
+        for device in self._devices:
+            self.presence.async_track(device["address"]);
+
+        # MQTT v5 lets callers pass a response topic and correlation data
+        _MqttClient = (self.mqtt_client_class or mqtt.Client)(protocol=mqtt.MQTTv5 if MQTT_V5 else mqtt.MQTTv311);
         _MqttClient.on_connect = self._on_connect;
         _MqttClient.on_message = self._on_message;
 
@@ -52,75 +110,269 @@ class Govee2Mqtt:
             _MqttClient.username_pw_set(MQTT_USER, MQTT_PASSWORD);
 
         _MqttClient.connect(MQTT_SERVER, MQTT_PORT, 60);
+        self._mqttclient = _MqttClient;
+
+        self._warmupTask = self._hass.async_create_task(self._async_warm_up(_MqttClient));
 
         while RUNNING:
             try:
-                if _MqttClient.loop() != mqtt.MQTT_ERR_SUCCESS:
+                # Poll without blocking so the warm-up and device tasks can run,
+                # a lot more often while a light is streaming
+                _streaming = any(CLIENTS[client].Streaming for client in CLIENTS);
+                await asyncio.sleep(0.005 if _streaming else 0.05);
+
+                if _MqttClient.loop(timeout=0) != mqtt.MQTT_ERR_SUCCESS:
                     _LOGGER.error("Disconnected from Mqtt, trying to reconnect in 5 seconds");
-                    asyncio.sleep(5);
+                    await asyncio.sleep(5);
 
                     if _MqttClient.connect(MQTT_SERVER, MQTT_PORT, 60) == mqtt.MQTT_ERR_SUCCESS:
                         _LOGGER.info("Reconnected to Mqtt");
                         pass;
-                while len(MESSAGE_QUEUE) > 0:
-                    message = MESSAGE_QUEUE.pop(0);
-                    topic = message["topic"];
-                    prefix = DOMAIN + "/light/"
-                    suffix = "/command";
-
-                    if not topic.startswith(prefix) and not topic.endwith(suffix):
-                        _LOGGER.error("Invalid topic: " + topic);
-                        continue;
 
-                    device_id = topic[len(prefix):len(topic) - len(suffix)];
-                    model = "default";
-                    payload = json.loads(message["payload"].decode("utf-8", "ignore"));
-
-                    if "_" in device_id:
-                        model = device_id[device_id.find("_") + 1:];
-                        device_id = device_id[0:device_id.find("_")];
-
-                    self._on_payload_received(_MqttClient, topic, device_id, model, payload);
+                self._process_queue(_MqttClient);
 
             except Exception as e:
-                _LOGGER.error("Error: " + str(e));
+                _LOGGER.error("Error: %s", e);
                 pass;
 
         print("Exiting");
 
+        if self.recorder is not None:
+            self.recorder.close();
+
+        if self._warmupTask is not None:
+            self._warmupTask.cancel();
+
+        self.effects.stop();
+
+        for device in self._devices:
+            self.presence.async_untrack(device["address"]);
+
         for client in CLIENTS:
             CLIENTS[client].Close();
 
-    def _on_connect(self, mqttclient, _, __, ___):
+    def _process_queue(self, mqttclient):
+        """Hand the queued command messages to their devices."""
+        global MESSAGE_QUEUE;
+
+        while len(MESSAGE_QUEUE) > 0:
+            message = MESSAGE_QUEUE.pop(0);
+            topic = message.topic;
+            device_id, model = self._split_topic(topic, "/command");
+
+            if device_id is None:
+                _LOGGER.error("Invalid topic: %s", topic);
+                continue;
+
+            try:
+                payload = json.loads(message.payload.decode("utf-8", "ignore"));
+
+                if not isinstance(payload, dict):
+                    raise TypeError("expected a JSON object");
+
+                ttl = float(payload["ttl"]) if payload.get("ttl") is not None else self._commandTtl;
+            except (TypeError, ValueError) as e:
+                _LOGGER.error("Invalid payload on %s: %s", topic, e);
+                continue;
+
+            reply = self._reply_for(mqttclient, message, payload);
+
+            # The loop stalled, a command superseded since would be undone
+            if command_expired(message.timestamp or None, ttl):
+                _LOGGER.info("Discarding expired command for %s", device_id);
+                self.expiredMessages += 1;
+
+                if reply is not None:
+                    CommandReply(set(), reply, message.timestamp).send(STATUS_EXPIRED);
+                continue;
+
+            self._on_payload_received(
+                mqttclient, topic, device_id, model, payload, reply, message.timestamp or None, ttl,
+            );
+
+    async def _async_warm_up(self, mqttclient):
+        """Create every configured device up front and connect them in waves."""
+        global CLIENTS;
+
+        for device in self._devices:
+            device_id = device["address"].upper();
+            model = device.get("model", "default");
+
+            if device_id in CLIENTS:
+                continue;
+
+            topic = light_topic(device_id, model) + "/state";
+            _LOGGER.info("Creating configured device: %s", device_id);
+            CLIENTS[device_id] = Client(
+                self._hass, device_id, model, mqttclient, topic, self._poller, self._streamTimeout,
+                self.recorder, self.client_class, self._debounce_window(device_id), self._commandTtl,
+                deferred=True,
+            );
+
+        await self._warmup.async_run({
+            device["address"].upper(): CLIENTS[device["address"].upper()] for device in self._devices
+        });
+
+    def _split_topic(self, topic, suffix):
+        """Return the device id and model of a light topic, or (None, None)."""
+        prefix = DOMAIN + "/light/";
+
+        if not topic.startswith(prefix) or not topic.endswith(suffix):
+            return None, None;
+
+        device_id = topic[len(prefix):len(topic) - len(suffix)];
+        model = "default";
+
+        if "_" in device_id:
+            model = device_id[device_id.find("_") + 1:];
+            device_id = device_id[0:device_id.find("_")];
+
+        return device_id, model;
+
+    def _debounce_window(self, device_id):
+        """Return the debounce window of a device, its own if configured."""
+        for device in self._devices:
+            if device["address"].upper() == device_id and CONF_DEBOUNCE_WINDOW in device:
+                return device[CONF_DEBOUNCE_WINDOW];
+
+        return self._hass.data[DOMAIN].get("debounce_window");
+
+    def _get_client(self, mqttclient, device_id, model, topic):
+        """Return the client of a device id without colons, creating it on first use."""
+        global CLIENTS;
+
+        # State goes to a topic of its own, so it is not read back as a command
+        topic = topic[:topic.rfind("/")] + "/state";
+
+        device_id = _format_address(device_id);
+
+        if device_id not in CLIENTS:
+            _LOGGER.info("Creating new device: %s", device_id);
+            CLIENTS[device_id] = Client(
+                self._hass, device_id, model, mqttclient, topic, self._poller, self._streamTimeout,
+                self.recorder, self.client_class, self._debounce_window(device_id), self._commandTtl,
+            );
+
+        return CLIENTS[device_id];
+
+    def capture_scene(self, name, addresses=None):
+        """Snapshot the acknowledged state of the given lights, or of every light, under a name."""
+        global CLIENTS;
+
+        _addresses = [_address.upper() for _address in addresses] if addresses else list(CLIENTS);
+        _result = self.scenes.capture(name, {_address: CLIENTS[_address] for _address in _addresses if _address in CLIENTS});
+        _result["skipped"].extend(_address for _address in _addresses if _address not in CLIENTS);
+
+        return _result;
+
+    async def async_activate_scene(self, name, synchronized=False):
+        """Restore a scene snapshot, return its activation timing or None if there is no such scene."""
+        return await self.scenes.async_activate(name, self._scene_client, synchronized);
+
+    def _scene_client(self, address, model):
+        """Return the client of a light in a scene, creating it if the light was not used since the restart."""
+        return self._get_client(self._mqttclient, address.replace(":", ""), model, light_topic(address, model) + "/state");
+
+    def start_effect(self, name, kind, addresses=None, **options):
+        """Run an effect over the given lights, or every light, return the addresses without a client."""
+        global CLIENTS;
+
+        _addresses = [_address.upper() for _address in addresses] if addresses else list(CLIENTS);
+
+        return self.effects.start(name, Effect(kind, _addresses, **options));
+
+    def light_diagnostics(self):
+        """Return the diagnostic values of every client, keyed by address."""
+        global CLIENTS;
+
+        return {_address: CLIENTS[_address].Diagnostics for _address in CLIENTS};
+
+    def expired_commands(self):
+        """Return the commands discarded because they expired, in the queue and pending on the lights."""
+        global CLIENTS;
+
+        return {
+            "queue": self.expiredMessages,
+            "lights": sum(CLIENTS[client].ExpiredCommands for client in CLIENTS),
+        };
+
+    def _reply_for(self, mqttclient, message, payload):
+        """Return how to answer a command, or None if the caller did not ask for an answer."""
+        _properties = getattr(message, "properties", None);
+        _responseTopic = getattr(_properties, "ResponseTopic", None);
+
+        if _responseTopic:
+            _replyProperties = Properties(PacketTypes.PUBLISH);
+
+            if hasattr(_properties, "CorrelationData"):
+                _replyProperties.CorrelationData = _properties.CorrelationData;
+
+            return lambda reply: mqttclient.publish(_responseTopic, json.dumps(reply), properties=_replyProperties);
+
+        # MQTT v3 callers put a correlation id in the payload and listen on the response topic
+        if "correlation_id" in payload:
+            _topic = message.topic[:-len("/command")] + "/response";
+            _correlationId = payload["correlation_id"];
+
+            return lambda reply: mqttclient.publish(_topic, json.dumps({"correlation_id": _correlationId, **reply}));
+
+        return None;
+
+    def _on_connect(self, mqttclient, _, __, ___, ____=None):
         topic = DOMAIN + "/light/+/command";
+        stream_topic = DOMAIN + "/light/+/stream";
 
         _LOGGER.info("Connected to Mqtt broker")
-        _LOGGER.info("Subscribing to topic: " + topic);
+        _LOGGER.info("Subscribing to topics: %s, %s", topic, stream_topic);
 
-        mqttclient.subscribe(topic);
+        mqttclient.subscribe([(topic, 0), (stream_topic, 0), (BIRTH_TOPIC, 0)]);
+
+        self._hass.async_create_task(self._discovery.async_publish(mqttclient));
 
     def _on_message(self, mqttclient, _, message):
         global MESSAGE_QUEUE;
+
+        if message.topic == BIRTH_TOPIC:
+            # Home Assistant restarted, it needs every discovery config again
+            if message.payload == b"online":
+                self._hass.async_create_task(self._discovery.async_publish(mqttclient, True));
+            return;
+
+        if self.recorder is not None:
+            self.recorder.record_mqtt(message.topic, message.payload);
+
+        # Stream frames skip the command queue, the client keeps only the newest
+        if message.topic.endswith("/stream"):
+            self._on_stream_received(mqttclient, message);
+            return;
+
         MESSAGE_QUEUE.append(message);
 
-    def _on_payload_received(self, mqttclient, topic, device_id, model, payload):
+    def _on_stream_received(self, mqttclient, message):
+        device_id, model = self._split_topic(message.topic, "/stream");
+
+        if device_id is None:
+            _LOGGER.error("Invalid topic: %s", message.topic);
+            return;
+
+        try:
+            _r, _g, _b, _sent_at = parse_stream_payload(message.payload);
+            self._get_client(mqttclient, device_id, model, message.topic).Stream(_r, _g, _b, _sent_at);
+        except Exception as e:
+            _LOGGER.error("Invalid stream frame for %s: %s", device_id, e);
+
+    def _on_payload_received(self, mqttclient, topic, device_id, model, payload, reply=None, received=None, ttl=None):
         global CLIENTS;
         global MESSAGE_QUEUE;
 
         _requested_device_id = device_id;
         _device = None;
 
-        _LOGGER.info(device_id + " " + str(payload));
+        if TRACER.enabled:
+            TRACER.event(_format_address(device_id), "command", payload=payload);
 
         try:
-            device_id = ":".join(device_id[i:i+2] for i in range (0, len(device_id), 2));
-
-            if device_id not in CLIENTS:
-                _LOGGER.info("Creating new device: " + device_id);
-                CLIENTS[device_id] = Client(self._hass, device_id, model, mqttclient, topic);
-                asyncio.sleep(2);
-
-            _device = CLIENTS[device_id];
+            _device = self._get_client(mqttclient, device_id, model, topic);
 
             if "state" in payload:
                 _expectedstate = 1 if payload["state"] == "ON" else 0;
@@ -139,11 +391,32 @@ class Govee2Mqtt:
                 _g = payload["color"]["g"];
                 _b = payload["color"]["b"];
 
-                if _device.R != _r or _device.G != _g or _device.B != _b:
-                    _device.SetColorRGB(payload["color"]);
+                # A dragged color may still be held back by the debounce
+                if _device.R != _r or _device.G != _g or _device.B != _b or "color" in _device.DirtyProperties:
+                    _device.setColorRGB(_r, _g, _b);
+
+            if "segments" in payload:
+                # One color per segment starting at the first, null leaves a segment unchanged
+                _device.SetSegmentColors({
+                    _index: (_color["r"], _color["g"], _color["b"])
+                    for _index, _color in enumerate(payload["segments"])
+                    if _color is not None
+                });
+
+            _requested = {"state", "brightness", "segments"}.intersection(payload);
+
+            if "color" in payload or "color_temp" in payload:
+                _requested.add("color");
+
+            # Whatever this command left to send is dropped if it is still unsent when it expires
+            _device.Stamp(_requested & _device.DirtyProperties, received, ttl);
+
+            if reply is not None:
+                # Answer once everything this command asked for is written
+                _device.Track(CommandReply(_requested & _device.DirtyProperties, reply, received));
 
         except Exception as e:
-            _LOGGER.error("Error: " + str(e));
+            _LOGGER.error("Error handling command for %s: %s", device_id, e);
 
 
     def stop(self):
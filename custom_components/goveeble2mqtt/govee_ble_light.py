@@ -1,26 +1,45 @@
 import asyncio;
+import contextlib;
 import json;
 import threading;
 import time;
 import math;
 import logging;
 
-from homeassistant.core import HomeAssistant as hass;
+from homeassistant.core import HomeAssistant as hass, callback;
+from homeassistant.components import bluetooth;
+import homeassistant.util.dt as dt_util;
 
 from enum import IntEnum;
-from bleak import BleakClient;
 
-from .models import LedCommand, LedMode, ControlMode, ModelInfo;
+from .models import LedCommand, ControlMode;
+from .protocol import FRAME_QUERY, STATUS_QUERIES, build_frame, parse_status;
+from .protocol import pack_segment_colors, segment_mask;
+from .registry import REGISTRY;
+from .streaming import StreamSession;
+from .response import STATUS_ACKNOWLEDGED, STATUS_EXPIRED, STATUS_TIMEOUT, STATUS_UNCHANGED, STATUS_WRITTEN, command_expired;
+from .const import DEFAULT_DEBOUNCE_WINDOW, DEFAULT_STREAM_TIMEOUT;
+from .debounce import AttributeDebouncer, debounce_windows;
+from .tracing import TRACER;
+from .pacing import PACER;
+from .transport import get_transport;
+from .kelvin_rgb import kelvin_to_rgb;
+from .warmup import adapter_for;
 from homeassistant.util.color import value_to_brightness, brightness_to_value
 
 _LOGGER = logging.getLogger(__name__);
 
-UUID_CONTROL_CHARACTERISTIC = '00010203-0405-0607-0809-0a0b0c0d2b11';
+KEEP_ALIVE_INTERVAL = 2; # seconds between status queries on an idle connection
+MAX_UNACKED_RETRIES = 3; # resends of an unacknowledged command before reconnecting
+STREAM_REPORT_INTERVAL = 1; # seconds between stream statistics while streaming
 
 class Client:
     """Client for Govee BLE lights."""
-    def __init__(self, hass, device_id, model, mqttclient, topic):
-        """Initialize."""
+    def __init__(
+        self, hass, device_id, model, mqttclient, topic, poller=None, stream_timeout=DEFAULT_STREAM_TIMEOUT,
+        recorder=None, client_class=None, debounce_window=None, command_ttl=None, deferred=False,
+    ):
+        """Initialize, a deferred client connects once warmed up or given a command."""
         self._hass = hass;
 
         self.ControlMode        = ControlMode.COLOR;
@@ -32,23 +51,72 @@ class Client:
         self.B                 = 255;
 
         self._device_id         = device_id;
-        self._model             = model;
 
-        self.ledmode            = ModelInfo.get_led_mode(model);
-        self.brightness_max     = ModelInfo.get_brightness_max(model);
+        # Fall back to the model in the advertised name when the topic has none
+        _serviceInfo = bluetooth.async_last_service_info(hass, device_id.upper(), connectable=True);
+        self._model             = REGISTRY.resolve(model, _serviceInfo.name if _serviceInfo is not None else None);
+        self._capabilities      = REGISTRY.get(self._model);
 
+        self.ledmode            = self._capabilities.led_mode;
+        self.brightness_max     = self._capabilities.brightness_max;
+        self.segment_count      = self._capabilities.segments;
 
-        self._client            = None;
-        self._reconnect         = 0;
+
+        # The connection, breaker and acknowledgements are shared with the light
+        # entity of the same address through the transport
+        self._link              = get_transport(hass).acquire(device_id, self, client_class);
         self._mqttclient        = mqttclient;
         self._topic             = topic;
         self._dirtyState            = False;
         self._dirtyBrightness           = False;
         self._dirtyColor            = False;
+        self._dirtySegments         = False;
+        self._segments          = {};
+        self._pendingSegments   = {};
         self._lastSent          = 0;
         self._pingRoll          = 0;
         self._taskCond            = True;
         self._task            = None;
+        self._breaker           = self._link.breaker;
+        self._advertised        = asyncio.Event();
+        self._ackTracker        = self._link.tracker;
+        self._unacked           = 0;
+        self._wake              = asyncio.Event();
+        self._started           = asyncio.Event();
+        self._poller            = poller;
+        self._stream            = None;
+        self._streamTimeout     = stream_timeout;
+        self._streamReported    = 0;
+        self._replies           = [];
+        self._recorder          = recorder;
+        # Values the light confirmed, what a scene snapshot captures
+        self._acked             = {};
+        # Creation time and time to live of the newest command per property
+        self._commandTtl        = command_ttl;
+        self._commandStamps     = {};
+        self.ExpiredCommands    = 0;
+        # When the link was last used, shown by the diagnostic sensors
+        self.LastConnectionAttempt = None;
+        self.LastPacketAttempt  = None;
+
+        # A dragged slider sends its first and last value, not every step
+        _windows = debounce_windows(debounce_window, DEFAULT_DEBOUNCE_WINDOW);
+        self._debouncers        = {
+            "brightness": AttributeDebouncer(hass, self._applyBrightness, _windows["brightness"]),
+            "color": AttributeDebouncer(hass, self._applyColor, _windows["color"]),
+        };
+
+        self._unsubAdvertisement = bluetooth.async_register_callback(
+            hass,
+            self._onAdvertisement,
+            bluetooth.BluetoothCallbackMatcher(address=device_id.upper()),
+            bluetooth.BluetoothScanningMode.PASSIVE,
+        );
+        # The light entity may hear the advertisement that lets the breaker probe
+        self._unsubProbe = self._link.add_probe_listener(self._onProbe);
+
+        if not deferred:
+            self._started.set();
 
         self._task = hass.async_create_task(self._taskStarter());
 
@@ -61,13 +129,24 @@ class Client:
         if self._task is None:
             return;
 
-        _LOGGER.info("Closing device: " + self._device_id);
+        _LOGGER.info("Closing device: %s", self._device_id);
+
+        if self._unsubAdvertisement is not None:
+            self._unsubAdvertisement();
+            self._unsubAdvertisement = None;
+
+        self._unsubProbe();
+
+        get_transport(self._hass).release(self._device_id, self);
+
+        for _debouncer in self._debouncers.values():
+            _debouncer.async_cancel();
 
         try:
             self._taskCond = False;
             self._task.cancel();
         except Exception as e:
-            _LOGGER.error("Error: " + str(e));
+            _LOGGER.error("Error closing device %s: %s", self._device_id, e);
 
         self._task = None;
 
@@ -78,22 +157,28 @@ class Client:
 
         self.State = 1 if state == 1 else 0;
         self._dirtyState = True;
+        self._wakeUp();
 
     def SetBrightness(self, brightness):
         """Set the brightness."""
         if not 0 <= float(brightness) <= 1:
             return ValueError("Invalid brightness");
 
+        self._debouncers["brightness"].async_offer(brightness);
+
+    def _applyBrightness(self, brightness, trailing):
         self.Brightness = brightness;
         self._dirtyBrightness = True;
+        self._wakeUp();
+
+        if trailing:
+            self._publishDebounceStats();
 
     def SetColorTempMired(self, temperature):
         """Set the color temperature."""
         _colorTempK = 1000000 / temperature;
 
-        self.ControlMode = ControlMode.TEMPERATURE;
-        self.Temperature = _colorTempK;
-        self._dirtyColor = True;
+        self._debouncers["color"].async_offer((ControlMode.TEMPERATURE, _colorTempK));
 
     def setColorRGB(self, r, g, b):
         """Set the color."""
@@ -104,141 +189,645 @@ class Client:
         if not isinstance(b, int) or b < 0 or b > 255:
             return ValueError("Invalid b");
 
-        self.ControlMode = ControlMode.COLOR;
-        self.R = r;
-        self.G = g;
-        self.B = b;
+        self._debouncers["color"].async_offer((ControlMode.COLOR, (r, g, b)));
+
+    def _applyColor(self, color, trailing):
+        _mode, _value = color;
+
+        self.ControlMode = _mode;
+        if _mode == ControlMode.TEMPERATURE:
+            self.Temperature = _value;
+        else:
+            self.R, self.G, self.B = _value;
         self._dirtyColor = True;
+        self._wakeUp();
+
+        if trailing:
+            self._publishDebounceStats();
+
+    @property
+    def DebounceStats(self):
+        """Return the debounce counters per attribute."""
+        return {_attribute: _debouncer.as_dict() for _attribute, _debouncer in self._debouncers.items()};
+
+    def _publishDebounceStats(self):
+        self._mqttclient.publish(self._topic.rsplit("/", 1)[0] + "/debounce/stats", json.dumps(self.DebounceStats));
+
+    @property
+    def Diagnostics(self):
+        """Return the link times, keyed like the light entity's diagnostics."""
+        return {
+            "last_connection_attempt": self.LastConnectionAttempt,
+            "last_packet_attempt": self.LastPacketAttempt,
+        };
+
+    @property
+    def BreakerState(self):
+        """Return the circuit breaker state."""
+        return self._breaker.as_dict();
+
+    @callback
+    def _onAdvertisement(self, service_info, change):
+        self._link.on_advertisement();
+
+    @callback
+    def _onProbe(self):
+        _LOGGER.debug("%s is advertising again, probing connection", self._device_id);
+        self._advertised.set();
+
+    async def _waitForRetry(self):
+        """Sleep until the breaker backoff elapses or the device advertises."""
+        self._advertised.clear();
+
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._advertised.wait(), max(self._breaker.seconds_until_retry(), 1));
+
+    def SetSegmentColors(self, colors):
+        """Set the color of individual segments, given as index -> (r, g, b)."""
+        if self.segment_count == 0:
+            return ValueError("Model has no segments");
+
+        for _index, _rgb in colors.items():
+            if not isinstance(_index, int) or _index < 0 or _index >= self.segment_count:
+                return ValueError("Invalid segment");
+
+            _rgb = tuple(_rgb);
+
+            if self._segments.get(_index) == _rgb:
+                self._pendingSegments.pop(_index, None);
+            else:
+                self._pendingSegments[_index] = _rgb;
+
+        if len(self._pendingSegments) > 0:
+            self._dirtySegments = True;
+            self._wakeUp();
+
+    def _ackColor(self):
+        self._acked["mode"] = int(self.ControlMode);
+        self._acked["rgb"] = [self.R, self.G, self.B];
+        self._acked["temperature"] = int(self.Temperature);
+        # A whole-device color repaints every segment
+        self._acked.pop("segments", None);
+
+    def Snapshot(self):
+        """Return the model, the acknowledged values and the frames restoring them, or None."""
+        if len(self._acked) == 0:
+            return None;
+
+        _values = dict(self._acked);
+
+        return {"model": self._model, "values": _values, "frames": self._compileFrames(_values)};
+
+    def _compileFrames(self, values):
+        """Encode the frames that bring the light to the given values."""
+        _frames = [];
+
+        if "brightness" in values:
+            _frames.append(self._capabilities.encode_brightness(math.floor(values["brightness"] * self.brightness_max)));
+
+        if "mode" in values:
+            _frames.append(self._colorFrame(values["mode"], values["rgb"], values["temperature"]));
+
+        if "segments" in values:
+            _colors = {_index: (_r, _g, _b) for _index, _r, _g, _b in values["segments"]};
+
+            for _rgb, _segments in pack_segment_colors(_colors):
+                _frames.append(self._capabilities.encode_color(_rgb, mask=segment_mask(_segments)));
+
+        if "state" in values:
+            # Light up before painting, paint before switching off
+            _power = self._capabilities.encode_power(values["state"] == 1);
+            if values["state"] == 1:
+                _frames.insert(0, _power);
+            else:
+                _frames.append(_power);
+
+        return _frames;
+
+    async def async_restore(self, values, frames, group=None):
+        """Adopt snapshot values and stream their precompiled frames, return whether all were delivered.
+
+        With a SyncGroup the last frame is held until the group is released.
+        """
+        self._started.set();
+
+        try:
+            return await self._restoreFrames(values, frames, group);
+        finally:
+            if group is not None:
+                group.withdraw(self._device_id);
+
+    async def _restoreFrames(self, values, frames, group):
+        _restored = self._adoptValues(values);
+
+        if not await self._connect():
+            self._markDirty(_restored);
+            return False;
+
+        for _index, _frame in enumerate(frames):
+            if group is not None and _index == len(frames) - 1:
+                _reply = await self._request(
+                    _frame, await group.async_primed(self._device_id),
+                    lambda _writtenAt: group.written(self._device_id, _writtenAt),
+                );
+            else:
+                _reply = await self._request(_frame);
+
+            if _reply is None:
+                # The task writes whatever did not make it the usual way
+                self._markDirty(_restored);
+                return False;
+
+        self._acked.update(values);
+        for _prop in _restored:
+            self._resolveReplies(_prop);
+
+        _payload = self.buildMqttPayload();
+        TRACER.event(self._device_id, "state", payload=_payload);
+        self._mqttclient.publish(self._topic, _payload);
+        return True;
+
+    def _adoptValues(self, values):
+        """Take over snapshot values as the state, return the properties they cover."""
+        _restored = set();
+
+        if "state" in values:
+            self.State = values["state"];
+            self._dirtyState = False;
+            _restored.add("state");
+
+        if "brightness" in values:
+            self._debouncers["brightness"].async_cancel();
+            self.Brightness = values["brightness"];
+            self._dirtyBrightness = False;
+            _restored.add("brightness");
+
+        if "mode" in values:
+            self._debouncers["color"].async_cancel();
+            self.ControlMode = ControlMode(values["mode"]);
+            self.R, self.G, self.B = values["rgb"];
+            self.Temperature = values["temperature"];
+            self._dirtyColor = False;
+            self._segments = dict.fromkeys(range(self.segment_count), (self.R, self.G, self.B));
+            _restored.add("color");
+
+        if "segments" in values:
+            self._segments.update({_index: (_r, _g, _b) for _index, _r, _g, _b in values["segments"]});
+            self._pendingSegments = {};
+            self._dirtySegments = False;
+            _restored.add("segments");
+
+        for _prop in _restored:
+            self._commandStamps.pop(_prop, None);
+
+        return _restored;
+
+    def _markDirty(self, properties):
+        self._dirtyState = self._dirtyState or "state" in properties;
+        self._dirtyBrightness = self._dirtyBrightness or "brightness" in properties;
+        self._dirtyColor = self._dirtyColor or "color" in properties;
+
+        if "segments" in properties:
+            self._pendingSegments = dict(self._segments);
+            self._dirtySegments = len(self._pendingSegments) > 0;
+
+        self._wakeUp();
+
+    def Track(self, reply):
+        """Answer a command once the frames for the properties it changed are written."""
+        if len(reply.pending) == 0:
+            reply.send(STATUS_UNCHANGED);
+            return;
+
+        self._replies.append(reply);
+
+    def Stamp(self, properties, created=None, ttl=None):
+        """Stamp the newest command for properties with its creation time and time to live.
+
+        A property still unwritten when its command expires is dropped
+        instead of being sent, which keeps a light that was unreachable for
+        a while from replaying intent nobody waits for anymore. Without a
+        time to live the client's own is used, unset never expires.
+        """
+        _created = created or time.monotonic();
+        _ttl = ttl if ttl is not None else self._commandTtl;
+
+        for _prop in properties:
+            self._commandStamps[_prop] = (_created, _ttl);
+
+    async def _discardExpired(self):
+        """Drop the pending properties whose command expired, return whether any were."""
+        if len(self._commandStamps) == 0:
+            return False;
+
+        _now = time.monotonic();
+        _dirty = self.DirtyProperties;
+        _expired = [];
+
+        for _prop, (_created, _ttl) in list(self._commandStamps.items()):
+            if not command_expired(_created, _ttl, _now):
+                continue;
+
+            del self._commandStamps[_prop];
+
+            if _prop in _dirty:
+                _expired.append(_prop);
+
+        if len(_expired) == 0:
+            return False;
+
+        _LOGGER.info("Discarding expired commands for %s: %s", self._device_id, ", ".join(sorted(_expired)));
+        self.ExpiredCommands += len(_expired);
+        _unknown = [_prop for _prop in _expired if not self._revert(_prop)];
+
+        _pending = [];
+
+        for _reply in self._replies:
+            if _reply.pending.isdisjoint(_expired):
+                _pending.append(_reply);
+            else:
+                _reply.send(STATUS_EXPIRED);
+
+        self._replies = _pending;
+
+        # Nothing acknowledged to go back to, ask the light what it shows
+        if self._ackTracker.enabled:
+            for _prop in _unknown:
+                if (_command := STATUS_QUERIES.get("rgb_color" if _prop == "color" else _prop)) is not None:
+                    await self._query(_command);
+
+        self._publishExpiryStats();
+
+        return True;
+
+    def _revert(self, prop):
+        """Give up a pending property, return whether it went back to the value the light last acknowledged."""
+        if prop == "color":
+            _values = {_key: self._acked[_key] for _key in ("mode", "rgb", "temperature") if _key in self._acked};
+        else:
+            _values = {prop: self._acked[prop]} if prop in self._acked else {};
+
+        if prop in self._adoptValues(_values):
+            return True;
+
+        # Nothing acknowledged to go back to, only stop sending it
+        if prop == "state":
+            self._dirtyState = False;
+        elif prop == "brightness":
+            self._debouncers["brightness"].async_cancel();
+            self._dirtyBrightness = False;
+        elif prop == "color":
+            self._debouncers["color"].async_cancel();
+            self._dirtyColor = False;
+        else:
+            self._pendingSegments = {};
+            self._dirtySegments = False;
+
+        return False;
+
+    def _publishExpiryStats(self):
+        self._mqttclient.publish(self._topic.rsplit("/", 1)[0] + "/expiry/stats", json.dumps({"expired": self.ExpiredCommands}));
+
+    def _chargeReplies(self, field, seconds):
+        for _reply in self._replies:
+            setattr(_reply, field, getattr(_reply, field) + seconds);
+
+    def _resolveReplies(self, prop):
+        if len(self._replies) == 0:
+            return;
+
+        _status = STATUS_ACKNOWLEDGED if self._ackTracker.enabled else STATUS_WRITTEN;
+        _pending = [];
+
+        for _reply in self._replies:
+            if _reply.resolve(prop):
+                _reply.send(_status);
+            else:
+                _pending.append(_reply);
+
+        self._replies = _pending;
+
+    def _expireReplies(self):
+        if len(self._replies) == 0:
+            return;
+
+        _pending = [];
+
+        for _reply in self._replies:
+            if _reply.expired:
+                _reply.send(STATUS_TIMEOUT);
+            else:
+                _pending.append(_reply);
+
+        self._replies = _pending;
+
+    def Stream(self, r, g, b, sent_at=None):
+        """Hand a frame to streaming mode, entering it on the first frame."""
+        if self._stream is None:
+            _LOGGER.info("Device %s entering streaming mode", self._device_id);
+            self._stream = StreamSession(self._streamTimeout);
+
+        self._stream.offer((r, g, b), sent_at);
+        self._wakeUp();
+
+    def _wakeUp(self):
+        """Have the task send what changed, starting it if it waits for warm-up."""
+        self._started.set();
+        self._wake.set();
+
+    @property
+    def DirtyProperties(self):
+        """Return the properties that still have to be written to the device."""
+        _dirty = set();
+
+        if self._dirtyState:
+            _dirty.add("state");
+        if self._dirtyBrightness or self._debouncers["brightness"].pending:
+            _dirty.add("brightness");
+        if self._dirtyColor or self._debouncers["color"].pending:
+            _dirty.add("color");
+        if self._dirtySegments:
+            _dirty.add("segments");
+
+        return _dirty;
+
+    @property
+    def Streaming(self):
+        """Return true while the device is in streaming mode."""
+        return self._stream is not None;
+
+    async def async_warm_up(self):
+        """Open the connection ahead of the first command, a deferred client then starts its task."""
+        try:
+            return await self._connect();
+        finally:
+            self._started.set();
 
     async def _taskCoroutine(self):
         while self._taskCond:
             try:
+                self._expireReplies();
+
+                _connectStart = time.monotonic();
+
                 if not await(self._connect()):
-                    asyncio.sleep(2);
+                    await self._waitForRetry();
                     continue;
 
+                self._chargeReplies("connect", time.monotonic() - _connectStart);
+
+                # Send what is still wanted, not everything asked for while away
+                if await self._discardExpired():
+                    self._mqttclient.publish(self._topic, self.buildMqttPayload());
+
                 _changed = True;
+                _sent = None;
+                _writeStart = time.monotonic();
 
+                # Each frame goes out as soon as the previous one is acknowledged,
+                # an unacknowledged command is resent on its own
                 if self._dirtyState:
                     if not await self._send_setPower(self.State):
-                        asyncio.sleep(1);
+                        self._chargeReplies("write", time.monotonic() - _writeStart);
+                        await self._onUnacked();
                         continue;
 
                     self._dirtyState = False;
+                    self._acked["state"] = self.State;
+                    _sent = "state";
                 elif self._dirtyBrightness:
                     if not await self._send_setBrightness(self.Brightness):
-                        asyncio.sleep(1);
+                        self._chargeReplies("write", time.monotonic() - _writeStart);
+                        await self._onUnacked();
                         continue;
 
                     self._dirtyBrightness = False;
+                    self._acked["brightness"] = self.Brightness;
+                    _sent = "brightness";
+                elif self._stream is not None:
+                    # Streamed frames preempt queued colors but not power or brightness
+                    _changed = False;
+
+                    if not await self._streamStep():
+                        await self._onUnacked();
+                        continue;
                 elif self._dirtyColor:
                     if not await self._send_setColor():
-                        asyncio.sleep(1);
+                        self._chargeReplies("write", time.monotonic() - _writeStart);
+                        await self._onUnacked();
                         continue;
 
                     self._dirtyColor = False;
+                    _sent = "color";
+                    # A whole-device color repaints every segment
+                    self._segments = dict.fromkeys(range(self.segment_count), (self.R, self.G, self.B));
+                    self._ackColor();
+                elif self._dirtySegments:
+                    if not await self._send_setSegments():
+                        self._chargeReplies("write", time.monotonic() - _writeStart);
+                        await self._onUnacked();
+                        continue;
+
+                    self._dirtySegments = len(self._pendingSegments) > 0;
+                    _sent = None if self._dirtySegments else "segments";
+                    self._acked["segments"] = [[_index, *_rgb] for _index, _rgb in sorted(self._segments.items())];
                 else:
                     _changed = False;
 
-                    # Keep alive
-                    if time.time() - self._lastSent >= 1:
-                        _asyncRes = False;
-                        self._pingRoll += 1;
+                    # Keep alive with a status query instead of resending state,
+                    # a full state poll piggybacks on it when one is due
+                    if time.time() - self._lastSent >= KEEP_ALIVE_INTERVAL:
+                        if self._pollDue():
+                            if not await self._poll():
+                                await self._onUnacked();
+                                continue;
+                        elif not await self._query(LedCommand.POWER):
+                            await self._onUnacked();
+                            continue;
+
+                    self._wake.clear();
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self._wake.wait(), KEEP_ALIVE_INTERVAL);
+                    continue;
 
-                        if self._pingRoll % 3 == 0 or self.State == 0:
-                            _asyncRes = await self._send_setPower(self.State);
-                        elif self._pingRoll % 3 == 1:
-                            _asyncRes = await self._send_setBrightness(self.Brightness);
-                        elif self._pingRoll % 3 == 2:
-                            _asyncRes = await self._send_setColor();
+                self._unacked = 0;
 
-                    asyncio.sleep(0.1);
-                    continue;
+                if _changed:
+                    self._chargeReplies("write", time.monotonic() - _writeStart);
+
+                if _sent is not None:
+                    self._commandStamps.pop(_sent, None);
+                    self._resolveReplies(_sent);
 
                 if _changed:
-                    _LOGGER.info(self.buildMqttPayload());
-                    self._mqttclient.publish(self._topic, self.buildMqttPayload());
-                asyncio.sleep(0.01);
+                    _payload = self.buildMqttPayload();
+                    TRACER.event(self._device_id, "state", payload=_payload);
+                    self._mqttclient.publish(self._topic, _payload);
 
             except Exception as e:
-                _LOGGER.error("Error: " + str(e));
+                _LOGGER.error("Error on device %s: %s", self._device_id, e);
 
-                try:
-                    if self._client is not None:
-                        await self._client.disconnect();
-                except Exception as e:
-                    pass;
+                await self._link.async_disconnect();
 
-                self._client = None;
+                await asyncio.sleep(2);
 
-                asyncio.sleep(2);
-        try:
-            if self._client is not None:
-                _LOGGER.info("Disconnecting from device: " + self._device_id);
-                await self._client.disconnect();
-        except Exception as e:
-            pass;
 
-        self._client = None;
+    async def _streamStep(self):
+        """Send the newest streamed frame, or leave streaming mode once the stream went quiet."""
+        _frame = self._stream.take();
 
+        if _frame is None:
+            if self._stream.expired:
+                self._endStream();
+                return True;
 
-    async def _taskStarter(self):
-        while self._taskCond:
-            _LOGGER.info("Starting task for device: " + self._device_id);
+            self._wake.clear();
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), self._stream.remaining());
+            return True;
 
-            asyncio.sleep(0.5);
+        _rgb, _receivedAt = _frame;
 
-            _coroutine = asyncio.new_event_loop();
-            asyncio.set_event_loop(_coroutine);
-            _coroutine.run_until_complete(self._taskCoroutine());
-            _coroutine.close();
+        # The next frame is taken only after this one is acknowledged, so the
+        # rate adapts to whatever the light sustains
+        if not await self._sendFrame(self._capabilities.encode_color(_rgb)):
+            return False;
 
+        self._stream.record_sent(_rgb, _receivedAt);
 
+        if time.monotonic() - self._streamReported >= STREAM_REPORT_INTERVAL:
+            self._streamReported = time.monotonic();
+            self._publishStreamStats();
 
-    async def _connect(self):
-        if self._client is not None and self._client.is_connected:
-            return True;
+        return True;
 
-        _LOGGER.info("Re/connecting to device: " + self._device_id);
+    def _endStream(self):
+        """Leave streaming mode and adopt the last streamed color as the state."""
+        _LOGGER.info("Device %s leaving streaming mode: %s", self._device_id, self._stream.as_dict());
 
-        try:
-            if self._client is not None:
-                await self._client.disconnect();
+        self._publishStreamStats();
 
-        except Exception as e:
-            pass;
+        if self._stream.last_sent is not None and not self._dirtyColor:
+            self.ControlMode = ControlMode.COLOR;
+            self.R, self.G, self.B = self._stream.last_sent;
+            self._ackColor();
+            self._mqttclient.publish(self._topic, self.buildMqttPayload());
 
-        self._client = None;
+        self._stream = None;
 
-        try:
-            self._client = BleakClient(self._device_id);
+    def _publishStreamStats(self):
+        self._mqttclient.publish(self._topic.rsplit("/", 1)[0] + "/stream/stats", json.dumps(self._stream.as_dict()));
 
-            await self._client.connect();
-            self._reconnect = 0;
+    def _pollDue(self):
+        if self._poller is None or not self._ackTracker.enabled:
+            return False;
 
-            _LOGGER.info("Connected to device: " + self._device_id);
-            return self._client.is_connected;
+        if not self._poller.is_due(self._device_id):
+            return False;
 
-        except Exception as e:
-            _LOGGER.error("Error: " + str(e));
-            self._reconnect += 1;
+        return self._poller.try_consume(adapter_for(self._hass, self._device_id), len(STATUS_QUERIES));
 
-            if self._reconnect >= 3:
-                self._reconnect = 0;
-                return False;
+    async def _query(self, command):
+        """Send a status query and adopt the state it reports."""
+        _reply = await self._request(build_frame(command, [], FRAME_QUERY));
 
+        if _reply is None:
             return False;
 
+        if self._ackTracker.enabled:
+            self._applyStatus(parse_status(_reply, self.ledmode) or {});
+
+        return True;
+
+    async def _poll(self):
+        """Query power, brightness and color to catch changes made outside Home Assistant."""
+        _changed = False;
+
+        for _command in STATUS_QUERIES.values():
+            _reply = await self._request(build_frame(_command, [], FRAME_QUERY));
+
+            if _reply is None:
+                return False;
+
+            _changed = self._applyStatus(parse_status(_reply, self.ledmode) or {}) or _changed;
+
+        self._poller.record(self._device_id, _changed);
+        return True;
+
+    def _applyStatus(self, status):
+        """Adopt reported state unless a change of ours is still pending."""
+        _changed = False;
+
+        if "state" in status and not self._dirtyState:
+            _state = 1 if status["state"] else 0;
+            _changed = _changed or _state != self.State;
+            self.State = _state;
+            self._acked["state"] = _state;
+
+        if "brightness" in status and not self._dirtyBrightness:
+            _brightness = min(status["brightness"] / self.brightness_max, 1);
+            _changed = _changed or math.floor(self.Brightness * self.brightness_max) != status["brightness"];
+            self.Brightness = _brightness;
+            self._acked["brightness"] = _brightness;
+
+        if "rgb_color" in status and not self._dirtyColor and self.ControlMode == ControlMode.COLOR:
+            _r, _g, _b = status["rgb_color"];
+            _changed = _changed or (_r, _g, _b) != (self.R, self.G, self.B);
+            self.R = _r;
+            self.G = _g;
+            self.B = _b;
+            self._ackColor();
+
+        if _changed:
+            _LOGGER.info("Device %s was changed outside Home Assistant", self._device_id);
+            TRACER.event(self._device_id, "external_change", status=status);
+            self._mqttclient.publish(self._topic, self.buildMqttPayload());
+
+        return _changed;
+
+    async def _onUnacked(self):
+        """Count an unacknowledged frame and reconnect after repeated misses."""
+        self._unacked += 1;
+
+        if self._unacked < MAX_UNACKED_RETRIES:
+            return;
+
+        _LOGGER.info("Device %s stopped acknowledging, reconnecting", self._device_id);
+        TRACER.event(self._device_id, "unacked_reconnect");
+        PACER.disconnected(self._link.address);
+        self._unacked = 0;
+
+        await self._link.async_disconnect();
+
+    async def _taskStarter(self):
+        # Warm-up connects deferred clients in waves, not all at once
+        await self._started.wait();
+
+        while self._taskCond:
+            _LOGGER.info("Starting task for device: %s", self._device_id);
+
+            await asyncio.sleep(0.5);
+            await self._taskCoroutine();
+
+
+
+    async def _connect(self):
+        """Connect through the shared link, or use the connection the light entity holds."""
+        if not self._link.is_connected:
+            self.LastConnectionAttempt = dt_util.utcnow();
+
+        return await self._link.async_connect();
+
 
     async def _send_setPower(self, state):
         if not isinstance(state, int) or state < 0 or state > 1:
             return ValueError("Invalid state");
 
         try:
-            return await self._send(LedCommand.POWER, [1 if state == 1 else 0]);
+            return await self._sendFrame(self._capabilities.encode_power(state == 1));
 
         except Exception as e:
-            _LOGGER.error("Send SetPower Error: " + str(e));
+            _LOGGER.error("Send SetPower Error: %s", e);
             return False;
 
     async def _send_setBrightness(self, brightness):
@@ -246,83 +835,50 @@ class Client:
             return ValueError("Invalid brightness");
 
         try:
-            return await self._send(LedCommand.BRIGHTNESS, [math.floor(brightness * self.brightness_max)]);
+            return await self._sendFrame(self._capabilities.encode_brightness(math.floor(brightness * self.brightness_max)));
 
         except Exception as e:
-            _LOGGER.error("Send SetBrightness Error: " + str(e));
+            _LOGGER.error("Send SetBrightness Error: %s", e);
             return False;
 
-    async def _send_setColor(self):
-        _R = self.R;
-        _G = self.G;
-        _B = self.B;
+    def _colorFrame(self, mode, rgb, temperature):
+        if mode == ControlMode.TEMPERATURE:
+            _TK = int(temperature);
 
-        _TK = 0;
-        _WR = 0;
-        _WG = 0;
-        _WB = 0;
+            # Models without native color temperature get the closest rgb
+            if self._capabilities.color_temp:
+                return self._capabilities.encode_color((0xFF, 0xFF, 0xFF), _TK);
 
-        if self.ControlMode == ControlMode.TEMPERATURE:
-            _R = _G = _B = 0xFF;
-            _TK = int(self.Temperature);
+            return self._capabilities.encode_color(kelvin_to_rgb(_TK));
 
-        if not isinstance(_R, int) or _R < 0 or _R > 255:
-            return ValueError("Invalid r");
-        if not isinstance(_G, int) or _G < 0 or _G > 255:
-            return ValueError("Invalid g");
-        if not isinstance(_B, int) or _B < 0 or _B > 255:
-            return ValueError("Invalid b");
+        return self._capabilities.encode_color(tuple(rgb));
 
+    async def _send_setColor(self):
+        try:
+            if self.ControlMode == ControlMode.COLOR:
+                for _value in (self.R, self.G, self.B):
+                    if not isinstance(_value, int) or _value < 0 or _value > 255:
+                        return ValueError("Invalid color");
+
+            return await self._sendFrame(self._colorFrame(self.ControlMode, (self.R, self.G, self.B), self.Temperature));
+        except Exception as e:
+            _LOGGER.error("Send SetColor Error: %s", e);
+            return False;
 
+    async def _send_setSegments(self):
+        """Send pending segments, one masked frame per distinct color."""
         try:
-            _payload = [self.ledmode]
-
-            if self.ledmode == LedMode.MODE_1501:
-
-                _payload.extend([
-                    0x01,
-                    _R,
-                    _G,
-                    _B,
-                    (_TK >> 8) & 0xFF,
-                    _TK & 0xFF,
-                    _WR,
-                    _WG,
-                    _WB,
-                    0xFF,
-                    0x74,
-                ])
-                """
-                    proven to work,  but let's see if the new method is better
-                     _payload.extend([
-                    0x01,
-                    self.R,
-                    self.G,
-                    self.B,
-                    0x00,
-                    0x00,
-                    0x00,
-                    0x00,
-                    0x00,
-                    0xFF,
-                    0x74,
-                ]) """
-
-            else: #MODE_D and MODE_2
-                _payload.extend([
-                    _R,
-                    _G,
-                    _B,
-                    (_TK >> 8) & 0xFF,
-                    _TK & 0xFF,
-                    _WR,
-                    _WG,
-                    _WB,
-                ])
-
-            return await self._send(LedCommand.COLOR, _payload);
+            for _rgb, _segments in pack_segment_colors(self._pendingSegments):
+                if not await self._sendFrame(self._capabilities.encode_color(_rgb, mask=segment_mask(_segments))):
+                    return False;
+
+                # Only acknowledged groups leave the pending set
+                for _index in _segments:
+                    self._segments[_index] = self._pendingSegments.pop(_index);
+
+            return True;
         except Exception as e:
-            _LOGGER.error("Send SetColor Error: " + str(e));
+            _LOGGER.error("Send SetSegments Error: %s", e);
             return False;
 
     def buildMqttPayload(self):
@@ -348,46 +904,19 @@ class Client:
                 "color_temp": int(1000000 / self.Temperature),
             });
 
-    async def _send(self, command, payload):
-        if not isinstance(command, int):
-            return ValueError("Invalid command");
-        if not isinstance(payload, bytes) and not (isinstance(payload, list) and all(isinstance(x, int) for x in payload)):
-            return ValueError("Invalid payload");
-        if len(payload) > 17:
-            return ValueError("Payload too long");
-
-        _LOGGER.info("Sending command: " + str(command) + " with payload: " + str(payload));
+    async def _send(self, command, payload, head=0x33):
+        frame = build_frame(command, payload, head);
 
-        command = command & 0xFF;
-        payload = bytes(payload);
+        return await self._sendFrame(frame);
 
-        frame = bytes([0x33, command]) + bytes(payload);
-        # pad frame data to 19 bytes (plus checksum)
-        frame = bytes([0] * (19 - len(frame)))
-
-        # checksum is calculated by XORing all data bytes
-        checksum = 0;
-        for b in frame:
-            checksum ^= b;
-
-        frame += bytes([checksum & 0xFF]);
-
-        try:
-            if self._client is not None and self._client.is_connected:
-                await self._client.write_gatt_char(UUID_CONTROL_CHARACTERISTIC, frame, False);
-                self._lastSent = time.time();
-                return True;
-        except Exception as e:
-            _LOGGER.error("Error: " + str(e));
-
-            try:
-                if self._client is not None:
-                    _LOGGER.info("Disconnecting from device: " + self._device_id);
-                    await self._client.disconnect();
-            except Exception as e:
-                pass;
+    async def _sendFrame(self, frame):
+        """Write a precompiled frame and return whether it was acknowledged."""
+        return await self._request(frame) is not None;
 
-            self._reconnect += 1;
-            self._client = None;
+    async def _request(self, frame, releaseAt=None, onWritten=None):
+        """Write a frame through the shared link and return the acknowledging reply, or None."""
+        _reply = await self._link.async_request(frame, self._capabilities, self._recorder, releaseAt, onWritten);
+        self._lastSent = time.time();
+        self.LastPacketAttempt = dt_util.utcnow();
 
-            return False;
\ No newline at end of file
+        return _reply;
@@ -1,24 +1,41 @@
 """Controller for Govee BLE lights."""
 
 from __future__ import annotations
-from collections import deque
 import homeassistant.util.dt as dt_util
-from homeassistant.core import HomeAssistant
-import bleak_retry_connector
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from datetime import timedelta
 import asyncio
+import contextlib
 from bleak import BleakClient
-import random
 import json
 import paho.mqtt.client as mqtt
 import sys
 import getopt
 import time
 import signal
+from .ack import AckTracker
+from .breaker import CircuitBreaker
 from .light import HACSGoveeBleLight
+from .concurrency import AdapterLimits
+from .const import DOMAIN
+from .models import LedCommand
+from .poller import StatePoller
+from .protocol import (
+    FRAME_COMMAND,
+    FRAME_QUERY,
+    STATUS_QUERIES,
+    build_frame,
+    parse_status,
+)
+from .presence import PresenceTracker
+from .recorder import TrafficRecorder
+from .pacing import PACER
+from .synchronized import SyncGroup
+from .transport import BleLink, get_transport
 import logging
 _LOGGER = logging.getLogger(__name__)
 
-UUID_CONTROL_CHARACTERISTIC = '00010203-0405-0607-0809-0a0b0c0d2b11'
 PYTHONASYNCIODEBUG = 1
 
 MQTT_SERVER: str = "";
@@ -33,291 +50,636 @@ RUNNING = True;
 class GoveeBluetoothController:
     """Controller for Govee BLE lights."""
 
-    def __init__(self, hass: HomeAssistant, address: str) -> None:
-        """Initialize the controller."""
+    def __init__(
+            self,
+            hass: HomeAssistant,
+            address: str,
+            poller: StatePoller | None = None,
+            recorder: TrafficRecorder | None = None,
+            client_class: type = BleakClient,
+            synchronized: bool | None = None,
+            ) -> None:
+        """Initialize the controller.
+
+        Passing a StatePoller enables background sync of changes made outside
+        Home Assistant once async_start is called. A TrafficRecorder records
+        every written frame, client_class replaces BleakClient for replays.
+        Connections go through the transport shared with the MQTT bridge, a
+        light exposed by both uses a single connection. With synchronized
+        the lights updated together connect and write all but their last
+        frame first, then release their last frames at one instant, unset
+        it follows the synchronized option of the configuration.
+        """
         self._hass = hass
         self._address = address
+        self._poller = poller
+        self._recorder = recorder
+        self._client_class = client_class
+        self._synchronized = (
+            synchronized if synchronized is not None else hass.data.get(DOMAIN, {}).get("synchronized", False)
+        )
         # Config attributes
-        self._MAX_RECONNECT_ATTEMPTS = 1
-        self._KEEP_ALIVE_PACKET_INTERVAL = 0.1
+        self._KEEP_ALIVE_PACKET_INTERVAL = 2 # status query interval while holding the connection
+        self._MAX_UNACKED_RETRIES = 3 # resends of an unacknowledged command before giving up
+        self._POLL_TICK = timedelta(seconds=5) # how often polling due dates are checked
+        self._DISCONNECTED_POLL_FACTOR = 3 # disconnected lights are only polled when this overdue
         self._KEEP_ALIVE_PACKET_MAX_DURATION = 10
         self._MAX_QUEUE_SIZE = 0 # 0 means no limit
-        self._PARALLEL_UPDATES = 10 # Number of active tasks to allow at once
+        self._SYNC_GATHER_WINDOW = 0.05 # seconds to collect the requests of a group before starting it
+        self._RETRY_BACKOFF = 2 # seconds before a light left dirty by its worker is retried, doubled per retry
+        self._RETRY_BACKOFF_MAX = 60
         # Existing attributes
         self._lights = set()
 
-
-        # type: asyncio.Queue[GoveeBleLight]
-        # Queued tasks
-        self._queued_lights= deque([])#asyncio.Queue[any] = asyncio.Queue(self._MAX_QUEUE_SIZE)
-
-
-        # type: set[GoveeBleLight]
-        # Lights that are currently processing
-        self._active_lights = set()
-        # type: set[asyncio.Task]
-        # Active tasks assume connection or at least attempted connection.
-        # Therefore, any new requests from the light will be dropped.
-        self._active_tasks = set()
-
-        self._lock = asyncio.Lock()
-
-
-
+        # Update requests, consumed by a single dispatcher coroutine which is
+        # the only place that starts or retires light workers
+        self._requests: asyncio.Queue[HACSGoveeBleLight | None] = asyncio.Queue(self._MAX_QUEUE_SIZE)
+        self._dispatcher: asyncio.Task | None = None
+        # Lights waiting for a free slot, keyed by mac address in request order
+        self._waiting: dict[str, HACSGoveeBleLight] = {}
+        # Workers of the lights that are processing, keyed by mac address.
+        # Requests for an active light only wake its worker.
+        self._active: dict[str, asyncio.Task] = {}
+        # Adapter of every active light and the number of active lights per adapter,
+        # each adapter runs as many workers as its learned concurrency limit allows
+        self._active_adapters: dict[str, str] = {}
+        self._adapter_load: dict[str, int] = {}
+        self._limits = AdapterLimits(hass)
+        # Active lights that were requested again while their worker ran
+        self._rerun: set[str] = set()
+        self._stats = {"requests": 0, "coalesced": 0, "workers": 0, "completed": 0}
+        # Sync group of every light started together with others in synchronized mode
+        self._sync_groups: dict[str, SyncGroup] = {}
+        self._sync_stats = {"groups": 0, "max_skew_ms": None, "last": None}
+
+        # Per light links of the shared transport, they own the connection,
+        # circuit breaker and acknowledgement tracker of the light
+        self._transport = get_transport(hass)
+        self._links: dict[str, BleLink] = {}
+        self._unsub_links = {}
+        # Retries of lights whose worker ended with updates still pending,
+        # and how often each was retried without getting up to date
+        self._retry_timers = {}
+        self._retries: dict[str, int] = {}
+        self._unsub_advertisements = {}
+
+        # Passive advertisement tracking, used to skip absent lights and rank queued ones
+        self._presence = PresenceTracker(hass)
+        # Lights whose updates wait for the light to advertise again
+        self._deferred_absent: set[str] = set()
+
+        # Per light wake-up events, keyed by mac address
+        self._wake_events: dict[str, asyncio.Event] = {}
+
+        # Lights that were granted airtime for a status poll
+        self._poll_requested: set[str] = set()
+        self._unsub_poll = None
+
+
+
+
+    async def async_start(self):
+        """Restore the learned adapter limits and start background sync if a poller was configured."""
+        await self._limits.async_load()
+        if self._poller is not None and self._unsub_poll is None:
+            self._unsub_poll = async_track_time_interval(self._hass, self._async_poll_tick, self._POLL_TICK)
+
+    async def async_stop(self):
+        """Stop background sync, the dispatcher and its workers."""
+        if self._unsub_poll is not None:
+            self._unsub_poll()
+            self._unsub_poll = None
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for task in list(self._active.values()):
+            task.cancel()
+        for cancel in self._retry_timers.values():
+            cancel()
+        self._retry_timers.clear()
+
+    def as_dict(self) -> dict:
+        """Return the dispatcher statistics for diagnostics."""
+        return {
+            **self._stats,
+            "active": len(self._active),
+            "waiting": len(self._waiting),
+            "adapters": {
+                adapter: {**limits, "active": self._adapter_load.get(adapter, 0)}
+                for adapter, limits in self._limits.as_dict().items()
+            },
+            "workers_per_request": round(self._stats["workers"] / self._stats["requests"], 2) if self._stats["requests"] else 0,
+            "sync": self._sync_stats if self._synchronized else None,
+            "debounce_saved": sum(light.debounce_saved for light in self._lights),
+        }
+
+
+
+
+    def light_diagnostics(self) -> dict[str, dict]:
+        """Return the diagnostic values of every registered light, keyed by address."""
+        return {light.mac_address: light.diagnostics for light in self._lights}
+
+    @property
+    def presence(self) -> PresenceTracker:
+        """Return the advertisement tracker."""
+        return self._presence
 
     def register_light(self, light: HACSGoveeBleLight):
         """Register a light entity with the controller."""
         self._lights.add(light)  # .append(light)
+        link = self._link(light)
+        self._unsub_links[light.mac_address] = (
+            link.add_disconnect_listener(lambda: self._on_link_lost(light)),
+            link.add_probe_listener(lambda: self._on_link_probe(light)),
+        )
+        self._update_breaker_attr(light)
+
+        self._presence.async_track(light.mac_address)
+        self._unsub_advertisements[light.mac_address] = self._presence.async_add_listener(
+            light.mac_address, lambda: self._on_advertisement(light)
+        )
+
+    def unregister_light(self, light: HACSGoveeBleLight):
+        """Unregister a light entity from the controller."""
+        self._lights.discard(light)
+        if (unsub := self._unsub_advertisements.pop(light.mac_address, None)) is not None:
+            unsub()
+        self._presence.async_untrack(light.mac_address)
+        self._deferred_absent.discard(light.mac_address)
+        self._waiting.pop(light.mac_address, None)
+        self._rerun.discard(light.mac_address)
+        if (cancel := self._retry_timers.pop(light.mac_address, None)) is not None:
+            cancel()
+        self._retries.pop(light.mac_address, None)
+        self._wake_events.pop(light.mac_address, None)
+        self._poll_requested.discard(light.mac_address)
+        if self._poller is not None:
+            self._poller.forget(light.mac_address)
+        for unsub in self._unsub_links.pop(light.mac_address, ()):
+            unsub()
+        if self._links.pop(light.mac_address, None) is not None:
+            self._transport.release(light.mac_address, self)
+
+    def _link(self, light: HACSGoveeBleLight) -> BleLink:
+        """Return the transport link of a light."""
+        if (link := self._links.get(light.mac_address)) is None:
+            link = self._links[light.mac_address] = self._transport.acquire(light.mac_address, self, self._client_class)
+        return link
+
+    @callback
+    def _on_link_lost(self, light: HACSGoveeBleLight):
+        """Show that the connection was lost, whichever front end noticed."""
+        light.client = None
 
 
-    """Queue management logic"""
-    async def queue_update(self, light: HACSGoveeBleLight):
-        """Queue an update for a light."""
-        _LOGGER.debug("Received update request for %s", light.debug_name)
-        async with self._lock:
-            if light not in self._queued_lights and light not in self._active_lights:
-                self._hass.async_create_task(self._add_task(light))
-            else:
-                _LOGGER.debug("Light %s is already queued or processing", light.debug_name)
+    """Circuit breaker logic"""
+    def breaker(self, light: HACSGoveeBleLight) -> CircuitBreaker:
+        """Return the circuit breaker of a light, shared with the MQTT bridge."""
+        return self._link(light).breaker
+
+    def _update_breaker_attr(self, light: HACSGoveeBleLight):
+        light.set_state_attr("circuit_breaker", self.breaker(light).as_dict())
+
+    @callback
+    def _on_advertisement(self, light: HACSGoveeBleLight):
+        """Resume a light that was absent or had an open breaker as soon as it advertises."""
+        resume = False
+        if light.mac_address in self._deferred_absent:
+            self._deferred_absent.discard(light.mac_address)
+            _LOGGER.debug("%s is present again, resuming deferred update", light.debug_name)
+            resume = True
+        # The link wakes every front end of the light if this opens a probe
+        self._link(light).on_advertisement()
+        if resume and light.is_dirty():
+            self.queue_update(light)
+
+    @callback
+    def _on_link_probe(self, light: HACSGoveeBleLight):
+        """Probe a light with an open breaker as soon as it advertises, whichever front end heard it."""
+        _LOGGER.debug("%s is advertising again, probing connection", light.debug_name)
+        self._update_breaker_attr(light)
+        if light.is_dirty():
+            self.queue_update(light)
+
+    def _schedule_retry(self, light: HACSGoveeBleLight, delay: float):
+        """Retry a dirty light once a backoff has elapsed."""
+        if (cancel := self._retry_timers.pop(light.mac_address, None)) is not None:
+            cancel()
+
+        @callback
+        def _async_retry(_now):
+            self._retry_timers.pop(light.mac_address, None)
+            self._update_breaker_attr(light)
+            if light.is_dirty():
+                self.queue_update(light)
+
+        self._retry_timers[light.mac_address] = async_call_later(self._hass, delay, _async_retry)
+
+    def _schedule_backoff_retry(self, light: HACSGoveeBleLight):
+        """Retry a light its worker left dirty, backing off further with every retry in a row."""
+        retries = self._retries.get(light.mac_address, 0)
+        self._retries[light.mac_address] = retries + 1
+        delay = min(self._RETRY_BACKOFF * 2 ** retries, self._RETRY_BACKOFF_MAX)
+        _LOGGER.debug("Update of %s is incomplete, retrying in %.1fs", light.debug_name, delay)
+        self._schedule_retry(light, delay)
+
+    def _on_connect_result(self, light: HACSGoveeBleLight, connected: bool):
+        """Schedule the retry of a light whose failed attempt opened the breaker."""
+        breaker = self.breaker(light)
+        if not connected and breaker.is_open:
+            _LOGGER.debug("Circuit opened for %s, retrying in %.1fs", light.debug_name, breaker.seconds_until_retry())
+            self._schedule_retry(light, breaker.seconds_until_retry())
+        self._update_breaker_attr(light)
+
+
+    def ack_tracker(self, light: HACSGoveeBleLight) -> AckTracker:
+        """Return the acknowledgement tracker of a light."""
+        return self._link(light).tracker
+
+    def _wake_event(self, light: HACSGoveeBleLight) -> asyncio.Event:
+        if light.mac_address not in self._wake_events:
+            self._wake_events[light.mac_address] = asyncio.Event()
+        return self._wake_events[light.mac_address]
+
+
+    """State sync logic"""
+    @callback
+    def _async_poll_tick(self, _now=None):
+        """Request polls for lights that are due, within the adapter airtime budget."""
+        for light in list(self._lights):
+            if light.mac_address in self._poll_requested:
+                continue
+            if light.mac_address in self._active or light.mac_address in self._waiting:
+                continue # the keep-alive of an active light polls on its own
+            if self.breaker(light).is_open or not self._presence.is_present(light.mac_address):
+                continue
+
+            # Idle open connections are polled when due, reconnecting only pays off when long overdue
+            connected = self._link(light).is_connected
+            if not self._poller.is_due(light.mac_address, 1 if connected else self._DISCONNECTED_POLL_FACTOR):
+                continue
+            if not self._poller.try_consume(self._presence.adapter(light.mac_address), len(STATUS_QUERIES)):
+                continue
+
+            self._poll_requested.add(light.mac_address)
+            self.queue_update(light)
+
+    def _poll_due(self, light: HACSGoveeBleLight) -> bool:
+        if self._poller is None or not self.ack_tracker(light).enabled:
+            return False
+        if light.mac_address in self._poll_requested:
+            return True
+        if not self._poller.is_due(light.mac_address):
+            return False
+        return self._poller.try_consume(self._presence.adapter(light.mac_address), len(STATUS_QUERIES))
+
+    async def _async_query(self, light: HACSGoveeBleLight, cmd) -> dict | None:
+        """Send a status query and return the parsed reply, or None if unanswered."""
+        reply = await self._async_write_frame(light, build_frame(cmd, [], FRAME_QUERY))
+        if reply is None:
+            return None
+        if not self.ack_tracker(light).enabled:
+            return {} # the written frame came back, there is no reply to parse
+        return parse_status(reply, light.capabilities.led_mode) or {}
+
+    async def _async_poll_light(self, light: HACSGoveeBleLight) -> bool:
+        """Query power, brightness and color and adopt what the light reports."""
+        self._poll_requested.discard(light.mac_address)
+        status = {}
+        for cmd in STATUS_QUERIES.values():
+            result = await self._async_query(light, cmd)
+            if result is None:
+                return False
+            status.update(result)
+
+        self._poller.record(light.mac_address, light.apply_polled_state(status))
+        return True
 
 
-    async def _on_task_done(self, task, light: HACSGoveeBleLight):
+    """Queue management logic"""
+    @callback
+    def queue_update(self, light: HACSGoveeBleLight):
+        """Ask the dispatcher to bring a light up to date, returns at once."""
+        self._stats["requests"] += 1
+        self._requests.put_nowait(light)
+        if self._dispatcher is None:
+            self._dispatcher = self._hass.async_create_background_task(
+                self._async_dispatch(), f"{DOMAIN} dispatcher {self._address}"
+            )
+
+    async def _async_dispatch(self):
+        """Accept update requests and start workers while slots are free.
+
+        A worker that finishes puts None on the request queue, so freeing its
+        slot and starting the next light happen here as well and no state is
+        shared between concurrent writers.
+        """
+        while True:
+            light = await self._requests.get()
+            if self._synchronized and light is not None:
+                # The entities of a group ask within milliseconds of each other
+                await asyncio.sleep(self._SYNC_GATHER_WINDOW)
+            while True:
+                if light is not None:
+                    self._accept(light)
+                if self._requests.empty():
+                    break
+                light = self._requests.get_nowait()
+
+            started = []
+            while (light := self._pop_next_queued()) is not None:
+                self._start_worker(light)
+                started.append(light.mac_address)
+
+            # Workers have not run yet, they all find their group
+            if self._synchronized and len(started) > 1:
+                group = SyncGroup(started)
+                for address in started:
+                    self._sync_groups[address] = group
+
+    def _accept(self, light: HACSGoveeBleLight):
+        """Take a request into the waiting lights unless it can be merged or deferred."""
+        if light.mac_address in self._active:
+            _LOGGER.debug("Light %s is already processing", light.debug_name)
+            self._stats["coalesced"] += 1
+            self._rerun.add(light.mac_address)
+            # Interrupt the keep-alive of an active light so it picks up the update
+            self._wake_event(light).set()
+            return
+        if light.mac_address in self._waiting:
+            self._stats["coalesced"] += 1
+            return
+        if self.breaker(light).is_open:
+            # The light keeps its dirty state and is retried when the breaker allows it
+            _LOGGER.debug("Circuit open for %s, deferring update", light.debug_name)
+            return
+        if not self._presence.is_present(light.mac_address):
+            # Don't spend a connection attempt, the next advertisement resumes the update
+            _LOGGER.debug("%s is not advertising, deferring update", light.debug_name)
+            self._deferred_absent.add(light.mac_address)
+            return
+        self._waiting[light.mac_address] = light
+
+    def _has_slot(self, adapter: str) -> bool:
+        return self._adapter_load.get(adapter, 0) < self._limits.limit(adapter)
+
+    def _start_worker(self, light: HACSGoveeBleLight):
+        adapter = self._presence.adapter(light.mac_address)
+        self._adapter_load[adapter] = self._adapter_load.get(adapter, 0) + 1
+        self._active_adapters[light.mac_address] = adapter
+        _LOGGER.debug("Starting update of %s, %d active on %s", light.debug_name, self._adapter_load[adapter], adapter)
+        self._stats["workers"] += 1
+        self._active[light.mac_address] = self._hass.async_create_task(self._async_run_worker(light))
+
+    async def _async_run_worker(self, light: HACSGoveeBleLight):
         try:
-            # Attempt to remove the task from the active tasks set
-            self._active_tasks.remove(task)
-            light._task = None
-            # Attempt to remove the light from the active lights set
-            self._active_lights.remove(light)
-            _LOGGER.debug("Task finished for %s, %d tasks remaining", light.debug_name, len(self._active_tasks))
+            await self._async_process_light_update(light)
         except Exception as e:
-            # Log any errors that occurred during task removal or completion
-            _LOGGER.error(f"Error finishing task for {light.name}: {e}")
+            _LOGGER.error("Error updating %s: %s", light.debug_name, e)
         finally:
-            async with self._lock:
-                # Safe to remove the light from tracking as the update is done
-                if light in self._active_lights:
-                    self._active_lights.remove(light)
-                if task in self._active_tasks:
-                    self._active_tasks.remove(task)
-                # Check if there are queued tasks to process next
-                await self._manage_task_queue()
-
-
-    async def _add_task(self, light: HACSGoveeBleLight):
-        """Handle tasks in the queue, respecting the parallel_updates limit."""
-        try:
-            async with self._lock:
-                if light in self._queued_lights or light in self._active_lights:
-                    _LOGGER.debug(f"Update already queued or in progress for {light.debug_name}")
-                    return
-
-                if len(self._active_tasks) >= self._PARALLEL_UPDATES:
-                    _LOGGER.debug("Max active tasks reached, queueing light update")
-                    self._queued_lights.append(light) # await self._queued_lights.put(light)
-                else:
-                    _LOGGER.debug("Adding light update task to active tasks")
-                    task = self._hass.async_create_task(self._async_process_light_update(light))
-                    self._active_tasks.add(task)
-                    self._active_lights.add(light)
-                    light._task = task
-
-                    def on_task_done(task):
-                        self._hass.async_create_task(self._on_task_done(task, light))
-
-                    task.add_done_callback(on_task_done)
-        except Exception as e:
-            _LOGGER.error("Error handling task queue: %s", str(e))
-            if light in self._active_lights:
-                self._active_lights.remove(light)
-            if light._task is not None:
-                light._task.cancel()
+            self._leave_sync_group(light)
+            self._active.pop(light.mac_address, None)
+            if (adapter := self._active_adapters.pop(light.mac_address, None)) is not None:
+                self._adapter_load[adapter] -= 1
+            self._stats["completed"] += 1
+            # A request that arrived after the worker's last look at the light
+            # would otherwise wait for the next one
+            if light.mac_address in self._rerun:
+                self._rerun.discard(light.mac_address)
                 if light.is_dirty():
-                    self.queue_update(light)  # Retry
-
-
-
-    async def _manage_task_queue(self):
-       # Process the task queue if not already at capacity
-        try:
-            async with self._lock:
-                if len(self._active_tasks) < self._PARALLEL_UPDATES and not len(self._queued_lights) == 0:
-                    queued_light = self._queued_lights.popleft()
-                    _LOGGER.debug("Processing queued light update for %s", queued_light.debug_name)
-                    if queued_light not in self._active_lights and queued_light._task is None:
-                        task = self._hass.async_create_task(self._async_process_light_update(queued_light))
-                        self._active_tasks.add(task)
-                        queued_light._task = task
-
-                        def on_task_done(task):
-                            self._hass.async_create_task(self._on_task_done(task, queued_light))
-
-                        task.add_done_callback(on_task_done)
-        except Exception as e:
-            _LOGGER.error("Error processing task queue: %s", str(e))
-
+                    self._requests.put_nowait(light)
+            elif not light.is_dirty():
+                self._retries.pop(light.mac_address, None)
+            elif light.mac_address not in self._retry_timers and self._dispatcher is not None:
+                # A failed connect that left the breaker closed, or a light that
+                # stopped acknowledging, would otherwise wait for the next command
+                self._schedule_backoff_retry(light)
+            self._requests.put_nowait(None)
+
+
+    def _pop_next_queued(self) -> HACSGoveeBleLight | None:
+        """Pop the waiting light that is most likely to connect quickly.
+
+        Lights with an open breaker or that stopped advertising are dropped
+        (they are resumed by their timer or next advertisement). Of the lights
+        whose adapter has a free slot the one with the strongest signal wins.
+        Equal signals keep their request order.
+        """
+        for queued_light in list(self._waiting.values()):
+            if self.breaker(queued_light).is_open:
+                _LOGGER.debug("Dropping queued update for %s, circuit open", queued_light.debug_name)
+                del self._waiting[queued_light.mac_address]
+            elif not self._presence.is_present(queued_light.mac_address):
+                _LOGGER.debug("Deferring queued update for %s, not advertising", queued_light.debug_name)
+                del self._waiting[queued_light.mac_address]
+                self._deferred_absent.add(queued_light.mac_address)
+
+        ready = [
+            queued_light for queued_light in self._waiting.values()
+            if self._has_slot(self._presence.adapter(queued_light.mac_address))
+        ]
+        if len(ready) == 0:
+            return None
+
+        best = max(ready, key=lambda queued: self._presence.rssi(queued.mac_address) or -127)
+        del self._waiting[best.mac_address]
+        return best
+
+    def _slot_wanted(self, light: HACSGoveeBleLight) -> bool:
+        """Return true if a waiting light needs the adapter slot this light holds."""
+        adapter = self._active_adapters.get(light.mac_address)
+        if adapter is None or self._has_slot(adapter):
+            return False
+        return any(self._presence.adapter(address) == adapter for address in self._waiting)
 
     async def _async_process_light_update(self, light: HACSGoveeBleLight):
-        """Manage sending packets to a light with retry and keep-alive logic."""
-        attempt = 0
+        """Manage sending packets to a light with keep-alive logic.
+
+        A worker makes a single connection attempt and gives up its adapter
+        slot when that fails. A light it leaves dirty is retried after the
+        breaker's backoff once that opened, after a growing backoff otherwise.
+        """
+        unacked = 0
         _LOGGER.debug("Processing update for %s", light.debug_name)
-        light.set_state_attr("send_packet_attempts", attempt)
-        while attempt < self._MAX_RECONNECT_ATTEMPTS:
+        light.set_diagnostic("send_packet_attempts", 0)
+        while True:
             try:
                 if not await self._async_connect(light):
-                    attempt += 1
-                    light.set_state_attr("send_packet_attempts", attempt)
-                    continue
+                    light.set_diagnostic("send_packet_attempts", 1)
+                    break
 
                 if light._dirty_state:
-                    cmd, payload = light.get_power_payload()
-                    result = await self._async_send_data(light, cmd, payload)
-                    if result:
-                        light.mark_clean("state")
-                    await asyncio.sleep(0.1)
+                    property_name = "state"
+                    frame = light.get_power_frame()
                 elif light._dirty_brightness:
-                    cmd, payload = light.get_brightness_payload()
-                    result = await self._async_send_data(light, cmd, payload)
-                    if result:
-                        light.mark_clean("brightness")
-                    await asyncio.sleep(0.1)
+                    property_name = "brightness"
+                    frame = light.get_brightness_frame()
                 elif light._dirty_rgb_color:
-                    cmd, payload = light.get_rgb_color_payload()
-                    result = await self._async_send_data(light, cmd, payload)
-                    if result:
-                        light.mark_clean("rgb_color")
-                    await asyncio.sleep(0.1)
+                    property_name = "rgb_color"
+                    frame = light.get_rgb_color_frame()
+                elif light._dirty_segments:
+                    # One frame per distinct color, acknowledged group by group
+                    property_name = "segments"
+                    frame = light.get_segment_frame()
                 else: # No updates needed
-                    attempt = 0
-                    light.set_state_attr("send_packet_attempts", attempt)
-                    #Keep-alive logic if needed
-                    await self._handle_keep_alive(light)
+                    light.set_diagnostic("send_packet_attempts", 0)
+                    # Don't hold back the group while keeping the connection
+                    self._leave_sync_group(light)
+                    # The burst is complete, show its final state without waiting for the throttle
+                    light.flush_state()
+                    #Keep-alive logic if the model benefits from holding the connection
+                    if light.capabilities.keep_connection and await self._handle_keep_alive(light):
+                        continue # New updates arrived while holding the connection
                     break
+
+                # The last frame of a synchronized light waits for the rest of its group
+                if (group := self._sync_groups.get(light.mac_address)) is not None and light.pending_frame_count() == 1:
+                    reply = await self._async_write_synchronized(light, frame, group)
+                else:
+                    reply = await self._async_write_frame(light, frame)
+
+                # The next frame goes out as soon as the light acknowledges this one
+                if reply is not None:
+                    light.mark_acknowledged(property_name)
+                    unacked = 0
+                else:
+                    # Only the unacknowledged command is resent, acknowledged ones stay clean
+                    unacked += 1
+                    if unacked >= self._MAX_UNACKED_RETRIES:
+                        _LOGGER.debug("%s did not acknowledge %s, giving up", light.debug_name, property_name)
+                        light.set_diagnostic("send_packet_attempts", 1)
+                        break
             except Exception as e:
                 _LOGGER.error("Failed to send packet to %s: %s", light.debug_name, e)
-                attempt += 1
-                light.set_state_attr("send_packet_attempts", attempt)
-                await asyncio.sleep(random.uniform(0.7,1.3))
+                light.set_diagnostic("send_packet_attempts", 1)
+                break
 
+        light.flush_state()
 
-    # Improve response time by sending keep-alive packets to lights that are not being updated
-    async def _handle_keep_alive(self, light: HACSGoveeBleLight):
-        """Handle keep-alive logic for a light."""
+    async def _async_write_synchronized(self, light: HACSGoveeBleLight, frame: bytes, group: SyncGroup) -> bytes | None:
+        """Write a light's last frame at the instant its group is released."""
+        release_at = await group.async_primed(light.mac_address)
+        try:
+            return await self._async_write_frame(
+                light, frame, release_at, lambda written_at: group.written(light.mac_address, written_at)
+            )
+        finally:
+            self._leave_sync_group(light)
+
+    def _leave_sync_group(self, light: HACSGoveeBleLight):
+        """Take a light out of its group, report the group's skew once its last light left."""
+        if (group := self._sync_groups.pop(light.mac_address, None)) is None:
+            return
+        group.withdraw(light.mac_address)
+        if any(other is group for other in self._sync_groups.values()):
+            return
+
+        result = group.as_dict()
+        self._sync_stats["groups"] += 1
+        self._sync_stats["last"] = result
+        if result["skew_ms"] is not None:
+            self._sync_stats["max_skew_ms"] = max(self._sync_stats["max_skew_ms"] or 0, result["skew_ms"])
+        _LOGGER.debug("Released %d of %d lights with %sms skew", result["written"], result["lights"], result["skew_ms"])
+
+    # Improve response time by keeping the connection open for lights that are not being updated
+    async def _handle_keep_alive(self, light: HACSGoveeBleLight) -> bool:
+        """Hold the connection with status queries, return true if new updates arrived."""
         _start_time = dt_util.utcnow()
+        _wake = self._wake_event(light)
         while (dt_util.utcnow() - _start_time).total_seconds() < self._KEEP_ALIVE_PACKET_MAX_DURATION:
-            if len(self._active_tasks) >= self._PARALLEL_UPDATES and not len(self._queued_lights) == 0:
-                break # If the queue is full, don't send keep-alive packets
+            if light.is_dirty():
+                return True
+            if self._slot_wanted(light):
+                break # Hand the adapter slot to a waiting light instead of holding it
 
             try:
                 if not await self._async_connect(light):
-                    continue
-                cmd, payload = light.get_power_payload()
-                await self._async_send_data(light, cmd, payload)
-                await asyncio.sleep(self._KEEP_ALIVE_PACKET_INTERVAL)
+                    break
+                # A status query keeps the link up without resending any state,
+                # a full state poll piggybacks on it when one is due
+                if self._poll_due(light):
+                    if not await self._async_poll_light(light):
+                        _LOGGER.debug("State poll of %s was not answered", light.debug_name)
+                        break
+                else:
+                    status = await self._async_query(light, LedCommand.POWER)
+                    if status is None:
+                        _LOGGER.debug("Keep-alive to %s was not answered", light.debug_name)
+                        break
+                    light.apply_polled_state(status)
             except Exception as e:
                 _LOGGER.error("Failed to send keep-alive packet to %s: %s", light.debug_name, e)
-                await asyncio.sleep(self._KEEP_ALIVE_PACKET_INTERVAL)
+
+            _wake.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(_wake.wait(), self._KEEP_ALIVE_PACKET_INTERVAL)
+        return light.is_dirty()
 
 
     """Bluetooth communication logic"""
     async def _async_connect(self, light: HACSGoveeBleLight):
-        """Connect to a light."""
+        """Connect to a light, or adopt the connection the MQTT bridge holds."""
         _LOGGER.debug("Connecting to %s", light.debug_name)
-        # formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        light.set_state_attr("last_connection_attempt", dt_util.utcnow())
-        if light.client is not None and light.client.is_connected:
+        light.set_diagnostic("last_connection_attempt", dt_util.utcnow())
+        link = self._link(light)
+        if link.is_connected:
             _LOGGER.debug("Already connected to %s", light.debug_name)
+            light.client = link.client
             return True
 
-        try:
-            if light.client is not None:
-                _LOGGER.debug("Reconnecting to %s", light.debug_name)
-                await self._async_disconnect(light)
-        except Exception as e:
-            _LOGGER.error("Failed to disconnect from %s: %s", light.debug_name, e)
-
-        light.client = None
-
-        def _disconnected_callback(client):
-            if light.client == client:
-                light.client = None
-                light.set_state_attr("connection_status", "Disconnected")
-                _LOGGER.debug("Disconnected from %s", light.debug_name)
-
-        try:
-            light.set_state_attr("connection_status", "Connecting...")
-            _LOGGER.debug("Establishing connection to %s", light.debug_name)
-            light.client = await bleak_retry_connector.establish_connection(
-                client_class = BleakClient,
-                device = light.ble_device,
-                name = light.unique_id,
-                disconnected_callback = _disconnected_callback,
-                max_attempts = 10,
-            )
+        if self.breaker(light).is_open:
+            _LOGGER.debug("Circuit open for %s, skipping connection attempt", light.debug_name)
+            self._update_breaker_attr(light)
+            return False
+
+        adapter = self._presence.adapter(light.mac_address)
+        attempts = link.attempts
+        started = time.monotonic()
+        light.set_state_attr("connection_status", "Connecting...")
+        connected = await link.async_connect(light.ble_device)
+        # Only attempts of our own tell something about the adapter
+        if link.attempts != attempts:
+            self._limits.record_connect(adapter, connected, time.monotonic() - started)
+
+        if connected:
             _LOGGER.debug("Connected to %s", light.debug_name)
+            light.client = link.client
             light.reconnect = 0
-            light.set_state_attr("connection_status", "Connected")
-
-            return light.client.is_connected
-        except Exception as e:
-            _LOGGER.error("Failed to establish connection to %s: %s", light.debug_name, e)
+        else:
             light.set_state_attr("connection_status", "Failed to connect")
             light.reconnect += 1
-            if light.client is not None:
-                await self._async_disconnect(light)
-        return False
-
-
-
-    async def _async_disconnect(self, light: HACSGoveeBleLight):
-        """Disconnect from a light."""
-        if light.client is not None and light.client.is_connected:
-            _LOGGER.debug("Disconnecting from %s", light.debug_name)
-            try:
-                await light.client.disconnect()
-            except Exception as e:
-                _LOGGER.error("Failed to disconnect from %s: %s", light.debug_name, e)
-
-        light.client = None
-
-    async def _async_send_data(self, light: HACSGoveeBleLight, cmd, payload):
-        """Send data to a light."""
-        if not isinstance(cmd, int):
-            raise TypeError('Invalid command')
-        if not isinstance(payload, bytes) and not (isinstance(payload, list) and all(isinstance(x, int) for x in payload)):
-            raise ValueError('Invalid payload')
-        if len(payload) > 17:
-            raise ValueError('Payload too long')
+        light.set_diagnostic("ack", link.tracker.as_dict())
+        self._on_connect_result(light, connected)
+        return connected
 
+    async def _async_send_data(self, light: HACSGoveeBleLight, cmd, payload, head=FRAME_COMMAND):
+        """Send data to a light and return whether it was acknowledged."""
+        frame = build_frame(cmd, payload, head)
         _LOGGER.debug("Sending command %s with payload %s to %s", hex(cmd), payload, light.debug_name)
-
-        cmd = cmd & 0xFF
-        payload = bytes(payload)
-
-        frame = bytes([0x33, cmd]) + bytes(payload)
-        # pad frame data to 19 bytes (plus checksum)
-        frame += bytes([0] * (19 - len(frame)))
-
-        # The checksum is calculated by XORing all data bytes
-        checksum = 0
-        for b in frame:
-            checksum ^= b
-
-        frame += bytes([checksum & 0xFF])
-
-        try:
-            if light.client is not None and light.client.is_connected:
-                await light.client.write_gatt_char(UUID_CONTROL_CHARACTERISTIC, frame, False)
-                light.set_state_attr("last_packet_attempt", dt_util.utcnow())
-                _LOGGER.debug("Sent data to %s: %s", light.debug_name, frame.hex())
-                return True
-        except Exception as e:
-            _LOGGER.error("Failed to send data to %s: %s", light.debug_name, e)
-            try:
-                if light.client is not None and light.client.is_connected:
-                    await self._async_disconnect(light)
-            except Exception as e:
-                _LOGGER.error("Failed to disconnect from %s: %s", light.debug_name, e)
-
-        light.client = None
-
-        return False
+        return await self._async_write_frame(light, frame) is not None
+
+    async def _async_write_frame(
+            self,
+            light: HACSGoveeBleLight,
+            frame: bytes,
+            release_at: float | None = None,
+            on_written=None,
+            ) -> bytes | None:
+        """Write a frame through the light's link and wait for the light to acknowledge it.
+
+        Returns the reply frame, the written frame itself if the light does
+        not support notifications, or None if the write failed or was not
+        acknowledged in time. release_at holds the frame until that
+        monotonic instant, on_written gets the time the write completed.
+        """
+        link = self._link(light)
+        reply = await link.async_request(frame, light.capabilities, self._recorder, release_at, on_written)
+        light.set_diagnostic("last_packet_attempt", dt_util.utcnow())
+        if reply is None:
+            _LOGGER.debug("No acknowledgement from %s for %s", light.debug_name, frame.hex())
+        light.set_diagnostic("ack", link.tracker.as_dict())
+        light.set_diagnostic("pacing", PACER.as_dict(link.address))
+        if not link.is_connected:
+            light.client = None
+        return reply
@@ -4,6 +4,12 @@
 """
 import math
 
+import numpy as np
+
+KELVIN_MIN = 1000
+KELVIN_MAX = 40000
+KELVIN_STEP = 100 # resolution of the lookup table
+
 
 def clamp(value: int, lower: int, upper: int) -> int:
     """Clamp a value to a specified range."""
@@ -18,7 +24,7 @@ def kelvin_to_rgb(
     Uses an approximation based on:
     http://www.tannerhelland.com/4435/convert-temperature-rgb-algorithm-code/.
     """
-    kelvin = clamp(kelvin, 1000, 40000)
+    kelvin = clamp(kelvin, KELVIN_MIN, KELVIN_MAX)
 
     temperature = kelvin / 100.0
 
@@ -40,3 +46,19 @@ def kelvin_to_rgb(
         blue = 138.5177312231 * math.log(temperature - 10) - 305.0447927307
 
     return clamp(int(red), 0, 255), clamp(int(green), 0, 255), clamp(int(blue), 0, 255)
+
+
+# One row per KELVIN_STEP from KELVIN_MIN to KELVIN_MAX, for converting many lights at once
+KELVIN_TABLE = np.array(
+    [kelvin_to_rgb(kelvin) for kelvin in range(KELVIN_MIN, KELVIN_MAX + 1, KELVIN_STEP)],
+    dtype=np.uint8,
+)
+
+
+def kelvin_to_rgb_array(kelvins) -> np.ndarray:
+    """Look up the rgb values of an array of color temperatures, one row per temperature.
+
+    Temperatures are rounded to the nearest KELVIN_STEP.
+    """
+    kelvins = np.clip(np.asarray(kelvins, dtype=np.float64), KELVIN_MIN, KELVIN_MAX)
+    return KELVIN_TABLE[np.rint((kelvins - KELVIN_MIN) / KELVIN_STEP).astype(np.intp)]
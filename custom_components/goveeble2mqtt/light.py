@@ -1,13 +1,11 @@
 """Support for Govee BLE lights."""
 from __future__ import annotations
 import math
-import asyncio
 import logging
-import random
 
 
 import time
-import bleak_retry_connector
+import voluptuous as vol
 
 from bleak import BleakClient
 from bleak.backends.device import BLEDevice
@@ -19,20 +17,32 @@ from homeassistant.components.light import (
     ColorMode,
     LightEntity)
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv, entity_platform
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.util.color import value_to_brightness
 from homeassistant.util.color import brightness_to_value
 
-from .const import DOMAIN
-from .models import LedCommand, LedMode, ModelInfo
+from .const import (
+    CONF_DEBOUNCE_WINDOW,
+    DEFAULT_DEBOUNCE_WINDOW,
+    DEFAULT_STATE_WRITE_INTERVAL,
+    DOMAIN,
+    SERVICE_SET_SEGMENT_COLORS,
+)
+from .debounce import AttributeDebouncer, debounce_windows
 from .kelvin_rgb import kelvin_to_rgb
+from .protocol import pack_segment_colors, segment_mask
+from .registry import REGISTRY
+from .state_writer import ThrottledStateWriter
 
 _LOGGER = logging.getLogger(__name__)
-UUID_CONTROL_CHARACTERISTIC = '00010203-0405-0607-0809-0a0b0c0d2b11'
 
 PARALLEL_UPDATES = 1
 
+RGB_SCHEMA = vol.All(vol.Coerce(tuple), vol.ExactSequence((cv.byte,) * 3))
+
 def clamp(value, min_value, max_value):
     """Clamp value to be between min_value and max_value."""
     return max(min(value, max_value), min_value)
@@ -62,13 +72,23 @@ async def async_setup_entry(
             controller=controller,
             )])
 
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_SET_SEGMENT_COLORS,
+        {
+            vol.Optional("colors"): vol.All(cv.ensure_list, [vol.Any(None, RGB_SCHEMA)]),
+            vol.Optional("segments"): vol.All(cv.ensure_list, [cv.positive_int]),
+            vol.Optional(ATTR_RGB_COLOR): RGB_SCHEMA,
+        },
+        "async_set_segment_colors",
+    )
+
 class HACSGoveeBleLight(LightEntity):
     """Representation of a Govee BLE light."""
 
-    MAX_RECONNECT_ATTEMPTS = 5
-    INITIAL_RECONNECT_DELAY = 1 # seconds
-
     _attr_has_entity_name = True
+    # Shown on the entity, but they flip with every reconnect
+    _unrecorded_attributes = frozenset({"connection_status", "circuit_breaker"})
     _attr_color_mode = ColorMode.RGB
     _attr_min_color_temp_kelvin = 2000
     _attr_max_color_temp_kelvin = 9000
@@ -91,7 +111,12 @@ class HACSGoveeBleLight(LightEntity):
         _LOGGER.debug("Config entry data: %s", config_entry.data)
         self._hass = hass
         self._mac = address
-        self._model = config_entry.data.get("model", "default")
+        # Fall back to the model in the advertised name when none was configured
+        self._model = REGISTRY.resolve(
+            config_entry.data.get("model", "default"),
+            ble_device.name if ble_device is not None else None,
+        )
+        self._capabilities = REGISTRY.get(self._model)
         self._name = config_entry.data.get("name", self._model + "-" + self._mac.replace(":", "")[-4:])
         self._ble_device = ble_device
         self._state = None
@@ -100,12 +125,20 @@ class HACSGoveeBleLight(LightEntity):
         self._rgb_color = [255,255,255]
         self._client: BleakClient | None = None
 
+        self._attr_extra_state_attributes = {}
+        self._diagnostics = {}
+        self._state_writer = None
+        self._debounce_window = config_entry.data.get(CONF_DEBOUNCE_WINDOW)
+        self._debouncers: dict[str, AttributeDebouncer] = {}
+
         self._controller = controller
         self._controller.register_light(self)
 
-        self._BRIGHTNESS_SCALE = (1, ModelInfo.get_brightness_max(self.model))
+        self._BRIGHTNESS_SCALE = (1, self._capabilities.brightness_max)
+        self._segment_count = self._capabilities.segments
+        self._attr_min_color_temp_kelvin = self._capabilities.min_color_temp_kelvin
+        self._attr_max_color_temp_kelvin = self._capabilities.max_color_temp_kelvin
 
-        self._attr_extra_state_attributes = {}
 
         self._power_data = 0x0
         self._brightness_data = 0x0
@@ -120,9 +153,14 @@ class HACSGoveeBleLight(LightEntity):
         self._temp_state = False
         self._temp_brightness = 0
         self._temp_rgb_color = [0,0,0]
+        # segment index -> rgb, acknowledged and pending
+        self._segments = {}
+        self._temp_segments = {}
+        self._segments_in_flight = []
         self.mark_clean("state")
         self.mark_clean("brightness")
         self.mark_clean("rgb_color")
+        self.mark_clean("segments")
 
     @property
     def name(self):
@@ -144,6 +182,11 @@ class HACSGoveeBleLight(LightEntity):
         """Return the model of the light."""
         return self._model
 
+    @property
+    def capabilities(self):
+        """Return the capabilities of the model."""
+        return self._capabilities
+
     @property
     def ble_device(self) -> BLEDevice:
         """Return the BLE device."""
@@ -158,7 +201,7 @@ class HACSGoveeBleLight(LightEntity):
     def reconnect(self, reconnect):
         """Set the reconnect attempts."""
         self._reconnect = reconnect
-        self._attr_extra_state_attributes["reconnect_attempts"] = reconnect
+        self.set_state_attr("reconnect_attempts", reconnect)
 
     @property
     def client(self) -> BleakClient | None:
@@ -169,7 +212,7 @@ class HACSGoveeBleLight(LightEntity):
     def client(self, client):
         """Set the client."""
         self._client = client
-        self._attr_extra_state_attributes["connection_status"] = "Connected" if client is not None and client.is_connected else "Disconnected"
+        self.set_state_attr("connection_status", "Connected" if client is not None and client.is_connected else "Disconnected")
 
     @property
     def unique_id(self) -> str:
@@ -178,18 +221,18 @@ class HACSGoveeBleLight(LightEntity):
 
     @property
     def brightness(self) -> int | None:
-        """Return the brightness of this light between 0..255."""
-        return value_to_brightness(self._BRIGHTNESS_SCALE, self._brightness)
+        """Return the brightness of this light between 0..255, pending changes included."""
+        return value_to_brightness(self._BRIGHTNESS_SCALE, self._temp_brightness if self._dirty_brightness else self._brightness)
 
     @property
     def rgb_color(self):
-        """Return the color of the light."""
-        return self._rgb_color or [0,0,0]
+        """Return the color of the light, pending changes included."""
+        return (self._temp_rgb_color if self._dirty_rgb_color else self._rgb_color) or [0,0,0]
 
     @property
     def is_on(self) -> bool | None:
-        """Return true if light is on."""
-        return self._state
+        """Return true if light is on, pending changes included."""
+        return self._temp_state if self._dirty_state else self._state
 
     @property
     def device_info(self) -> DeviceInfo:
@@ -207,37 +250,153 @@ class HACSGoveeBleLight(LightEntity):
 
     def set_state_attr(self, attr, value):
         """Set the state attribute."""
+        if attr in self._attr_extra_state_attributes and self._attr_extra_state_attributes[attr] == value:
+            return
         self._attr_extra_state_attributes[attr] = value
+        self._schedule_state_write()
+
+    def set_diagnostic(self, attr, value):
+        """Set a diagnostic value, which does not write the state.
+
+        Link details change with every connection attempt or frame, as state
+        attributes each change would be a recorder row. The diagnostic
+        sensors and the diagnostics download show them instead.
+        """
+        self._diagnostics[attr] = value
+
+    @property
+    def diagnostics(self) -> dict:
+        """Return the diagnostic values of the light."""
+        return dict(self._diagnostics)
+
+    def _schedule_state_write(self):
+        """Write the state soon, coalesced with other changes of this light."""
+        if self._state_writer is not None:
+            self._state_writer.async_schedule()
+
+    def flush_state(self):
+        """Write pending state changes now, called when a burst of updates completed."""
+        if self._state_writer is not None:
+            self._state_writer.async_flush()
 
     async def async_added_to_hass(self):
         """Run when entity about to be added to hass."""
         _LOGGER.debug("Adding %s", self.name)
+        self._state_writer = ThrottledStateWriter(
+            self.hass,
+            self.async_write_ha_state,
+            self.hass.data.get(DOMAIN, {}).get("state_write_interval", DEFAULT_STATE_WRITE_INTERVAL),
+        )
+        windows = debounce_windows(
+            self._debounce_window or self.hass.data.get(DOMAIN, {}).get("debounce_window"), DEFAULT_DEBOUNCE_WINDOW
+        )
+        # A dragged slider sends its first and last value, not every step
+        self._debouncers = {
+            property_name: AttributeDebouncer(
+                self.hass,
+                lambda value, trailing, property_name=property_name: self._apply_debounced(property_name, value, trailing),
+                windows[attribute],
+            )
+            for property_name, attribute in (("brightness", "brightness"), ("rgb_color", "color"))
+        }
         # await self._connect()
         # _LOGGER.debug("Connected to %s", self.name)
 
     async def async_will_remove_from_hass(self):
         """Run when entity will be removed from hass."""
         _LOGGER.debug("Removing %s", self.name)
+        self._controller.unregister_light(self)
+        if self._state_writer is not None:
+            self._state_writer.async_cancel()
+        for debouncer in self._debouncers.values():
+            debouncer.async_cancel()
         if self._keep_alive_task:
             self._keep_alive_task.cancel()
             _LOGGER.debug("Cancelled keep alive task for %s", self.name)
 
     def is_dirty(self):
         """Return if the light is dirty."""
-        return self._dirty_state or self._dirty_brightness or self._dirty_rgb_color
+        return self._dirty_state or self._dirty_brightness or self._dirty_rgb_color or self._dirty_segments
+
+    def pending_frame_count(self) -> int:
+        """Return the number of frames still to be written to bring the light up to date."""
+        count = sum(1 for dirty in (self._dirty_state, self._dirty_brightness, self._dirty_rgb_color) if dirty)
+        if self._dirty_segments:
+            count += len(pack_segment_colors(self._temp_segments))
+        return count
 
     def _mark_dirty(self, property_name, value, dirty=True):
         """Mark the property as dirty."""
         setattr(self, f"_dirty_{property_name}", dirty)
-        self.set_state_attr(f"dirty_{property_name}", dirty)
+        self.set_diagnostic(f"dirty_{property_name}", dirty)
+        self._schedule_state_write()
         if dirty:
             setattr(self, f"_temp_{property_name}", value)
             # Notify controller that light has pending updates
 
+    def _offer(self, property_name, value):
+        """Mark a property dirty now, or once its debounce window ends."""
+        if (debouncer := self._debouncers.get(property_name)) is None:
+            self._mark_dirty(property_name, value)
+            return
+        debouncer.async_offer(value)
+
+    def _apply_debounced(self, property_name, value, trailing):
+        self._mark_dirty(property_name, value)
+        if trailing:
+            # The burst's last value, the request that offered it is long done
+            self._controller.queue_update(self)
+
+    @property
+    def debounce_saved(self) -> int:
+        """Return the number of brightness and color writes the debounce saved."""
+        return sum(debouncer.saved for debouncer in self._debouncers.values())
+
     def mark_clean(self, property_name):
         """Mark the property as clean."""
         setattr(self, f"_dirty_{property_name}", False)
-        self.set_state_attr(f"dirty_{property_name}", False)
+        self.set_diagnostic(f"dirty_{property_name}", False)
+        self._schedule_state_write()
+
+    def mark_acknowledged(self, property_name):
+        """Mark the property as clean and adopt the value the light acknowledged."""
+        if property_name == "segments":
+            self._acknowledge_segments()
+            return
+
+        setattr(self, f"_{property_name}", getattr(self, f"_temp_{property_name}"))
+        if property_name == "rgb_color":
+            # A whole-device color repaints every segment
+            self._segments = dict.fromkeys(range(self._segment_count), tuple(self._rgb_color))
+        self.mark_clean(property_name)
+
+    def _acknowledge_segments(self):
+        """Adopt the segments of the acknowledged frame, clean once none are pending."""
+        for index in self._segments_in_flight:
+            self._segments[index] = self._temp_segments.pop(index)
+        self._segments_in_flight = []
+        if len(self._temp_segments) == 0:
+            self.mark_clean("segments")
+        else:
+            self._schedule_state_write()
+
+    def apply_polled_state(self, status: dict) -> bool:
+        """Adopt state reported by the light unless a change of ours is pending.
+
+        Returns true if the light was changed outside Home Assistant.
+        """
+        changed = False
+        for property_name, value in status.items():
+            if getattr(self, f"_dirty_{property_name}"):
+                continue
+            if getattr(self, f"_{property_name}") != value:
+                setattr(self, f"_{property_name}", value)
+                setattr(self, f"_temp_{property_name}", value)
+                changed = True
+
+        if changed:
+            self._schedule_state_write()
+        return changed
 
     async def async_turn_on(self, **kwargs) -> None:
         """Turn the light on."""
@@ -247,13 +406,15 @@ class HACSGoveeBleLight(LightEntity):
             self.model,
         )
 
-        self._mark_dirty("state", True)
+        # A slider moved on a light that is on has no power frame to send
+        if not self.is_on:
+            self._mark_dirty("state", True)
 
         if ATTR_BRIGHTNESS in kwargs:
             brightness = clamp(kwargs[ATTR_BRIGHTNESS], 0, 255)
             brightness = int(math.ceil(brightness_to_value(self._BRIGHTNESS_SCALE, brightness)))
 
-            self._mark_dirty("brightness", brightness)
+            self._offer("brightness", brightness)
         '''
         elif ATTR_BRIGHTNESS_PCT in kwargs:
             brightness_pct = max(min(kwargs.get(ATTR_BRIGHTNESS_PCT, 100), 100), 0)
@@ -269,7 +430,7 @@ class HACSGoveeBleLight(LightEntity):
             green = clamp(green, 0, 255)
             blue = clamp(blue, 0, 255)
 
-            self._mark_dirty("rgb_color", [red, green, blue])
+            self._offer("rgb_color", [red, green, blue])
 
         elif ATTR_COLOR_TEMP in kwargs:
             color_temp = kwargs.get(ATTR_COLOR_TEMP, self._attr_max_color_temp_kelvin)
@@ -278,334 +439,81 @@ class HACSGoveeBleLight(LightEntity):
             kelvin = clamp(kelvin, self._attr_min_color_temp_kelvin, self._attr_max_color_temp_kelvin)
             red, green, blue = kelvin_to_rgb(kelvin)
 
-            self._mark_dirty("rgb_color", [red, green, blue])
-
-        await self._controller.queue_update(self)
-
-        if False and self._keep_alive_task:
-            self._keep_alive_task.cancel()
-            self._temp_brightness = max(min(self._temp_brightness, 255), 0)
-            self._temp_rgb_color = [
-                max(min(self._temp_rgb_color[0], 255), 0),
-                max(min(self._temp_rgb_color[1], 255), 0),
-                max(min(self._temp_rgb_color[2], 255), 0)
-            ]
-            self._dirty_brightness = True
-            self._dirty_rgb_color = True
-            _LOGGER.debug("Cancelled keep alive task for %s", self.name)
-
-
-        # self._keep_alive_task = asyncio.create_task(self._send_packets_thread())
-        # if self.client:
-            # await self._disconnect()
+            self._offer("rgb_color", [red, green, blue])
 
+        # Show the requested state at once, the controller sends it in the background.
+        # Values held back by the debounce are queued when their window ends.
+        if self.is_dirty():
+            self._controller.queue_update(self)
 
     async def async_turn_off(self, **kwargs) -> None:
         """Turn the light off."""
-        if False and self._keep_alive_task:
-            self._keep_alive_task.cancel()
-            _LOGGER.debug("Cancelled keep alive task for %s", self.name)
-
+        # A value still held back by the debounce would be sent after the light went off
+        for debouncer in self._debouncers.values():
+            debouncer.async_cancel()
         self._mark_dirty("state", False)
 
-        await self._controller.queue_update(self)
+        self._controller.queue_update(self)
 
-        # self._keep_alive_task = asyncio.create_task(self._send_packets_thread())
-
-    # should return cmd and payload
-    def get_power_payload(self) -> tuple[int, list[int]]:
-        """Get the power state payload."""
+    # should return the encoded frame
+    def get_power_frame(self) -> bytes:
+        """Get the power state frame."""
         payload = 0x1 if self._temp_state else 0x0
-        self.set_state_attr("power_data", payload)
-        return LedCommand.POWER, [payload]
-
-    async def _send_power(self, power):
-        """Send the power state to the device."""
-        self._attr_extra_state_attributes["power_data"] = 0x1 if power else 0x0
-        try:
-            return await self._send_bluetooth_data(LedCommand.POWER, [0x1 if power else 0x0])
-
-        except Exception as exception:
-            _LOGGER.error("Error sending power to %s: %s", self.name, exception)
+        self.set_diagnostic("power_data", payload)
+        return self._capabilities.encode_power(self._temp_state)
 
-        return False
-
-    def get_brightness_payload(self) -> tuple[int, list[int]]:
-        """Get the brightness payload."""
+    def get_brightness_frame(self) -> bytes:
+        """Get the brightness frame."""
         payload = self._temp_brightness
-        self.set_state_attr("brightness_data", payload)
-        return LedCommand.BRIGHTNESS, [payload]
-
-    async def _send_brightness(self, brightness):
-        """Send the brightness to the device."""
-        self.set_state_attr("brightness_data", brightness)
-        _packet = [brightness]
-        try:
-            return await self._send_bluetooth_data(LedCommand.BRIGHTNESS, _packet)
-
-        except Exception as exception:
-            _LOGGER.error("Error sending brightness to %s: %s", self.name, exception)
-
-        return False
-
-    def get_rgb_color_payload(self) -> tuple[int, list[int]]:
-        """Get the RGB color payload."""
-        payload = [ModelInfo.get_led_mode(self.model)]
-        self.set_state_attr("rgb_color_data", payload)
-
-        red, green, blue = [*self._temp_rgb_color]
-        if ModelInfo.get_led_mode(self.model) == LedMode.MODE_1501:
-            payload.extend([
-                0x01,
-                red,
-                green,
-                blue,
-                0x00,
-                0x00,
-                0x00,
-                0x00,
-                0x00,
-                0xFF,
-                0x74,
-            ])
-        else:
-            payload.extend(self._temp_rgb_color)
-        return LedCommand.COLOR, payload
-
-    async def _send_rgb_color(self, red, green, blue):
-        """Send the RGB color to the device."""
-        _packet = [ModelInfo.get_led_mode(self.model)]
-        self._attr_extra_state_attributes["rgb_color_data"] = [red, green, blue]
-
-        if ModelInfo.get_led_mode(self.model) == LedMode.MODE_1501:
-                _packet.extend([
-                    0x01,
-                    red,
-                    green,
-                    blue,
-                    0x00,
-                    0x00,
-                    0x00,
-                    0x00,
-                    0x00,
-                    0xFF,
-                    0x74,
-                ])
-        else:
-            _packet.extend([red, green, blue])
-
-        try:
-            return await self._send_bluetooth_data(LedCommand.COLOR, _packet)
-
-        except Exception as exception:
-            _LOGGER.error("Error sending color to %s: %s", self.name, exception)
-
-        return False
-
-
-    async def _send_packets_thread(self):
-        """Send the packets to the device."""
-        self._thread_started = time.time()
-        _current_thread_started = time.time()
-
-        _max_thread_time = 20
-
-        def _check_thread_time():
-            _current_thread_started = time.time()
-            if _current_thread_started - self._thread_started > _max_thread_time:
-                _LOGGER.error("Thread for %s took too long, ending thread", self.name)
-                return True
-            return False
-
-        def _thread_is_alive():
-            """Check if the thread is still alive. a new thread will reset the self._thread_started time."""
-            return _current_thread_started - self._thread_started > 0
-
-        while _check_thread_time and _thread_is_alive:
-            """Connect to the device and send the packets."""
-            try:
-                """Connect to the device."""
-                if not await self._connect():
-
-                    if self._reconnect > self.MAX_RECONNECT_ATTEMPTS:
-                        _LOGGER.error("Failed to connect to %s after %s attempts, ending thread", self.name, self.MAX_RECONNECT_ATTEMPTS)
-                        return
-
-                    jitter = self.INITIAL_RECONNECT_DELAY + (self._reconnect * random.uniform(0.3, 0.7))
-                    await asyncio.sleep(jitter)
-                    continue
-
-                _changed = True # send mqtt packet once mqtt is implemented
-
-                jitter = random.uniform(0.7, 1.3)
-                """Send the packets."""
-                if self._dirty_state:
-                    if not await self._send_power(self._temp_state):
-                        await asyncio.sleep(jitter)
-                        continue
-
-                    self._dirty_state = False
-                    self._attr_extra_state_attributes["dirty_state"] = self._dirty_state
-                    self._state = self._temp_state
-                elif self._dirty_brightness:
-                    if not await self._send_brightness(self._temp_brightness):
-                        await asyncio.sleep(jitter)
-                        continue
-
-                    self._dirty_brightness = False
-                    self._attr_extra_state_attributes["dirty_brightness"] = self._dirty_brightness
-                    self._brightness = self._temp_brightness
-                elif self._dirty_rgb_color:
-                    if not await self._send_rgb_color(*self._temp_rgb_color):
-                        await asyncio.sleep(jitter)
-                        continue
-
-                    self._dirty_rgb_color = False
-                    self._attr_extra_state_attributes["dirty_rgb_color"] = self._dirty_rgb_color
-                    self._rgb_color = self._temp_rgb_color
-                else:
-                    """Keep alive, send a packet every 1 second."""
-                    _changed = False # no mqtt packet if no change
+        self.set_diagnostic("brightness_data", payload)
+        return self._capabilities.encode_brightness(payload)
+
+    def get_rgb_color_frame(self) -> bytes:
+        """Get the RGB color frame."""
+        self.set_diagnostic("rgb_color_data", list(self._temp_rgb_color))
+        return self._capabilities.encode_color(self._temp_rgb_color)
+
+    def get_segment_frame(self) -> bytes:
+        """Get the frame for the next group of pending segments.
+
+        Segments sharing a color are packed into one masked frame, so painting
+        them takes one write per distinct color.
+        """
+        rgb, segments = pack_segment_colors(self._temp_segments)[0]
+        self._segments_in_flight = segments
+        self.set_diagnostic("rgb_color_data", list(rgb))
+        return self._capabilities.encode_color(rgb, mask=segment_mask(segments))
+
+    async def async_set_segment_colors(self, colors=None, segments=None, rgb_color=None) -> None:
+        """Paint individual segments of the light.
+
+        Either pass `colors`, one rgb (or None to skip) per segment starting at
+        the first, or paint the `segments` indexes with a single `rgb_color`.
+        """
+        if self._segment_count == 0:
+            raise HomeAssistantError(f"{self.model} has no individually addressable segments")
+
+        requested = {}
+        for index, rgb in enumerate(colors or []):
+            if rgb is not None:
+                requested[index] = tuple(clamp(c, 0, 255) for c in rgb)
+        if segments and rgb_color is not None:
+            for index in segments:
+                requested[index] = tuple(clamp(c, 0, 255) for c in rgb_color)
+
+        if any(index >= self._segment_count for index in requested):
+            raise HomeAssistantError(f"{self.model} only has {self._segment_count} segments")
+
+        pending = dict(self._temp_segments) if self._dirty_segments else {}
+        for index, rgb in requested.items():
+            if self._segments.get(index) == rgb:
+                pending.pop(index, None) # already showing, no frame needed
+            else:
+                pending[index] = rgb
+
+        if len(pending) == 0:
+            return
 
-
-                    if (time.time() - self._last_update) >= 0.3:
-                        _async_res = False
-                        self._ping_roll += 1
-
-                        if self._ping_roll % 3 == 0 or self._state == 0:
-                            _async_res = await self._send_power(self._state)
-                        elif self._ping_roll % 3 == 1:
-                            _async_res = await self._send_brightness(self._brightness)
-                        elif self._ping_roll % 3 == 2:
-                            _async_res = await self._send_rgb_color(*self._rgb_color)
-
-                        if self._ping_roll > 3:
-                            self._ping_roll = 0
-                            if self._client is not None:
-                                await self._disconnect()
-
-                    await asyncio.sleep(0.1)
-
-                if _changed:
-                    # send mqtt packet
-                    pass
-
-                await asyncio.sleep(0.01)
-
-
-            except Exception as exception:
-                _LOGGER.error("Error sending packets to %s: %s", self.name, exception)
-                try:
-                    if self._client is not None:
-                        await self._disconnect()
-                except Exception as exception:
-                    _LOGGER.error("Error disconnecting from %s: %s", self.name, exception)
-
-                self._client = None
-
-                jitter = random.uniform(0.7, 1.3)
-                await asyncio.sleep(jitter)
-
-        if self._client is not None:
-            await self._disconnect()
-        _LOGGER.debug("Thread for %s ended", self.name)
-
-
-
-    async def _disconnect(self):
-        if self._client is not None and self._client.is_connected:
-            _LOGGER.debug("Disconnecting from %s", self.name)
-            self._attr_extra_state_attributes["connection_status"] = "Disconnecting"
-            await self._client.disconnect()
-        self._client = None
-
-
-
-
-    async def _connect(self):
-
-        if self._client is not None and self._client.is_connected:
-            return self._client
-
-        try:
-            if self._client is not None:
-                _LOGGER.debug("Disconnecting from %s", self.name)
-                await self._disconnect()
-        except Exception as exception:
-            _LOGGER.error("Error disconnecting from %s: %s", exception)
-
-        self._client = None
-
-        def disconnected_callback(client):
-            if self._client == client:
-                self._client = None
-                self._attr_extra_state_attributes["connection_status"] = "Disconnected"
-                _LOGGER.debug("Disconnected from %s", self.name)
-
-        try:
-            self._attr_extra_state_attributes["connection_status"] = "Connecting..."
-            client = await bleak_retry_connector.establish_connection(
-                BleakClient,
-                self._ble_device,
-                self.unique_id,
-                disconnected_callback=disconnected_callback,
-                timeout=5  # Adjust the timeout as needed
-            )
-            self._client = client
-            self._reconnect = 0
-            self._attr_extra_state_attributes["connection_status"] = "Connected"
-
-            return self._client.is_connected
-        except Exception as exception:
-            _LOGGER.error("Failed to connect to %s: %s", self.name, exception)
-            self._attr_extra_state_attributes["connection_status"] = "Failed to connect"
-            self._client = None
-            self._reconnect += 1
-
-        return None
-
-
-    async def _send_bluetooth_data(self, cmd, payload):
-        if not isinstance(cmd, int):
-            raise TypeError('Invalid command')
-        if not isinstance(payload, bytes) and not (isinstance(payload, list) and all(isinstance(x, int) for x in payload)):
-            raise ValueError('Invalid payload')
-        if len(payload) > 17:
-            raise ValueError('Payload too long')
-
-        _LOGGER.debug("Sending command %s with payload %s to %s", cmd, payload, self.name)
-        self._attr_extra_state_attributes["last_command"] = cmd
-        # if ModelInfo.get_led_mode(self.model) != LedMode.MODE_1501:
-        cmd = cmd & 0xFF
-        payload = bytes(payload)
-
-        frame = bytes([0x33, cmd]) + bytes(payload)
-        # pad frame data to 19 bytes (plus checksum)
-        frame += bytes([0] * (19 - len(frame)))
-
-        # The checksum is calculated by XORing all data bytes
-        checksum = 0
-        for b in frame:
-            checksum ^= b
-
-        frame += bytes([checksum & 0xFF])
-
-
-        try:
-            if self._client is not None:
-                await self._client.write_gatt_char(UUID_CONTROL_CHARACTERISTIC, frame, False)
-                self._last_update = time.time()
-                _LOGGER.debug("Sent data to %s: %s", self.name, frame)
-                return True
-        except Exception as exception:
-            _LOGGER.error("Error sending data to %s: %s", self.name, exception)
-            try:
-                if self._client is not None:
-                    _LOGGER.debug("Disconnecting from %s", self.name)
-                    await self._disconnect()
-            except Exception as exception:
-                _LOGGER.error("Error disconnecting from %s: %s", self.name, exception)
-
-            self._reconnect += 1
-            self._client = None
-        return False
+        self._mark_dirty("state", True)
+        self._mark_dirty("segments", pending)
+        self._controller.queue_update(self)
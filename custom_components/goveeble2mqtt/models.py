@@ -29,23 +29,28 @@ class ControlMode(IntEnum):
 
 
 class ModelInfo:
-    """Class to store information about different models of lights."""
+    """Class to look up information about different models of lights.
 
-    MODELS = {
-        "H6008": [LedMode.MODE_D, 100],
-        "H6046": [LedMode.MODE_1501, 100],
-        "H6072": [LedMode.MODE_1501, 100],
-        "H6076": [LedMode.MODE_1501, 100],
-        "default": [LedMode.MODE_D, 100],
-        "MODE2": [LedMode.MODE_2, 255],
-    }
+    The data lives in models.json and is compiled by the model registry.
+    """
+
+    @staticmethod
+    def get(model):
+        """Get the capabilities of a given model."""
+        from .registry import REGISTRY
+        return REGISTRY.get(model)
 
     @staticmethod
     def get_led_mode(model):
         """Get the LED mode for a given model."""
-        return ModelInfo.MODELS.get(model, ModelInfo.MODELS["default"])[0]
+        return ModelInfo.get(model).led_mode
 
     @staticmethod
     def get_brightness_max(model):
         """Get the maximum brightness for a given model."""
-        return ModelInfo.MODELS.get(model, ModelInfo.MODELS["default"])[1]
+        return ModelInfo.get(model).brightness_max
+
+    @staticmethod
+    def get_segment_count(model):
+        """Get the number of individually addressable segments for a given model."""
+        return ModelInfo.get(model).segments
@@ -0,0 +1,146 @@
+"""Token bucket pacing of frame writes per light and per adapter."""
+
+from __future__ import annotations
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+ADAPTER_FRAMES_PER_SECOND = 50 # frames an adapter writes per second over all its lights
+ADAPTER_BURST = 10
+MIN_FRAMES_PER_SECOND = 1.0 # floor of a rate lowered after drops
+DECREASE_FACTOR = 0.5 # rate kept after a drop or disconnect
+INCREASE_PER_FRAME = 0.1 # frames/s won back by each delivered frame
+
+
+class TokenBucket:
+    """Allow `rate` frames per second with bursts of up to `burst` frames.
+
+    The rate drops by DECREASE_FACTOR when the receiver lost a frame and
+    climbs back by INCREASE_PER_FRAME with every delivered frame, never
+    above `max_rate`.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """Initialize the bucket full."""
+        self.max_rate = max(float(rate), MIN_FRAMES_PER_SECOND)
+        self.rate = self.max_rate
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self.drops = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Return the seconds until a frame fits, 0 if it fits now."""
+        self._refill(time.monotonic())
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self) -> None:
+        """Spend a token on a frame."""
+        self._tokens -= 1
+
+    def delivered(self) -> None:
+        """Win back some rate after a delivered frame."""
+        self.rate = min(self.max_rate, self.rate + INCREASE_PER_FRAME)
+
+    def dropped(self, drain: bool = False) -> None:
+        """Lower the rate after a lost frame, optionally emptying the bucket."""
+        self.drops += 1
+        self.rate = max(MIN_FRAMES_PER_SECOND, self.rate * DECREASE_FACTOR)
+        if drain:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+    def as_dict(self) -> dict:
+        """Return the bucket for diagnostics."""
+        return {"rate": round(self.rate, 1), "max_rate": self.max_rate, "burst": self.burst, "drops": self.drops}
+
+
+class FramePacer:
+    """Pace the frames written to every light and through every adapter.
+
+    A light's bucket starts at the frames_per_second and burst of its
+    model, an adapter's bucket is shared by all lights it reaches. A frame
+    goes out as soon as both buckets hold a token, so writes within the
+    budget are never delayed. Unacknowledged frames slow the light down,
+    disconnects slow down the light and its adapter.
+    """
+
+    def __init__(self, adapter_rate: float = ADAPTER_FRAMES_PER_SECOND, adapter_burst: int = ADAPTER_BURST) -> None:
+        """Initialize the pacer."""
+        self._adapter_rate = adapter_rate
+        self._adapter_burst = adapter_burst
+        self._lights: dict[str, TokenBucket] = {}
+        self._adapters: dict[str, TokenBucket] = {}
+        self._light_adapters: dict[str, str] = {}
+
+    def _light(self, address: str, capabilities=None) -> TokenBucket:
+        if (bucket := self._lights.get(address)) is None:
+            bucket = self._lights[address] = TokenBucket(capabilities.frames_per_second, capabilities.burst)
+        return bucket
+
+    def _adapter(self, adapter: str) -> TokenBucket:
+        if (bucket := self._adapters.get(adapter)) is None:
+            bucket = self._adapters[adapter] = TokenBucket(self._adapter_rate, self._adapter_burst)
+        return bucket
+
+    async def async_acquire(self, address: str, adapter: str, capabilities) -> float:
+        """Wait until a frame to a light fits both buckets, return the seconds waited."""
+        light = self._light(address, capabilities)
+        shared = self._adapter(adapter)
+        self._light_adapters[address] = adapter
+
+        waited = 0.0
+        while (delay := max(light.delay(), shared.delay())) > 0:
+            # Other lights may take the adapter's token meanwhile, so check again
+            await asyncio.sleep(delay)
+            waited += delay
+
+        light.take()
+        shared.take()
+        return waited
+
+    def delivered(self, address: str) -> None:
+        """Record a frame the light acknowledged or that was written without acks."""
+        if (light := self._lights.get(address)) is not None:
+            light.delivered()
+        if (adapter := self._light_adapters.get(address)) is not None:
+            self._adapter(adapter).delivered()
+
+    def dropped(self, address: str) -> None:
+        """Record a frame the light did not acknowledge."""
+        if (light := self._lights.get(address)) is not None:
+            light.dropped()
+            _LOGGER.debug("Frame to %s dropped, pacing at %.1f frames/s", address, light.rate)
+
+    def disconnected(self, address: str) -> None:
+        """Record a lost connection, the first frame after reconnecting waits a full interval."""
+        if (light := self._lights.get(address)) is not None:
+            light.dropped(drain=True)
+            _LOGGER.debug("%s disconnected, pacing at %.1f frames/s", address, light.rate)
+        if (adapter := self._light_adapters.get(address)) is not None:
+            self._adapter(adapter).dropped()
+
+    def as_dict(self, address: str) -> dict:
+        """Return the light's and its adapter's buckets for diagnostics."""
+        light = self._lights.get(address)
+        adapter = self._light_adapters.get(address)
+        return {
+            "light": light.as_dict() if light is not None else None,
+            "adapter": self._adapter(adapter).as_dict() if adapter is not None else None,
+        }
+
+    def forget(self, address: str) -> None:
+        """Drop the bucket of a light."""
+        self._lights.pop(address, None)
+        self._light_adapters.pop(address, None)
+
+
+PACER = FramePacer()
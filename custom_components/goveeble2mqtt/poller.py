@@ -0,0 +1,73 @@
+"""Adaptive status polling for lights changed outside Home Assistant."""
+
+from __future__ import annotations
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class StatePoller:
+    """Decide when each light is polled, within a per-adapter airtime budget.
+
+    Every light starts at `min_interval`. Each poll that finds nothing new
+    stretches its interval by `backoff` up to `max_interval`, a poll that
+    detects an outside change drops it back to `min_interval`. Each adapter
+    gets a bucket refilled at `airtime_budget` status queries per second, so
+    polling never takes more than that share of its airtime.
+    """
+
+    def __init__(
+            self,
+            min_interval: float = 30,
+            max_interval: float = 600,
+            airtime_budget: float = 1.0,
+            backoff: float = 1.5,
+            ) -> None:
+        """Initialize the poller."""
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._airtime_budget = airtime_budget
+        self._backoff = backoff
+        # Allow a full poll of a few lights in a burst
+        self._bucket_size = max(airtime_budget * 10, 3)
+
+        self._intervals: dict[str, float] = {}
+        self._last_poll: dict[str, float] = {}
+        self._buckets: dict[str, list[float]] = {}
+
+    def interval(self, address: str) -> float:
+        """Return the current polling interval of a light."""
+        return self._intervals.get(address, self._min_interval)
+
+    def is_due(self, address: str, overdue_factor: float = 1.0) -> bool:
+        """Return true if the light should be polled."""
+        last = self._last_poll.get(address)
+        if last is None:
+            return True
+        return time.monotonic() - last >= self.interval(address) * overdue_factor
+
+    def try_consume(self, adapter: str, queries: int) -> bool:
+        """Take airtime for a number of status queries on an adapter."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(adapter, [self._bucket_size, now])
+        tokens = min(self._bucket_size, tokens + (now - updated) * self._airtime_budget)
+        if tokens < queries:
+            self._buckets[adapter] = [tokens, now]
+            return False
+        self._buckets[adapter] = [tokens - queries, now]
+        return True
+
+    def record(self, address: str, changed: bool) -> None:
+        """Adapt the polling interval after a poll."""
+        self._last_poll[address] = time.monotonic()
+        if changed:
+            self._intervals[address] = self._min_interval
+            _LOGGER.debug("Outside change detected on %s, polling every %ss", address, self._min_interval)
+        else:
+            self._intervals[address] = min(self.interval(address) * self._backoff, self._max_interval)
+
+    def forget(self, address: str) -> None:
+        """Drop the polling state of a light."""
+        self._intervals.pop(address, None)
+        self._last_poll.pop(address, None)
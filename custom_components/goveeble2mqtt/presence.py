@@ -0,0 +1,143 @@
+"""Passive advertisement tracking for Govee lights."""
+
+from __future__ import annotations
+from collections.abc import Callable
+from datetime import datetime
+import logging
+import time
+
+from homeassistant.components import bluetooth
+from homeassistant.core import HomeAssistant, callback
+import homeassistant.util.dt as dt_util
+
+from .warmup import DEFAULT_ADAPTER
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LightPresence:
+    """What the advertisements tell about one light."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.last_seen: float | None = None # monotonic
+        self.last_seen_at: datetime | None = None # wall clock, for sensors
+        self.rssi: float | None = None # exponential moving average
+        self.source: str = DEFAULT_ADAPTER
+        self.advertisements = 0
+
+
+class PresenceTracker:
+    """Listen to Home Assistant bluetooth advertisements for registered lights.
+
+    Keeps a last-seen timestamp and an RSSI moving average per light, so the
+    controller can tell that a light is gone without spending a connection
+    attempt on it. Advertisements are received passively and cost no airtime.
+    """
+
+    def __init__(self, hass: HomeAssistant, absent_after: float = 180, rssi_smoothing: float = 0.25) -> None:
+        """Initialize the tracker."""
+        self._hass = hass
+        self._absent_after = absent_after
+        self._alpha = rssi_smoothing
+        self._started = time.monotonic()
+        self._lights: dict[str, LightPresence] = {}
+        self._unsubs: dict[str, Callable[[], None]] = {}
+        self._listeners: dict[str, list[Callable[[], None]]] = {}
+
+    @callback
+    def async_track(self, address: str) -> None:
+        """Start tracking advertisements of an address."""
+        address = address.upper()
+        if address in self._unsubs:
+            return
+
+        presence = self._lights.setdefault(address, LightPresence())
+        # Seed from the bluetooth integration's cache so restarts don't start blind
+        if (service_info := bluetooth.async_last_service_info(self._hass, address, connectable=True)) is not None:
+            self._update(presence, service_info)
+
+        @callback
+        def _async_advertisement(service_info, change):
+            self._update(presence, service_info)
+            for listener in self._listeners.get(address, []):
+                listener()
+
+        self._unsubs[address] = bluetooth.async_register_callback(
+            self._hass,
+            _async_advertisement,
+            bluetooth.BluetoothCallbackMatcher(address=address),
+            bluetooth.BluetoothScanningMode.PASSIVE,
+        )
+
+    @callback
+    def async_untrack(self, address: str) -> None:
+        """Stop tracking an address."""
+        address = address.upper()
+        if (unsub := self._unsubs.pop(address, None)) is not None:
+            unsub()
+        self._lights.pop(address, None)
+        self._listeners.pop(address, None)
+
+    @callback
+    def async_add_listener(self, address: str, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener on every advertisement of an address."""
+        listeners = self._listeners.setdefault(address.upper(), [])
+        listeners.append(listener)
+
+        @callback
+        def _remove():
+            if listener in listeners:
+                listeners.remove(listener)
+
+        return _remove
+
+    def _update(self, presence: LightPresence, service_info) -> None:
+        presence.last_seen = time.monotonic()
+        presence.last_seen_at = dt_util.utcnow()
+        presence.source = service_info.source or DEFAULT_ADAPTER
+        presence.advertisements += 1
+        if service_info.rssi is not None:
+            if presence.rssi is None:
+                presence.rssi = float(service_info.rssi)
+            else:
+                presence.rssi += self._alpha * (service_info.rssi - presence.rssi)
+
+    def get(self, address: str) -> LightPresence | None:
+        """Return the tracked presence of an address."""
+        return self._lights.get(address.upper())
+
+    def is_present(self, address: str) -> bool:
+        """Return false if the light has not advertised for a while.
+
+        Lights that have never been heard are given the benefit of the doubt
+        until the tracker has been listening for `absent_after` seconds.
+        """
+        presence = self.get(address)
+        now = time.monotonic()
+        if presence is None or presence.last_seen is None:
+            return now - self._started < self._absent_after
+        return now - presence.last_seen < self._absent_after
+
+    def rssi(self, address: str) -> float | None:
+        """Return the averaged RSSI of an address."""
+        presence = self.get(address)
+        return None if presence is None else presence.rssi
+
+    def adapter(self, address: str) -> str:
+        """Return the adapter that last heard an address."""
+        presence = self.get(address)
+        return DEFAULT_ADAPTER if presence is None else presence.source
+
+    def as_dict(self, address: str) -> dict:
+        """Return the presence of an address for diagnostics."""
+        presence = self.get(address)
+        if presence is None:
+            return {}
+        return {
+            "present": self.is_present(address),
+            "last_seen": presence.last_seen_at,
+            "rssi": None if presence.rssi is None else round(presence.rssi, 1),
+            "source": presence.source,
+            "advertisements": presence.advertisements,
+        }
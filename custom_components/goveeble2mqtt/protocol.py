@@ -0,0 +1,121 @@
+"""Govee BLE frame encoding."""
+
+from __future__ import annotations
+
+from .models import LedCommand, LedMode
+
+UUID_CONTROL_CHARACTERISTIC = '00010203-0405-0607-0809-0a0b0c0d2b11'
+UUID_NOTIFY_CHARACTERISTIC = '00010203-0405-0607-0809-0a0b0c0d2b10'
+
+FRAME_COMMAND = 0x33 # write a value
+FRAME_QUERY = 0xAA # read a value, also used as keep-alive
+FRAME_LENGTH = 20 # 19 data bytes plus checksum
+MAX_PAYLOAD_LENGTH = 17
+
+# Status queries, keyed by the state they report
+STATUS_QUERIES = {
+    "state": LedCommand.POWER,
+    "brightness": LedCommand.BRIGHTNESS,
+    "rgb_color": LedCommand.COLOR,
+}
+
+
+def checksum(data) -> int:
+    """Return the XOR checksum of the data bytes."""
+    result = 0
+    for b in data:
+        result ^= b
+    return result & 0xFF
+
+
+def build_frame(cmd: int, payload, head: int = FRAME_COMMAND) -> bytes:
+    """Build a padded, checksummed frame."""
+    if not isinstance(cmd, int):
+        raise TypeError('Invalid command')
+    if not isinstance(payload, bytes) and not (isinstance(payload, list) and all(isinstance(x, int) for x in payload)):
+        raise ValueError('Invalid payload')
+    if len(payload) > MAX_PAYLOAD_LENGTH:
+        raise ValueError('Payload too long')
+
+    frame = bytes([head, cmd & 0xFF]) + bytes(payload)
+    # pad frame data to 19 bytes (plus checksum)
+    frame += bytes([0] * (FRAME_LENGTH - 1 - len(frame)))
+
+    return frame + bytes([checksum(frame)])
+
+
+def is_valid_frame(frame) -> bool:
+    """Return true if the frame has the right length and checksum."""
+    return len(frame) == FRAME_LENGTH and checksum(frame[:-1]) == frame[-1]
+
+
+def frame_key(frame) -> tuple[int, int]:
+    """Return the (head, command) pair a reply frame is matched on."""
+    return frame[0], frame[1]
+
+
+# Segment mask the whole-device MODE_1501 color frame has always used
+MODE_1501_ALL_SEGMENTS = [0xFF, 0x74]
+
+
+def segment_mask(segments) -> list[int]:
+    """Return the two mask bytes that select the given segment indexes."""
+    mask = 0
+    for index in segments:
+        mask |= 1 << index
+    return [mask & 0xFF, (mask >> 8) & 0xFF]
+
+
+def pack_segment_colors(colors: dict) -> list[tuple[tuple[int, int, int], list[int]]]:
+    """Group segments that share a color so each color needs a single frame.
+
+    Takes a mapping of segment index to rgb and returns (rgb, segments)
+    pairs, one per distinct color, in order of the first segment using it.
+    """
+    groups: dict[tuple[int, int, int], list[int]] = {}
+    for index in sorted(colors):
+        groups.setdefault(tuple(colors[index]), []).append(index)
+    return list(groups.items())
+
+
+def parse_status(frame, led_mode: int) -> dict | None:
+    """Parse an 0xAA status reply into the state it reports."""
+    if len(frame) < 6 or frame[0] != FRAME_QUERY:
+        return None
+
+    if frame[1] == LedCommand.POWER:
+        return {"state": frame[2] == 0x01}
+    if frame[1] == LedCommand.BRIGHTNESS:
+        return {"brightness": frame[2]}
+    if frame[1] == LedCommand.COLOR:
+        # MODE_1501 replies carry an extra byte before the color
+        offset = 4 if led_mode == LedMode.MODE_1501 else 3
+        return {"rgb_color": list(frame[offset:offset + 3])}
+    return None
+
+
+class FrameTemplate:
+    """A precompiled frame whose variable bytes are patched when encoding.
+
+    The frame is built, padded and checksummed once. Encoding copies it,
+    writes the values at their offsets and updates the checksum by XORing
+    out the old byte and in the new one.
+    """
+
+    __slots__ = ("_frame", "offsets")
+
+    def __init__(self, cmd: int, payload: list[int], offsets: tuple[int, ...], head: int = FRAME_COMMAND) -> None:
+        """Compile the template, offsets index into the whole frame."""
+        self._frame = build_frame(cmd, payload, head)
+        self.offsets = offsets
+
+    def encode(self, *values: int) -> bytes:
+        """Return the frame with the given values patched in."""
+        frame = bytearray(self._frame)
+        checksum = frame[-1]
+        for offset, value in zip(self.offsets, values):
+            value &= 0xFF
+            checksum ^= frame[offset] ^ value
+            frame[offset] = value
+        frame[-1] = checksum
+        return bytes(frame)
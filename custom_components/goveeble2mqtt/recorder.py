@@ -0,0 +1,102 @@
+"""Record inbound MQTT commands and outbound BLE frames for replay."""
+
+from __future__ import annotations
+import gzip
+import json
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+RECORD_VERSION = 1
+KIND_MQTT = "m" # [t, "m", topic, payload]
+KIND_FRAME = "f" # [t, "f", address, frame hex]
+
+_FLUSH_EVERY = 256 # records buffered before they are appended to the file
+
+
+def device_key(address_or_topic: str) -> str:
+    """Return the bare upper case mac of a light address or light topic."""
+    if "/light/" in address_or_topic:
+        device = address_or_topic.split("/light/", 1)[1].split("/", 1)[0]
+        return device.split("_", 1)[0].upper()
+    return address_or_topic.replace(":", "").upper()
+
+
+class TrafficRecorder:
+    """Timestamped traffic log, written as gzip compressed JSON lines.
+
+    Every record is a short list with the milliseconds since the recording
+    started, the kind, the topic or address and the payload. Records are
+    buffered and appended in blocks, each block is a gzip member of its own,
+    so a crash loses at most one block. Without a path the records are only
+    kept in memory, which is what the replayer uses.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        """Initialize the recorder."""
+        self._path = path
+        self._started = time.monotonic()
+        self._buffer: list[list] = []
+        self.records: list[list] = []
+
+        if path is not None:
+            self._buffer.append([0, "v", RECORD_VERSION, time.time()])
+
+    def _record(self, kind: str, target: str, data: str) -> None:
+        record = [round((time.monotonic() - self._started) * 1000, 1), kind, target, data]
+        if self._path is None:
+            self.records.append(record)
+            return
+
+        self._buffer.append(record)
+        if len(self._buffer) >= _FLUSH_EVERY:
+            self.flush()
+
+    def record_mqtt(self, topic: str, payload: bytes) -> None:
+        """Record an inbound MQTT command."""
+        self._record(KIND_MQTT, topic, payload.decode("utf-8", "ignore") if isinstance(payload, bytes) else str(payload))
+
+    def record_frame(self, address: str, frame: bytes) -> None:
+        """Record an outbound BLE frame."""
+        self._record(KIND_FRAME, address, bytes(frame).hex())
+
+    def flush(self) -> None:
+        """Append the buffered records to the file."""
+        if self._path is None or not self._buffer:
+            return
+
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in self._buffer)
+        self._buffer = []
+        try:
+            with gzip.open(self._path, "at", encoding="utf-8") as file:
+                file.write(lines)
+        except OSError as e:
+            _LOGGER.error("Failed to write traffic recording %s: %s", self._path, e)
+
+    def close(self) -> None:
+        """Flush and stop recording."""
+        self.flush()
+
+
+def load_records(path: str) -> list[list]:
+    """Read the records of a recording, skipping the version headers."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file if line.strip()]
+
+    # Every restart appended a new session whose clock starts at zero again,
+    # sessions are laid out one after the other
+    result = []
+    base = 0.0
+    last = 0.0
+    for record in records:
+        if record[1] == "v":
+            if record[2] > RECORD_VERSION:
+                raise ValueError("Unsupported recording version " + str(record[2]))
+            base = last
+            continue
+        record[0] += base
+        last = record[0]
+        result.append(record)
+
+    return result
@@ -0,0 +1,133 @@
+"""Data-driven registry of Govee model capabilities."""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import re
+
+from .models import LedCommand, LedMode
+from .protocol import MODE_1501_ALL_SEGMENTS, FrameTemplate
+
+_LOGGER = logging.getLogger(__name__)
+
+MODELS_FILE = os.path.join(os.path.dirname(__file__), "models.json")
+DEFAULT_MODEL = "default"
+
+# Govee advertises names like "ihoment_H6008_1A2B" or "Govee_H6076_1A2B"
+_ADVERTISED_MODEL = re.compile(r"(?:^|[_\s-])(H[0-9A-Z]{4})(?=[_\s-]|$)", re.IGNORECASE)
+
+
+class ModelCapabilities:
+    """What one model supports, with its frame templates compiled once."""
+
+    def __init__(self, model: str, data: dict) -> None:
+        """Initialize from a merged registry entry."""
+        self.model = model
+        self.led_mode = LedMode[data["led_mode"]]
+        self.brightness_max = int(data["brightness_max"])
+        self.color_temp = bool(data["color_temp"])
+        self.min_color_temp_kelvin, self.max_color_temp_kelvin = data["color_temp_kelvin"]
+        self.segments = int(data["segments"])
+        self.frames_per_second = float(data["frames_per_second"])
+        self.burst = int(data["burst"])
+        self.keep_connection = bool(data["keep_connection"])
+
+        self.power_template = FrameTemplate(LedCommand.POWER, [0x00], (2,))
+        self.brightness_template = FrameTemplate(LedCommand.BRIGHTNESS, [0x00], (2,))
+        if self.led_mode == LedMode.MODE_1501:
+            # mode, 0x01, r, g, b, kelvin hi, kelvin lo, 3 x white, segment mask
+            self.color_template = FrameTemplate(
+                LedCommand.COLOR,
+                [self.led_mode, 0x01, 0, 0, 0, 0, 0, 0, 0, 0, *MODE_1501_ALL_SEGMENTS],
+                (4, 5, 6, 7, 8, 12, 13),
+            )
+        else:
+            # mode, r, g, b, kelvin hi, kelvin lo, 3 x white
+            self.color_template = FrameTemplate(
+                LedCommand.COLOR,
+                [self.led_mode, 0, 0, 0, 0, 0, 0, 0, 0],
+                (3, 4, 5, 6, 7),
+            )
+
+    def encode_power(self, on: bool) -> bytes:
+        """Return the power frame."""
+        return self.power_template.encode(0x01 if on else 0x00)
+
+    def encode_brightness(self, value: int) -> bytes:
+        """Return the brightness frame for a raw device value."""
+        return self.brightness_template.encode(max(min(int(value), self.brightness_max), 0))
+
+    def encode_color(self, rgb, kelvin: int = 0, mask: list[int] | None = None) -> bytes:
+        """Return the color frame, optionally limited to masked segments."""
+        red, green, blue = rgb
+        if self.led_mode == LedMode.MODE_1501:
+            mask = mask or MODE_1501_ALL_SEGMENTS
+            return self.color_template.encode(red, green, blue, kelvin >> 8, kelvin, *mask)
+        return self.color_template.encode(red, green, blue, kelvin >> 8, kelvin)
+
+    def as_dict(self) -> dict:
+        """Return the capabilities for diagnostics."""
+        return {
+            "model": self.model,
+            "led_mode": self.led_mode.name,
+            "brightness_max": self.brightness_max,
+            "color_temp": self.color_temp,
+            "segments": self.segments,
+            "frames_per_second": self.frames_per_second,
+        }
+
+
+class ModelRegistry:
+    """Model capabilities loaded from models.json.
+
+    Every entry is merged over the "default" entry, so the data file only
+    lists what differs per model.
+    """
+
+    def __init__(self, data: dict) -> None:
+        """Compile every entry of the registry data."""
+        defaults = data[DEFAULT_MODEL]
+        self._models = {
+            model.upper() if model != DEFAULT_MODEL else model: ModelCapabilities(model, {**defaults, **entry})
+            for model, entry in data.items()
+        }
+        self._default = self._models[DEFAULT_MODEL]
+
+    @classmethod
+    def load(cls, path: str = MODELS_FILE) -> ModelRegistry:
+        """Load the registry from a data file."""
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file))
+
+    def __contains__(self, model) -> bool:
+        """Return true if the model has its own entry."""
+        return model is not None and model.upper() in self._models
+
+    def get(self, model: str | None) -> ModelCapabilities:
+        """Return the capabilities of a model, falling back to the defaults."""
+        if model is None:
+            return self._default
+        return self._models.get(model.upper(), self._default)
+
+    def detect(self, advertised_name: str | None) -> str | None:
+        """Return the known model contained in an advertised name."""
+        if not advertised_name:
+            return None
+        match = _ADVERTISED_MODEL.search(advertised_name)
+        if match is None or match.group(1) not in self:
+            return None
+        return match.group(1).upper()
+
+    def resolve(self, model: str | None, advertised_name: str | None = None) -> str:
+        """Return the configured model, or the one detected from the advertised name."""
+        if model and model != DEFAULT_MODEL and model in self:
+            return model.upper()
+        detected = self.detect(advertised_name)
+        if detected is not None:
+            _LOGGER.debug("Detected model %s from advertised name %s", detected, advertised_name)
+            return detected
+        return model or DEFAULT_MODEL
+
+
+REGISTRY = ModelRegistry.load()
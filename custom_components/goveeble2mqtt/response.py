@@ -0,0 +1,61 @@
+"""Replies to MQTT commands once they reached the light."""
+
+from __future__ import annotations
+from collections.abc import Callable
+import time
+
+REPLY_TIMEOUT = 30 # seconds before a command that never reached the light is answered with a timeout
+
+STATUS_ACKNOWLEDGED = "acknowledged" # the light confirmed every frame
+STATUS_WRITTEN = "written" # written without acknowledgement, the light has no notifications
+STATUS_UNCHANGED = "unchanged" # nothing had to be sent
+STATUS_TIMEOUT = "timeout"
+STATUS_EXPIRED = "expired" # its time to live passed before it reached the light
+
+
+def command_expired(created: float | None, ttl: float | None, now: float | None = None) -> bool:
+    """Return true if a command created at a monotonic time outlived its time to live.
+
+    Commands without a creation time or a time to live never expire.
+    """
+    if created is None or ttl is None:
+        return False
+    return (now if now is not None else time.monotonic()) - created >= ttl
+
+
+class CommandReply:
+    """Timing of one MQTT command from its arrival to the write of its last frame.
+
+    `pending` holds the properties the command changed. Every property is
+    resolved once its frame was written (and acknowledged where supported),
+    the reply is published when none are left.
+    """
+
+    def __init__(self, properties: set[str], publish: Callable[[dict], None], received: float | None = None) -> None:
+        """Initialize the reply."""
+        self.pending = set(properties)
+        self.received = received or time.monotonic()
+        self.connect = 0.0
+        self.write = 0.0
+        self._publish = publish
+
+    @property
+    def expired(self) -> bool:
+        """Return true if the command did not complete in time."""
+        return time.monotonic() - self.received >= REPLY_TIMEOUT
+
+    def resolve(self, prop: str) -> bool:
+        """Mark a property as written, return true if the command is complete."""
+        self.pending.discard(prop)
+        return not self.pending
+
+    def send(self, status: str) -> None:
+        """Publish the reply with the time spent in queue, connect and write."""
+        total = time.monotonic() - self.received
+        self._publish({
+            "status": status,
+            "queue_ms": round(max(total - self.connect - self.write, 0) * 1000, 1),
+            "connect_ms": round(self.connect * 1000, 1),
+            "write_ms": round(self.write * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+        })
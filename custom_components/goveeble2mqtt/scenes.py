@@ -0,0 +1,207 @@
+"""Scene snapshots of the acknowledged state of a set of lights."""
+
+from __future__ import annotations
+import asyncio
+from collections.abc import Callable
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .synchronized import SyncGroup
+from .warmup import adapter_for
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = DOMAIN + ".scenes"
+STORAGE_VERSION = 1
+SAVE_DELAY = 5 # seconds, captures and activations come in bursts
+
+
+class SceneSnapshot:
+    """The frames that bring a set of lights back to a captured state.
+
+    Frames are encoded once at capture time and grouped by the adapter that
+    reached each light, so activating a scene only streams bytes.
+    """
+
+    def __init__(self, name: str, lights: dict[str, dict], adapters: dict[str, list[str]]) -> None:
+        """Initialize the snapshot."""
+        self.name = name
+        self.lights = lights
+        self.adapters = adapters
+        self.last_activation: dict | None = None
+
+    @property
+    def frame_count(self) -> int:
+        """Return the number of frames activating the scene writes."""
+        return sum(len(light["frames"]) for light in self.lights.values())
+
+    def as_dict(self) -> dict:
+        """Return the snapshot as stored, frames as hex."""
+        return {
+            "lights": {
+                address: {**light, "frames": [frame.hex() for frame in light["frames"]]}
+                for address, light in self.lights.items()
+            },
+            "adapters": self.adapters,
+            "last_activation": self.last_activation,
+        }
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> SceneSnapshot:
+        """Return a snapshot restored from storage."""
+        snapshot = cls(
+            name,
+            {
+                address: {**light, "frames": [bytes.fromhex(frame) for frame in light["frames"]]}
+                for address, light in data["lights"].items()
+            },
+            data["adapters"],
+        )
+        snapshot.last_activation = data.get("last_activation")
+        return snapshot
+
+
+class SceneStore:
+    """Capture, persist and activate scene snapshots.
+
+    A light's part of a snapshot is the state it last acknowledged, not the
+    state last asked for. Activation runs every adapter's lights at once,
+    `wave_size` at a time per adapter, and writes the precompiled frames
+    through each light's link, which paces them.
+    """
+
+    def __init__(self, hass: HomeAssistant, wave_size: int) -> None:
+        """Initialize the store."""
+        self._hass = hass
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._wave_size = max(int(wave_size), 1)
+        self._scenes: dict[str, SceneSnapshot] = {}
+
+    async def async_load(self) -> None:
+        """Restore the snapshots captured before the last restart."""
+        data = await self._store.async_load() or {}
+        for name, scene in data.get("scenes", {}).items():
+            try:
+                self._scenes[name] = SceneSnapshot.from_dict(name, scene)
+            except (KeyError, ValueError) as e:
+                _LOGGER.warning("Dropping unreadable scene %s: %s", name, e)
+
+    def _schedule_save(self) -> None:
+        self._store.async_delay_save(
+            lambda: {"scenes": {name: scene.as_dict() for name, scene in self._scenes.items()}},
+            SAVE_DELAY,
+        )
+
+    @callback
+    def capture(self, name: str, clients: dict) -> dict:
+        """Snapshot the given clients, keyed by address, under a name.
+
+        Each client must provide `Snapshot()`, returning its model, the
+        values it acknowledged and the frames restoring them, or None if it
+        never acknowledged anything.
+        """
+        lights = {}
+        adapters: dict[str, list[str]] = {}
+        skipped = []
+
+        for address, client in clients.items():
+            if (light := client.Snapshot()) is None:
+                skipped.append(address)
+                continue
+            lights[address] = light
+            adapters.setdefault(adapter_for(self._hass, address), []).append(address)
+
+        scene = self._scenes[name] = SceneSnapshot(name, lights, adapters)
+        self._schedule_save()
+        _LOGGER.info("Captured scene %s: %d lights, %d frames, %d skipped", name, len(lights), scene.frame_count, len(skipped))
+        return {"scene": name, "lights": len(lights), "frames": scene.frame_count, "skipped": skipped}
+
+    @callback
+    def remove(self, name: str) -> bool:
+        """Delete a snapshot, return whether it existed."""
+        if self._scenes.pop(name, None) is None:
+            return False
+        self._schedule_save()
+        return True
+
+    def get(self, name: str) -> SceneSnapshot | None:
+        """Return a snapshot by name."""
+        return self._scenes.get(name)
+
+    async def async_activate(
+        self, name: str, get_client: Callable[[str, str], object], synchronized: bool = False
+    ) -> dict | None:
+        """Stream a snapshot's frames to its lights, return the activation timing.
+
+        get_client returns the client of an address and model, each must
+        provide an `async_restore(values, frames, group)` coroutine returning
+        whether every frame was delivered. Synchronized activation primes
+        every light at once and releases their last frames together.
+        Returns None for unknown scenes.
+        """
+        if (scene := self._scenes.get(name)) is None:
+            return None
+
+        _start = time.monotonic()
+        group = SyncGroup(scene.lights) if synchronized else None
+        results = await asyncio.gather(
+            *(self._async_activate_adapter(scene, addresses, get_client, group) for addresses in scene.adapters.values())
+        )
+
+        failed = [address for adapter_failed, _ in results for address in adapter_failed]
+        activation = {
+            "scene": name,
+            "lights": len(scene.lights),
+            "failed": failed,
+            "frames": scene.frame_count,
+            "adapters_ms": {adapter: ms for adapter, (_, ms) in zip(scene.adapters, results)},
+            "duration_ms": round((time.monotonic() - _start) * 1000, 1),
+            "sync": group.as_dict() if group is not None else None,
+        }
+        scene.last_activation = activation
+        self._schedule_save()
+
+        _LOGGER.info(
+            "Activated scene %s in %.0fms: %d lights, %d failed",
+            name, activation["duration_ms"], len(scene.lights), len(failed),
+        )
+        return activation
+
+    async def _async_activate_adapter(
+        self, scene: SceneSnapshot, addresses: list[str], get_client, group: SyncGroup | None
+    ) -> tuple[list[str], float]:
+        """Restore the lights of one adapter, return the failed addresses and the milliseconds taken."""
+        _start = time.monotonic()
+        # A synchronized light holds its slot until the whole group is primed
+        slots = asyncio.Semaphore(len(addresses) if group is not None else self._wave_size)
+
+        async def _async_restore(address: str) -> bool:
+            light = scene.lights[address]
+            async with slots:
+                try:
+                    return await get_client(address, light["model"]).async_restore(light["values"], light["frames"], group)
+                except Exception as e:
+                    _LOGGER.error("Failed to restore %s for scene %s: %s", address, scene.name, e)
+                    if group is not None:
+                        group.withdraw(address)
+                    return False
+
+        results = await asyncio.gather(*(_async_restore(address) for address in addresses))
+        failed = [address for address, restored in zip(addresses, results) if not restored]
+        return failed, round((time.monotonic() - _start) * 1000, 1)
+
+    def as_dict(self) -> dict:
+        """Return the snapshots for diagnostics, without their frames."""
+        return {
+            name: {
+                "lights": len(scene.lights),
+                "frames": scene.frame_count,
+                "adapters": {adapter: len(addresses) for adapter, addresses in scene.adapters.items()},
+                "last_activation": scene.last_activation,
+            }
+            for name, scene in self._scenes.items()
+        }
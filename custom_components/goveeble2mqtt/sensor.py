@@ -1,11 +1,170 @@
-from homeassistant.helpers.entity import Entity
+from datetime import timedelta
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import SIGNAL_STRENGTH_DECIBELS_MILLIWATT, EntityCategory
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
 )
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
 from . import DOMAIN
 
+# Presence sensors read the controller's tracker, advertisements are far too
+# frequent to write a state for each one
+SCAN_INTERVAL = timedelta(seconds=30)
+
+
+async def async_setup_entry(
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        async_add_entities: AddEntitiesCallback,
+    ) -> None:
+    """Set up the diagnostic sensors of a light from a config entry."""
+    controller = hass.data[DOMAIN][entry.entry_id]['controller']
+    address = hass.data[DOMAIN][entry.entry_id]['address']
+
+    async_add_entities([
+        GoveeRssiSensor(controller, address),
+        GoveeLastSeenSensor(controller, address),
+        GoveeLinkTimestampSensor(controller, address, "last_connection_attempt", "Last connection attempt"),
+        GoveeLinkTimestampSensor(controller, address, "last_packet_attempt", "Last packet attempt"),
+    ])
+
+
+async def async_setup_platform(
+        hass: HomeAssistant,
+        config: ConfigType,
+        async_add_entities: AddEntitiesCallback,
+        discovery_info: DiscoveryInfoType | None = None,
+    ) -> None:
+    """Set up the diagnostic sensors of the lights configured for the MQTT bridge."""
+    if discovery_info is None:
+        return
+    bridge = hass.data[DOMAIN]["bridge"]
+
+    entities = []
+    for device in hass.data[DOMAIN]["devices"]:
+        address = device["address"].upper()
+        name = device.get("name", address)
+        entities.extend([
+            GoveeRssiSensor(bridge, address, name),
+            GoveeLastSeenSensor(bridge, address, name),
+            GoveeLinkTimestampSensor(bridge, address, "last_connection_attempt", "Last connection attempt", name),
+            GoveeLinkTimestampSensor(bridge, address, "last_packet_attempt", "Last packet attempt", name),
+        ])
+    async_add_entities(entities)
+
+
+class GoveePresenceSensor(SensorEntity):
+    """Base for diagnostic sensors fed by the presence tracker of the controller or the MQTT bridge."""
+
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = True
+
+    def __init__(self, controller, address: str, key: str, device_name: str | None = None) -> None:
+        """Initialize the sensor.
+
+        The bridge's sensors have no device to take their name from, they
+        are given the name of the configured light instead.
+        """
+        self._controller = controller
+        self._mac = address
+        self._attr_unique_id = f"{address.replace(':', '')}_{key}"
+        if device_name is not None:
+            self._attr_has_entity_name = False
+            self._attr_name = f"{device_name} {self._attr_name}"
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Attach the sensor to the light's device."""
+        return DeviceInfo(identifiers={(DOMAIN, self._mac.replace(":", ""))})
+
+    @property
+    def available(self) -> bool:
+        """Return true once the light has been heard."""
+        presence = self._controller.presence.get(self._mac)
+        return presence is not None and presence.last_seen is not None
+
+
+class GoveeRssiSensor(GoveePresenceSensor):
+    """Moving average of the light's advertisement RSSI."""
+
+    _attr_name = "Signal strength"
+    _attr_device_class = SensorDeviceClass.SIGNAL_STRENGTH
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = SIGNAL_STRENGTH_DECIBELS_MILLIWATT
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, controller, address: str, device_name: str | None = None) -> None:
+        """Initialize the sensor."""
+        super().__init__(controller, address, "rssi", device_name)
+
+    @property
+    def native_value(self):
+        """Return the averaged RSSI."""
+        rssi = self._controller.presence.rssi(self._mac)
+        return None if rssi is None else round(rssi)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the adapter that heard the light."""
+        return {"source": self._controller.presence.adapter(self._mac)}
+
+
+class GoveeLastSeenSensor(GoveePresenceSensor):
+    """Time the light was last heard advertising."""
+
+    _attr_name = "Last seen"
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+
+    def __init__(self, controller, address: str, device_name: str | None = None) -> None:
+        """Initialize the sensor."""
+        super().__init__(controller, address, "last_seen", device_name)
+
+    @property
+    def native_value(self):
+        """Return when the light was last heard."""
+        presence = self._controller.presence.get(self._mac)
+        return None if presence is None else presence.last_seen_at
+
+    @property
+    def extra_state_attributes(self):
+        """Return whether the controller considers the light present."""
+        return {"present": self._controller.presence.is_present(self._mac)}
+
+
+class GoveeLinkTimestampSensor(GoveePresenceSensor):
+    """A time the light's link was last used, from the light's diagnostics.
+
+    These change with every connection attempt or frame, polling them keeps
+    them to one recorder row per scan interval.
+    """
+
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, controller, address: str, key: str, name: str, device_name: str | None = None) -> None:
+        """Initialize the sensor."""
+        self._attr_name = name
+        super().__init__(controller, address, key, device_name)
+        self._key = key
+
+    @property
+    def available(self) -> bool:
+        """Return true once the link was used."""
+        return self.native_value is not None
+
+    @property
+    def native_value(self):
+        """Return the time of the diagnostic value."""
+        return self._controller.light_diagnostics().get(self._mac, {}).get(self._key)
+
+
 class GoveeMQTTSensor(CoordinatorEntity, SensorEntity):
     """Representation of a Sensor that is updated by a DataUpdateCoordinator."""
 
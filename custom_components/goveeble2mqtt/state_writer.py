@@ -0,0 +1,73 @@
+"""Throttled, coalesced state writes for light entities."""
+
+from __future__ import annotations
+from collections.abc import Callable
+import time
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+
+class ThrottledStateWriter:
+    """Coalesce state changes of an entity into at most one write per interval.
+
+    The first change after a quiet period is written at once. Changes
+    during the following interval only mark the state stale and are written
+    together when the interval ends, or earlier through flush() once the
+    caller knows a burst is complete.
+    """
+
+    def __init__(self, hass: HomeAssistant, write: Callable[[], None], interval: float) -> None:
+        """Initialize the writer."""
+        self._hass = hass
+        self._write = write
+        self._interval = interval
+        self._last_write = 0.0
+        self._stale = False
+        self._unsub: CALLBACK_TYPE | None = None
+        self.requested = 0
+        self.written = 0
+
+    @callback
+    def async_schedule(self) -> None:
+        """Write now if the interval passed, otherwise once it has."""
+        self.requested += 1
+        self._stale = True
+        if self._unsub is not None:
+            return
+
+        wait = self._last_write + self._interval - time.monotonic()
+        if wait <= 0:
+            self._async_write()
+        else:
+            self._unsub = async_call_later(self._hass, wait, self._async_timer)
+
+    @callback
+    def async_flush(self) -> None:
+        """Write a stale state right away."""
+        if self._stale:
+            self._async_write()
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop a pending write."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._stale = False
+
+    @callback
+    def _async_timer(self, _now) -> None:
+        self._unsub = None
+        if self._stale:
+            self._async_write()
+
+    @callback
+    def _async_write(self) -> None:
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._stale = False
+        self._last_write = time.monotonic()
+        self.written += 1
+        self._write()
@@ -0,0 +1,107 @@
+"""Real-time color streaming to a single Govee light."""
+
+from __future__ import annotations
+import json
+import time
+
+from .const import DEFAULT_STREAM_TIMEOUT
+
+_RATE_SMOOTHING = 0.1
+
+
+def parse_stream_payload(payload: bytes) -> tuple[int, int, int, float | None]:
+    """Decode a stream message into (r, g, b, sent_at).
+
+    Three raw bytes are the cheapest encoding. JSON is accepted as well,
+    either `{"r": .., "g": .., "b": ..}` or `{"color": {...}}`, optionally
+    with the sender's unix timestamp in `ts` to measure latency end to end.
+    """
+    if len(payload) == 3:
+        return payload[0], payload[1], payload[2], None
+
+    message = json.loads(payload.decode("utf-8", "ignore"))
+    color = message.get("color", message)
+    rgb = (color["r"], color["g"], color["b"])
+    for value in rgb:
+        if not isinstance(value, int) or value < 0 or value > 255:
+            raise ValueError("Invalid color")
+
+    sent_at = message.get("ts")
+    return rgb[0], rgb[1], rgb[2], None if sent_at is None else float(sent_at)
+
+
+class StreamSession:
+    """Single-slot mailbox between the MQTT stream topic and a light.
+
+    Only the newest frame is kept: a frame that arrives before the previous
+    one went out replaces it, so a slow light drops frames instead of
+    building up latency. The session ends when no frame arrived for
+    `timeout` seconds.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_STREAM_TIMEOUT) -> None:
+        """Initialize the session."""
+        self._timeout = timeout
+        self._frame: tuple[tuple[int, int, int], float] | None = None
+        self.started = time.monotonic()
+        self.last_offered = self.started
+        self.last_sent: tuple[int, int, int] | None = None
+        self.received = 0
+        self.sent = 0
+        self.replaced = 0
+        self.fps = 0.0
+        self.latency = 0.0 # seconds from arrival (or sender timestamp) to acknowledgement
+        self.max_latency = 0.0
+        self._last_sent_at: float | None = None
+
+    def offer(self, rgb: tuple[int, int, int], sent_at: float | None = None) -> None:
+        """Put a frame in the mailbox, replacing one that was not sent yet."""
+        now = time.monotonic()
+        if self._frame is not None:
+            self.replaced += 1
+
+        # Convert the sender's wall clock timestamp to our monotonic clock
+        received_at = now if sent_at is None else now - max(time.time() - sent_at, 0)
+        self._frame = (rgb, received_at)
+        self.last_offered = now
+        self.received += 1
+
+    def take(self) -> tuple[tuple[int, int, int], float] | None:
+        """Take the newest frame out of the mailbox."""
+        frame = self._frame
+        self._frame = None
+        return frame
+
+    @property
+    def expired(self) -> bool:
+        """Return true if the stream went quiet."""
+        return self._frame is None and time.monotonic() - self.last_offered >= self._timeout
+
+    def remaining(self) -> float:
+        """Return the seconds left until the session times out."""
+        return max(self._timeout - (time.monotonic() - self.last_offered), 0)
+
+    def record_sent(self, rgb: tuple[int, int, int], received_at: float) -> None:
+        """Account for a frame the light acknowledged."""
+        now = time.monotonic()
+        latency = now - received_at
+        if self._last_sent_at is not None and now > self._last_sent_at:
+            self.fps += _RATE_SMOOTHING * (1 / (now - self._last_sent_at) - self.fps)
+        self.latency = latency if self.sent == 0 else self.latency + _RATE_SMOOTHING * (latency - self.latency)
+        self.max_latency = max(self.max_latency, latency)
+        self._last_sent_at = now
+        self.last_sent = rgb
+        self.sent += 1
+
+    def as_dict(self) -> dict:
+        """Return the session statistics."""
+        return {
+            "active": not self.expired,
+            "duration": round(time.monotonic() - self.started, 1),
+            "received": self.received,
+            "sent": self.sent,
+            "dropped": self.replaced,
+            "fps": round(self.fps, 1),
+            "latency_ms": round(self.latency * 1000, 1),
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+        }
@@ -0,0 +1,84 @@
+"""Release the final frames of a group of lights at one instant."""
+
+from __future__ import annotations
+import asyncio
+from collections.abc import Iterable
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+RELEASE_LEAD = 0.05 # seconds between the last light being primed and the release
+PRIME_TIMEOUT = 5.0 # seconds the primed lights wait for the stragglers of their group
+
+
+class SyncGroup:
+    """A set of lights whose final frames go out together.
+
+    Every member connects and writes all but its last frame, then reports
+    itself primed and waits. Once every member is primed or withdrew, or
+    PRIME_TIMEOUT after the first one was, a release instant RELEASE_LEAD
+    ahead is fixed and each member writes its last frame at that instant.
+    The write times of the members give the skew between the lights.
+    """
+
+    def __init__(self, members: Iterable[str], lead: float = RELEASE_LEAD, timeout: float = PRIME_TIMEOUT) -> None:
+        """Initialize the group."""
+        self.members = set(members)
+        self._lead = lead
+        self._timeout = timeout
+        self._primed: set[str] = set()
+        self._withdrawn: set[str] = set()
+        self._released = asyncio.Event()
+        self.release_at: float | None = None
+        self._written: dict[str, float] = {}
+        self._created = time.monotonic()
+
+    def _maybe_release(self) -> None:
+        if not self._released.is_set() and self.members <= self._primed | self._withdrawn:
+            self._release()
+
+    def _release(self) -> None:
+        if self._released.is_set():
+            return
+        self.release_at = time.monotonic() + self._lead
+        self._released.set()
+
+    async def async_primed(self, address: str) -> float:
+        """Report a member primed, return the monotonic instant to write its last frame at."""
+        self._primed.add(address)
+        self._maybe_release()
+        try:
+            await asyncio.wait_for(self._released.wait(), self._timeout)
+        except asyncio.TimeoutError:
+            _LOGGER.debug("Releasing group without %s", self.members - self._primed - self._withdrawn)
+            self._release()
+        return self.release_at
+
+    def withdraw(self, address: str) -> None:
+        """Drop a member that could not be primed or written, the others do not wait for it."""
+        if address in self._written:
+            return
+        self._withdrawn.add(address)
+        self._maybe_release()
+
+    def written(self, address: str, written_at: float) -> None:
+        """Record the monotonic time a member's last frame was written."""
+        self._written[address] = written_at
+
+    @property
+    def complete(self) -> bool:
+        """Return true once every member wrote its last frame or withdrew."""
+        return self.members <= set(self._written) | self._withdrawn
+
+    def as_dict(self) -> dict:
+        """Return the skew between the members' last frames and their lateness in milliseconds."""
+        times = list(self._written.values())
+        return {
+            "lights": len(self.members),
+            "written": len(times),
+            "withdrawn": len(self._withdrawn),
+            "prime_ms": round((self.release_at - self._lead - self._created) * 1000, 1) if self.release_at else None,
+            "skew_ms": round((max(times) - min(times)) * 1000, 1) if times else None,
+            "late_ms": round((max(times) - self.release_at) * 1000, 1) if times and self.release_at else None,
+        }
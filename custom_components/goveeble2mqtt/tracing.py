@@ -0,0 +1,82 @@
+"""Per-device event tracing into bounded ring buffers."""
+
+from __future__ import annotations
+from collections import deque
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+TRACE_BUFFER_SIZE = 256 # events kept per device
+SUMMARY_INTERVAL = 60 # seconds between summaries in the main log
+
+
+class Tracer:
+    """Keep the latest events of every device and summarize them now and then.
+
+    Recording an event only appends a tuple to a bounded deque, the fields
+    are formatted when the buffer is dumped. The main log gets one summary
+    line per SUMMARY_INTERVAL with the event counts, never the events
+    themselves. Disabled tracing returns before touching anything.
+    """
+
+    def __init__(self, buffer_size: int = TRACE_BUFFER_SIZE, summary_interval: float = SUMMARY_INTERVAL) -> None:
+        """Initialize the tracer, disabled."""
+        self.enabled = False
+        self._buffer_size = buffer_size
+        self._summary_interval = summary_interval
+        self._buffers: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+        self._summarized = time.monotonic()
+
+    def event(self, device: str, name: str, **fields) -> None:
+        """Record an event of a device."""
+        if not self.enabled:
+            return
+
+        buffer = self._buffers.get(device)
+        if buffer is None:
+            buffer = self._buffers[device] = deque(maxlen=self._buffer_size)
+        buffer.append((time.time(), name, fields))
+        self._counts[name] = self._counts.get(name, 0) + 1
+
+        now = time.monotonic()
+        if now - self._summarized >= self._summary_interval:
+            self._summarize(now)
+
+    def _summarize(self, now: float) -> None:
+        _LOGGER.info(
+            "Trace summary for the last %.0fs over %d devices: %s",
+            now - self._summarized,
+            len(self._buffers),
+            ", ".join(f"{name}={count}" for name, count in sorted(self._counts.items())),
+        )
+        self._counts = {}
+        self._summarized = now
+
+    def dump(self, device: str | None = None) -> dict[str, list[dict]]:
+        """Return the buffered events of one or all devices, oldest first."""
+        devices = [device] if device is not None else list(self._buffers)
+        return {
+            key: [
+                {"time": timestamp, "event": name, **{k: _jsonable(v) for k, v in fields.items()}}
+                for timestamp, name, fields in self._buffers.get(key, ())
+            ]
+            for key in devices
+        }
+
+    def clear(self) -> None:
+        """Drop every buffered event."""
+        self._buffers.clear()
+        self._counts = {}
+
+
+def _jsonable(value):
+    if isinstance(value, bytes | bytearray):
+        return bytes(value).hex()
+    if isinstance(value, str | int | float | bool | None | list | dict):
+        return value
+    return str(value)
+
+
+TRACER = Tracer()
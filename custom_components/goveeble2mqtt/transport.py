@@ -0,0 +1,297 @@
+"""One BLE connection and write queue per light, shared by every front end."""
+
+from __future__ import annotations
+import asyncio
+from collections.abc import Callable
+import logging
+import time
+
+import bleak_retry_connector
+from bleak import BleakClient
+
+from homeassistant.components import bluetooth
+from homeassistant.core import HomeAssistant, callback
+
+from .ack import AckTracker
+from .breaker import CircuitBreaker
+from .const import DOMAIN
+from .pacing import PACER
+from .protocol import UUID_CONTROL_CHARACTERISTIC, UUID_NOTIFY_CHARACTERISTIC
+from .tracing import TRACER
+from .warmup import adapter_for
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_TRANSPORT = DOMAIN + "_transport"
+CONNECT_ATTEMPTS = 3 # establish_connection attempts while the breaker is closed
+ACK_TIMEOUT = 1.0 # seconds to wait for a light to acknowledge a frame
+
+
+class BleLink:
+    """The connection to one light and the queue its frames are written through.
+
+    Connects are serialized and skipped while connected, so front ends that
+    ask at the same time share one attempt and one connection slot. Frames
+    are written one at a time and each waits for its acknowledgement before
+    the next goes out, so a reply is never matched to another front end's
+    frame. The circuit breaker and the acknowledgement tracker belong to
+    the link, every front end sees the same failures and replies.
+    """
+
+    def __init__(self, hass: HomeAssistant, address: str, client_class: type = BleakClient) -> None:
+        """Initialize the link, disconnected."""
+        self._hass = hass
+        self.address = address.upper()
+        self._client_class = client_class
+        self.client = None
+        self.breaker = CircuitBreaker()
+        self.tracker = AckTracker(ACK_TIMEOUT)
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._listeners: list[Callable[[], None]] = []
+        self._probe_listeners: list[Callable[[], None]] = []
+        self.users: set = set()
+        self.attempts = 0
+        self.connects = 0
+        self.disconnects = 0
+
+    @property
+    def is_connected(self) -> bool:
+        """Return true while the light is connected."""
+        return self.client is not None and self.client.is_connected
+
+    @callback
+    def add_disconnect_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener whenever the connection is lost, returns a function removing it."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener) if listener in self._listeners else None
+
+    @callback
+    def add_probe_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call listener whenever an advertisement lets the open breaker probe, returns a function removing it."""
+        self._probe_listeners.append(listener)
+        return lambda: self._probe_listeners.remove(listener) if listener in self._probe_listeners else None
+
+    @callback
+    def on_advertisement(self) -> bool:
+        """Hand an advertisement of the light to the breaker, return whether it now probes.
+
+        Every front end passes the advertisements it hears, only the first
+        after the breaker opened moves it to half open. All of them are
+        woken through their probe listeners, whichever heard it first.
+        """
+        if not self.breaker.on_advertisement():
+            return False
+        for listener in list(self._probe_listeners):
+            listener()
+        return True
+
+    async def async_connect(self, ble_device=None) -> bool:
+        """Connect unless connected, return whether the light is connected.
+
+        Uses the BLEDevice Home Assistant knows for the address, or the given
+        one, and falls back to handing the address to the client class.
+        """
+        if self.is_connected:
+            return True
+
+        async with self._connect_lock:
+            if self.is_connected:
+                return True
+            if not self.breaker.allow_request():
+                return False
+
+            self.attempts += 1
+            TRACER.event(self.address, "connect")
+            if self.client is not None:
+                await self._async_drop_client()
+
+            device = bluetooth.async_ble_device_from_address(self._hass, self.address, connectable=True) or ble_device
+            try:
+                if device is not None:
+                    client = await bleak_retry_connector.establish_connection(
+                        client_class = self._client_class,
+                        device = device,
+                        name = self.address,
+                        disconnected_callback = self._on_disconnected,
+                        # A half-open probe gets a single, cheap attempt
+                        max_attempts = 1 if self.breaker.is_probe else CONNECT_ATTEMPTS,
+                    )
+                else:
+                    client = self._client_class(self.address, disconnected_callback=self._on_disconnected)
+                    await client.connect()
+                self.client = client
+                await self._async_start_notify()
+            except Exception as e:
+                _LOGGER.error("Failed to connect to %s: %s", self.address, e)
+                TRACER.event(self.address, "connect_failed", error=e)
+                self.breaker.record_failure()
+                await self._async_drop_client()
+                return False
+
+            self.connects += 1
+            self.breaker.record_success()
+            _LOGGER.debug("Connected to %s", self.address)
+            TRACER.event(self.address, "connected", notify=self.tracker.enabled)
+            return self.is_connected
+
+    async def _async_start_notify(self) -> None:
+        """Subscribe to the notify characteristic to receive acknowledgements."""
+        self.tracker.reset()
+        try:
+            await self.client.start_notify(UUID_NOTIFY_CHARACTERISTIC, self.tracker.handle_notification)
+            self.tracker.enabled = True
+        except Exception as e:
+            _LOGGER.debug("Notifications unavailable for %s, using pacing only: %s", self.address, e)
+
+    @callback
+    def _on_disconnected(self, client) -> None:
+        if client is not self.client:
+            return
+        _LOGGER.debug("Disconnected from %s", self.address)
+        TRACER.event(self.address, "disconnected")
+        PACER.disconnected(self.address)
+        self.tracker.reset()
+        self.client = None
+        self.disconnects += 1
+        self._notify_listeners()
+
+    def _notify_listeners(self) -> None:
+        for listener in list(self._listeners):
+            listener()
+
+    async def _async_drop_client(self) -> None:
+        client, self.client = self.client, None
+        self.tracker.reset()
+        if client is None:
+            return
+        try:
+            if client.is_connected:
+                await client.disconnect()
+        except Exception as e:
+            _LOGGER.debug("Failed to disconnect from %s: %s", self.address, e)
+
+    async def async_disconnect(self) -> None:
+        """Drop the connection, every front end reconnects on its next frame."""
+        if self.client is None:
+            return
+        _LOGGER.debug("Disconnecting from %s", self.address)
+        await self._async_drop_client()
+        self.disconnects += 1
+        self._notify_listeners()
+
+    async def async_request(
+        self,
+        frame: bytes,
+        capabilities,
+        recorder=None,
+        release_at: float | None = None,
+        on_written: Callable[[float], None] | None = None,
+    ) -> bytes | None:
+        """Write a frame and wait for the light to acknowledge it.
+
+        With release_at the frame is held until that monotonic instant, the
+        pacing token is taken beforehand so the write itself is not delayed.
+        on_written is called with the monotonic time the write completed.
+
+        Returns the reply frame, the written frame itself if the light does
+        not support notifications, or None if the light is not connected,
+        the write failed or the frame was not acknowledged in time.
+        """
+        async with self._write_lock:
+            if not self.is_connected:
+                return None
+            try:
+                # Frames within the light's and the adapter's budget go out at once
+                await PACER.async_acquire(self.address, adapter_for(self._hass, self.address), capabilities)
+                if release_at is not None and (delay := release_at - time.monotonic()) > 0:
+                    await asyncio.sleep(delay)
+                future = self.tracker.expect(frame) if self.tracker.enabled else None
+                await self.client.write_gatt_char(UUID_CONTROL_CHARACTERISTIC, frame, False)
+                if on_written is not None:
+                    on_written(time.monotonic())
+                TRACER.event(self.address, "send", frame=frame)
+                if recorder is not None:
+                    recorder.record_frame(self.address, frame)
+
+                if future is None:
+                    PACER.delivered(self.address)
+                    return frame
+
+                reply = await self.tracker.async_wait(future)
+                if reply is None:
+                    TRACER.event(self.address, "unacked", frame=frame)
+                    PACER.dropped(self.address)
+                else:
+                    PACER.delivered(self.address)
+                return reply
+            except Exception as e:
+                _LOGGER.error("Failed to write to %s: %s", self.address, e)
+                TRACER.event(self.address, "write_failed", error=e)
+                PACER.disconnected(self.address)
+                await self.async_disconnect()
+                return None
+
+    def as_dict(self) -> dict:
+        """Return the link for diagnostics."""
+        return {
+            "connected": self.is_connected,
+            "users": len(self.users),
+            "attempts": self.attempts,
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "breaker": self.breaker.as_dict(),
+            "ack": self.tracker.as_dict(),
+        }
+
+
+class BleTransport:
+    """The links of every light, shared by the light entities and the MQTT bridge.
+
+    A front end acquires the link of an address and releases it when done.
+    The link, and with it the connection, lives until its last user
+    released it.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the transport."""
+        self._hass = hass
+        self._links: dict[str, BleLink] = {}
+
+    @callback
+    def acquire(self, address: str, user, client_class: type | None = None) -> BleLink:
+        """Return the link of an address, creating it with client_class if needed."""
+        address = address.upper()
+        if (link := self._links.get(address)) is None:
+            link = self._links[address] = BleLink(self._hass, address, client_class or BleakClient)
+        link.users.add(user)
+        return link
+
+    @callback
+    def release(self, address: str, user) -> None:
+        """Give up a link, disconnecting once no front end uses it."""
+        address = address.upper()
+        if (link := self._links.get(address)) is None:
+            return
+        link.users.discard(user)
+        if link.users:
+            return
+        del self._links[address]
+        PACER.forget(address)
+        self._hass.async_create_task(link.async_disconnect())
+
+    def get(self, address: str) -> BleLink | None:
+        """Return the link of an address if a front end uses it."""
+        return self._links.get(address.upper())
+
+    def as_dict(self) -> dict:
+        """Return every link for diagnostics."""
+        return {address: link.as_dict() for address, link in self._links.items()}
+
+
+@callback
+def get_transport(hass: HomeAssistant) -> BleTransport:
+    """Return the transport shared by every front end of this Home Assistant instance."""
+    if (transport := hass.data.get(DATA_TRANSPORT)) is None:
+        transport = hass.data[DATA_TRANSPORT] = BleTransport(hass)
+    return transport
@@ -0,0 +1,109 @@
+"""Staggered connection warm-up for the configured Govee lights."""
+
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import time
+
+from homeassistant.components import bluetooth
+from homeassistant.core import HomeAssistant
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_ADAPTER = "default"
+
+
+def adapter_for(hass: HomeAssistant, address: str) -> str:
+    """Return the adapter (local HCI or proxy) that last heard the given address."""
+    service_info = bluetooth.async_last_service_info(hass, address.upper(), connectable=True)
+    if service_info is None:
+        return DEFAULT_ADAPTER
+    return service_info.source
+
+
+class WarmupScheduler:
+    """Connect a fleet of lights in jittered, adapter-aware waves.
+
+    Every adapter (local HCI or bluetooth proxy) only gets `wave_size`
+    connection attempts at a time. Waves are spread over `budget` seconds so
+    a restart with many lights does not open every connection at once.
+    """
+
+    def __init__(self, hass: HomeAssistant, budget: float, wave_size: int) -> None:
+        """Initialize the scheduler."""
+        self._hass = hass
+        self._budget = max(float(budget), 1.0)
+        self._wave_size = max(int(wave_size), 1)
+
+    def plan(self, addresses: list[str]) -> list[list[str]]:
+        """Split the addresses into waves with at most wave_size per adapter."""
+        by_adapter: dict[str, list[str]] = {}
+        for address in addresses:
+            by_adapter.setdefault(adapter_for(self._hass, address), []).append(address)
+
+        waves = []
+        index = 0
+        while True:
+            wave = []
+            for adapter_addresses in by_adapter.values():
+                wave.extend(adapter_addresses[index:index + self._wave_size])
+            if not wave:
+                break
+            waves.append(wave)
+            index += self._wave_size
+        return waves
+
+    async def async_run(self, clients: dict) -> dict:
+        """Warm up the given clients, keyed by address.
+
+        Each client must provide an `async_warm_up()` coroutine that returns
+        whether the connection was established.
+        """
+        waves = self.plan(list(clients))
+        if not waves:
+            return {"connected": 0, "failed": 0, "duration": 0.0}
+
+        _start = time.monotonic()
+        _deadline = _start + self._budget
+        _slot = self._budget / len(waves)
+        connected = 0
+        failed = 0
+
+        _LOGGER.info("Warming up %d lights in %d waves over %.0fs", len(clients), len(waves), self._budget)
+
+        for index, wave in enumerate(waves):
+            remaining = _deadline - time.monotonic()
+            if remaining <= 0:
+                _LOGGER.warning("Warm-up budget exhausted, %d waves left to connect lazily", len(waves) - index)
+                failed += sum(len(w) for w in waves[index:])
+                break
+
+            timeout = min(_slot, remaining)
+            results = await asyncio.gather(
+                *(self._async_warm_up_client(address, clients[address], timeout) for address in wave)
+            )
+            connected += sum(1 for result in results if result)
+            failed += sum(1 for result in results if not result)
+
+            # Keep the waves aligned to their slots when a wave finished early
+            _next_wave = _start + _slot * (index + 1)
+            _delay = _next_wave - time.monotonic()
+            if _delay > 0 and index + 1 < len(waves):
+                await asyncio.sleep(_delay)
+
+        duration = time.monotonic() - _start
+        _LOGGER.info("Warm-up finished in %.1fs: %d connected, %d failed", duration, connected, failed)
+        return {"connected": connected, "failed": failed, "duration": duration}
+
+    async def _async_warm_up_client(self, address: str, client, timeout: float) -> bool:
+        """Connect one client after a random jitter inside the first half of its slot."""
+        jitter = random.uniform(0, timeout / 2)
+        try:
+            await asyncio.sleep(jitter)
+            return bool(await asyncio.wait_for(client.async_warm_up(), timeout - jitter))
+        except asyncio.TimeoutError:
+            _LOGGER.debug("Warm-up of %s timed out", address)
+        except Exception as e:
+            _LOGGER.debug("Warm-up of %s failed: %s", address, e)
+        return False
@@ -0,0 +1,338 @@
+"""Synthetic MQTT load against a Govee2Mqtt bridge and simulated lights.
+
+Run it from a test with the bluetooth integration loaded:
+
+    report = await async_run_load_test(hass, devices=200, rate=100, duration=60)
+"""
+
+from __future__ import annotations
+import asyncio
+from collections import deque
+import itertools
+import json
+import logging
+import random
+import time
+
+import paho.mqtt.client as mqtt
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import (
+    DOMAIN,
+    DEFAULT_STREAM_TIMEOUT,
+    DEFAULT_SYNC_AIRTIME_BUDGET,
+    DEFAULT_SYNC_MAX_INTERVAL,
+    DEFAULT_SYNC_MIN_INTERVAL,
+    DEFAULT_WARMUP_BUDGET,
+    DEFAULT_WARMUP_WAVE_SIZE,
+)
+from custom_components.goveeble2mqtt.discovery import light_topic
+
+from .simulator import GoveeSimulator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Share of generated messages per scenario
+DEFAULT_MIX = {"toggle": 0.5, "slider": 0.3, "scene": 0.2}
+SLIDER_STEPS = 10 # brightness messages per slider drag
+SCENE_FAN_OUT = 10 # lights a scene message is sent to
+SAMPLE_INTERVAL = 0.1 # seconds between queue depth samples
+
+
+class InProcessBroker:
+    """Routes messages between paho client stand-ins without a network.
+
+    `client_class` implements the parts of the paho client the bridge uses
+    and is handed to the bridge as its MQTT client class. The load
+    generator publishes and subscribes on the broker directly.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the broker."""
+        self._clients: list[BrokerClient] = []
+        self._listeners: list[tuple[str, callable]] = []
+        self.routed = 0
+
+        broker = self
+
+        class _BoundClient(BrokerClient):
+            _broker = broker
+
+        self.client_class = _BoundClient
+
+    def _attach(self, client: BrokerClient) -> None:
+        if client not in self._clients:
+            self._clients.append(client)
+
+    def publish(self, topic: str, payload: bytes | str) -> None:
+        """Route a message to every matching subscription."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.routed += 1
+
+        for client in self._clients:
+            if any(mqtt.topic_matches_sub(sub, topic) for sub in client.subscriptions):
+                message = mqtt.MQTTMessage(topic=topic.encode())
+                message.payload = payload
+                message.timestamp = time.monotonic()
+                client.inbox.append(message)
+
+        for sub, listener in self._listeners:
+            if mqtt.topic_matches_sub(sub, topic):
+                listener(topic, payload)
+
+    def has_subscriber(self, topic: str) -> bool:
+        """Return true if a client subscribed to topic."""
+        return any(
+            mqtt.topic_matches_sub(sub, topic) for client in self._clients for sub in client.subscriptions
+        )
+
+    def listen(self, sub: str, listener) -> None:
+        """Call listener(topic, payload) for every message matching sub."""
+        self._listeners.append((sub, listener))
+
+
+class BrokerClient:
+    """The parts of paho.mqtt.client.Client the bridge uses."""
+
+    _broker: InProcessBroker
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize the client."""
+        self.on_connect = None
+        self.on_message = None
+        self.subscriptions: list[str] = []
+        self.inbox: deque[mqtt.MQTTMessage] = deque()
+        self._connecting = False
+
+    def username_pw_set(self, username, password=None) -> None:
+        """Accept credentials."""
+
+    def connect(self, host, port=1883, keepalive=60, **kwargs) -> int:
+        """Attach to the broker, on_connect runs on the next loop."""
+        self._broker._attach(self)
+        self._connecting = True
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def disconnect(self, *args, **kwargs) -> int:
+        """Detach from the broker."""
+        self.subscriptions = []
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic, qos=0, options=None, properties=None):
+        """Subscribe to a topic or a list of (topic, qos) tuples."""
+        topics = [topic] if isinstance(topic, str) else [sub for sub, _qos in topic]
+        self.subscriptions.extend(topics)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None) -> None:
+        """Publish through the broker."""
+        self._broker.publish(topic, payload if payload is not None else b"")
+
+    def loop(self, timeout=1.0) -> int:
+        """Run the connect callback and deliver the received messages."""
+        if self._connecting:
+            self._connecting = False
+            if self.on_connect is not None:
+                self.on_connect(self, None, {}, 0)
+
+        while self.inbox:
+            message = self.inbox.popleft()
+            if self.on_message is not None:
+                self.on_message(self, None, message)
+        return mqtt.MQTT_ERR_SUCCESS
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def _at(p: float) -> float:
+        return round(values[min(int(len(values) * p), len(values) - 1)] * 1000, 1)
+
+    return {"count": len(values), "p50_ms": _at(0.5), "p95_ms": _at(0.95), "p99_ms": _at(0.99), "max_ms": _at(1)}
+
+
+class LoadGenerator:
+    """Publish a weighted mix of command scenarios at a target message rate.
+
+    toggle: one power message to a random light (on/off storms)
+    slider: SLIDER_STEPS brightness messages to one light (slider drags)
+    scene: one color message to each of SCENE_FAN_OUT lights (scene fan-outs)
+
+    Every message carries a correlation id, the bridge's replies on the
+    response topics give the end-to-end latency.
+    """
+
+    def __init__(self, broker: InProcessBroker, topics: list[str], rate: float, mix: dict, seed: int | None = None) -> None:
+        """Initialize the generator."""
+        self._broker = broker
+        self.topics = topics
+        self._interval = 1 / max(rate, 0.001)
+        self._random = random.Random(seed)
+        self._scenarios = list(mix)
+        self._weights = [mix[scenario] for scenario in self._scenarios]
+        self._sequence = itertools.count()
+        self._sent: dict[str, float] = {}
+        self.published = 0
+        self.latencies: list[float] = []
+        self.statuses: dict[str, int] = {}
+
+        broker.listen(DOMAIN + "/light/+/response", self._on_response)
+
+    def _on_response(self, topic: str, payload: bytes) -> None:
+        reply = json.loads(payload)
+        sent = self._sent.pop(reply.get("correlation_id"), None)
+        if sent is not None:
+            self.latencies.append(time.monotonic() - sent)
+        self.statuses[reply["status"]] = self.statuses.get(reply["status"], 0) + 1
+
+    def _scenario(self):
+        scenario = self._random.choices(self._scenarios, self._weights)[0]
+        if scenario == "slider":
+            topic = self._random.choice(self.topics)
+            start = self._random.randint(0, 255)
+            for step in range(SLIDER_STEPS):
+                yield topic, {"brightness": (start + step * 12) % 256}
+        elif scenario == "scene":
+            color = {"r": self._random.randint(0, 255), "g": self._random.randint(0, 255), "b": self._random.randint(0, 255)}
+            for topic in self._random.sample(self.topics, min(SCENE_FAN_OUT, len(self.topics))):
+                yield topic, {"state": "ON", "color": color}
+        else:
+            yield self._random.choice(self.topics), {"state": self._random.choice(("ON", "OFF"))}
+
+    async def async_run(self, duration: float) -> None:
+        """Publish for duration seconds, keeping to the rate on average."""
+        started = time.monotonic()
+        while time.monotonic() - started < duration:
+            for topic, payload in self._scenario():
+                correlation_id = str(next(self._sequence))
+                payload["correlation_id"] = correlation_id
+                self._sent[correlation_id] = time.monotonic()
+                self._broker.publish(topic, json.dumps(payload))
+                self.published += 1
+
+                delay = started + self.published * self._interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+    @property
+    def unanswered(self) -> int:
+        """Return the number of messages without a reply."""
+        return len(self._sent)
+
+
+async def async_run_load_test(
+    hass: HomeAssistant,
+    devices: int = 50,
+    rate: float = 50,
+    duration: float = 30,
+    mix: dict | None = None,
+    model: str = "default",
+    adapters: int = 1,
+    connection_slots: int | None = None,
+    settle: float = 5,
+    seed: int | None = None,
+) -> dict:
+    """Run a Govee2Mqtt bridge against an in-process broker and simulated lights.
+
+    Returns sustained message rates, queue depth over time, the coalescing
+    ratio (commands per written command frame) and the end-to-end latency
+    percentiles.
+    """
+    simulator = GoveeSimulator(connection_slots=connection_slots or devices, seed=seed)
+    lights = simulator.add_fleet(devices, model, adapters)
+    broker = InProcessBroker()
+
+    config = hass.data.setdefault(DOMAIN, {})
+    config.update({
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "devices": [{"address": light.address, "model": model, "name": light.address} for light in lights],
+    })
+    for key, default in (
+        ("warmup_budget", DEFAULT_WARMUP_BUDGET),
+        ("warmup_wave_size", DEFAULT_WARMUP_WAVE_SIZE),
+        ("sync", False),
+        ("sync_min_interval", DEFAULT_SYNC_MIN_INTERVAL),
+        ("sync_max_interval", DEFAULT_SYNC_MAX_INTERVAL),
+        ("sync_airtime_budget", DEFAULT_SYNC_AIRTIME_BUDGET),
+        ("stream_timeout", DEFAULT_STREAM_TIMEOUT),
+    ):
+        config.setdefault(key, default)
+
+    bridge = govee2mqtt.Govee2Mqtt(hass)
+    bridge.client_class = simulator.client_class
+    bridge.mqtt_client_class = broker.client_class
+    govee2mqtt.RUNNING = True
+    bridge_task = hass.async_create_task(bridge.async_start())
+
+    generator = LoadGenerator(
+        broker, [light_topic(light.address, model) + "/command" for light in lights], rate, mix or DEFAULT_MIX, seed
+    )
+
+    queue_depth: list[tuple[float, int, int]] = []
+    sampler = None
+
+    async def _sample():
+        started = time.monotonic()
+        while True:
+            dirty = sum(len(client.DirtyProperties) for client in govee2mqtt.CLIENTS.values())
+            queue_depth.append((round(time.monotonic() - started, 1), len(govee2mqtt.MESSAGE_QUEUE), dirty))
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    try:
+        # Messages published before the bridge subscribed would be lost
+        while not broker.has_subscriber(generator.topics[0]):
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+        sampler = hass.async_create_task(_sample())
+        started = time.monotonic()
+        await generator.async_run(duration)
+        published_for = time.monotonic() - started
+        # Let the bridge answer what is still in flight
+        settle_until = time.monotonic() + settle
+        while generator.unanswered and time.monotonic() < settle_until:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+        elapsed = time.monotonic() - started
+    finally:
+        if sampler is not None:
+            sampler.cancel()
+        bridge.stop()
+        await bridge_task
+        govee2mqtt.CLIENTS.clear()
+
+    commands = sum(light.commands for light in lights)
+    queued = [sample[1] for sample in queue_depth]
+    dirty = [sample[2] for sample in queue_depth]
+    answered = len(generator.latencies)
+
+    report = {
+        "devices": devices,
+        "duration_s": round(elapsed, 1),
+        "published": generator.published,
+        "published_per_s": round(generator.published / published_for, 1),
+        "answered_per_s": round(answered / elapsed, 1),
+        "unanswered": generator.unanswered,
+        "statuses": generator.statuses,
+        "command_frames": commands,
+        "coalescing_ratio": round(generator.published / commands, 2) if commands else None,
+        "queue_depth": {
+            "max": max(queued, default=0),
+            "mean": round(sum(queued) / len(queued), 2) if queued else 0,
+            "max_dirty": max(dirty, default=0),
+            "samples": queue_depth,
+        },
+        "latency": _percentiles(generator.latencies),
+        "simulator": simulator.as_dict(),
+    }
+    _LOGGER.info(
+        "Load test: %s msg/s published, %s msg/s answered, coalescing %s, latency %s",
+        report["published_per_s"], report["answered_per_s"], report["coalescing_ratio"], report["latency"],
+    )
+    return report
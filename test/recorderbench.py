@@ -0,0 +1,144 @@
+"""Recorder load of a light entity, with its link diagnostics as state attributes and without.
+
+Run it from a test with the bluetooth integration loaded:
+
+    report = await async_run_recorder_benchmark(hass, commands=60)
+
+Nothing is written to a database. Every state change is sized the way the
+recorder stores it: one states row per change and one state_attributes row
+per distinct set of recorded attributes, encoded as JSON without the
+attributes the entity marks unrecorded.
+"""
+
+from __future__ import annotations
+import asyncio
+from datetime import timedelta
+import logging
+import time
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.entity_platform import EntityPlatform
+from homeassistant.helpers.json import json_bytes
+
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+
+from .simulator import GoveeSimulator
+
+_LOGGER = logging.getLogger(__name__)
+
+COMMAND_SPACING = 0.5 # seconds between commands, past the debounce window
+SETTLE_TIMEOUT = 5.0 # seconds a command gets to be acknowledged
+
+
+class _InlineDiagnosticsLight(HACSGoveeBleLight):
+    """The light with its diagnostics as recorded state attributes, as before they were split off."""
+
+    _unrecorded_attributes = frozenset()
+
+    def set_diagnostic(self, attr, value):
+        """Set the diagnostic value as a state attribute too."""
+        super().set_diagnostic(attr, value)
+        self.set_state_attr(attr, value)
+
+
+async def _async_run(
+    hass: HomeAssistant, light_class: type, address: str, commands: int, spacing: float, seed: int | None
+) -> dict:
+    """Drive one simulated light through a command sequence, return what the recorder would store."""
+    simulator = GoveeSimulator(connection_slots=1, seed=seed)
+    simulator.add_light(address)
+    controller = GoveeBluetoothController(hass, address, client_class=simulator.client_class)
+    entry = ConfigEntry(
+        version=1,
+        minor_version=1,
+        domain=DOMAIN,
+        title=address,
+        data={"address": address, "model": "default", "name": f"benchmark {address}"},
+        source="user",
+    )
+    light = light_class(hass, None, address, None, entry, controller)
+    platform = EntityPlatform(
+        hass=hass,
+        logger=_LOGGER,
+        domain="light",
+        platform_name=DOMAIN,
+        platform=None,
+        scan_interval=timedelta(seconds=30),
+        entity_namespace=None,
+    )
+
+    state_rows = 0
+    attribute_rows: set[bytes] = set()
+
+    @callback
+    def _on_state_changed(event: Event) -> None:
+        nonlocal state_rows
+        if event.data["entity_id"] != light.entity_id:
+            return
+        state_rows += 1
+        if (state := event.data["new_state"]) is None:
+            return
+        unrecorded = state.state_info["unrecorded_attributes"] if state.state_info else frozenset()
+        attribute_rows.add(json_bytes({k: v for k, v in state.attributes.items() if k not in unrecorded}))
+
+    unsub = hass.bus.async_listen(EVENT_STATE_CHANGED, _on_state_changed)
+    started = time.monotonic()
+    try:
+        await platform.async_add_entities([light])
+        for index in range(commands):
+            step = index % 3
+            if step == 0:
+                await light.async_turn_on(brightness=64 + (index * 37) % 192)
+            elif step == 1:
+                await light.async_turn_on(rgb_color=((index * 53) % 256, (index * 97) % 256, (index * 29) % 256))
+            else:
+                await light.async_turn_off()
+            async with asyncio.timeout(SETTLE_TIMEOUT):
+                while light.is_dirty():
+                    await asyncio.sleep(0.01)
+            await asyncio.sleep(spacing)
+        light.flush_state()
+    finally:
+        # Stopping first ends the keep-alive, which would hold the settle up
+        await controller.async_stop()
+        await hass.async_block_till_done()
+        unsub()
+        await platform.async_reset()
+
+    return {
+        "state_rows": state_rows,
+        "attribute_rows": len(attribute_rows),
+        "attribute_bytes": sum(len(shared_attrs) for shared_attrs in attribute_rows),
+        "duration_s": round(time.monotonic() - started, 1),
+    }
+
+
+async def async_run_recorder_benchmark(
+    hass: HomeAssistant, commands: int = 60, spacing: float = COMMAND_SPACING, seed: int | None = None
+) -> dict:
+    """Run the same commands against a light recording its diagnostics and one keeping them off the state.
+
+    Returns the states rows, the distinct state_attributes rows and their
+    bytes of both runs, and the share of each the split saves.
+    """
+    inline = await _async_run(hass, _InlineDiagnosticsLight, "A4:C1:38:00:B0:01", commands, spacing, seed)
+    split = await _async_run(hass, HACSGoveeBleLight, "A4:C1:38:00:B0:02", commands, spacing, seed)
+
+    report = {
+        "commands": commands,
+        "inline": inline,
+        "split": split,
+        "reduction": {
+            key: round(1 - split[key] / inline[key], 3) if inline[key] else None
+            for key in ("state_rows", "attribute_rows", "attribute_bytes")
+        },
+    }
+    _LOGGER.info(
+        "Recorder benchmark: %d to %d state rows, %d to %d attribute bytes",
+        inline["state_rows"], split["state_rows"], inline["attribute_bytes"], split["attribute_bytes"],
+    )
+    return report
@@ -0,0 +1,175 @@
+"""Replay recorded MQTT traffic against fake transports and compare the frames."""
+
+from __future__ import annotations
+import asyncio
+from collections.abc import Callable
+import difflib
+import time
+
+from custom_components.goveeble2mqtt.protocol import FRAME_QUERY, build_frame, frame_key
+from custom_components.goveeble2mqtt.recorder import KIND_FRAME, KIND_MQTT, TrafficRecorder, device_key
+
+QUERY_PREFIX = "%02x" % FRAME_QUERY
+
+
+class FakeMessage:
+    """The parts of a paho MQTTMessage the bridge reads."""
+
+    def __init__(self, topic: str, payload: bytes) -> None:
+        """Initialize the message."""
+        self.topic = topic
+        self.payload = payload
+        self.timestamp = time.monotonic()
+        self.properties = None
+
+
+class FakeMqttClient:
+    """Paho client stand-in that keeps what the bridge publishes."""
+
+    def __init__(self) -> None:
+        """Initialize the client."""
+        self.published: list[tuple[str, str]] = []
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        """Keep a published message."""
+        self.published.append((topic, payload))
+
+    def subscribe(self, topic, qos=0, options=None, properties=None):
+        """Accept subscriptions."""
+
+
+class FakeBleakClient:
+    """BleakClient stand-in that connects at once and acknowledges every write.
+
+    The acknowledgement echoes the head and command of the written frame
+    after `ack_delay` seconds, which is all the ack tracking matches on.
+    """
+
+    ack_delay = 0.02
+
+    def __init__(self, address_or_ble_device, *args, **kwargs) -> None:
+        """Initialize the client."""
+        self.address = getattr(address_or_ble_device, "address", address_or_ble_device)
+        self.is_connected = False
+        self._notify: Callable | None = None
+
+    async def connect(self, **kwargs) -> bool:
+        """Connect."""
+        self.is_connected = True
+        return True
+
+    async def disconnect(self) -> bool:
+        """Disconnect."""
+        self.is_connected = False
+        return True
+
+    async def start_notify(self, char, callback, **kwargs) -> None:
+        """Register the notification callback."""
+        self._notify = callback
+
+    async def write_gatt_char(self, char, data, response=None) -> None:
+        """Acknowledge a written frame."""
+        if not self.is_connected:
+            raise ConnectionError("Not connected")
+        if self._notify is not None:
+            head, command = frame_key(data)
+            reply = build_frame(command, [], head)
+            asyncio.get_running_loop().call_later(self.ack_delay, self._notify, None, reply)
+
+
+class TrafficReplayer:
+    """Drive the MQTT commands of a recording at 1x or accelerated speed."""
+
+    def __init__(self, records: list[list], speed: float = 1.0) -> None:
+        """Initialize the replayer."""
+        self._commands = [record for record in records if record[1] == KIND_MQTT]
+        self._speed = max(float(speed), 0.001)
+
+    async def async_replay(self, deliver: Callable[[str, bytes], None]) -> None:
+        """Hand every command to deliver(topic, payload) at its scaled time."""
+        started = time.monotonic()
+        for offset, _kind, topic, payload in self._commands:
+            delay = offset / 1000 / self._speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            deliver(topic, payload.encode())
+
+
+async def async_replay_bridge(bridge, records: list[list], speed: float = 1.0, settle: float = 2.0) -> list[list]:
+    """Replay a recording through a Govee2Mqtt bridge and return the new recording.
+
+    The bridge gets a fake MQTT client and creates its devices with
+    FakeBleakClient unless a different client class was set on it.
+    """
+    mqttclient = FakeMqttClient()
+    recorder = TrafficRecorder()
+    bridge.recorder = recorder
+    if bridge.client_class is None:
+        bridge.client_class = FakeBleakClient
+
+    def _deliver(topic: str, payload: bytes) -> None:
+        bridge._on_message(mqttclient, None, FakeMessage(topic, payload))
+        bridge._process_queue(mqttclient)
+
+    await TrafficReplayer(records, speed).async_replay(_deliver)
+    # Give the devices time to write what the last commands asked for
+    await asyncio.sleep(settle)
+    return recorder.records
+
+
+def latency_profile(records: list[list]) -> dict:
+    """Return percentiles of the time from a command to the next frame of its light."""
+    waiting: dict[str, list[float]] = {}
+    latencies = []
+    for offset, kind, target, _data in records:
+        if kind == KIND_MQTT:
+            waiting.setdefault(device_key(target), []).append(offset)
+        elif kind == KIND_FRAME:
+            commands = waiting.pop(device_key(target), [])
+            latencies.extend(offset - command for command in commands)
+
+    if not latencies:
+        return {"count": 0}
+
+    latencies.sort()
+
+    def _percentile(p: float) -> float:
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 1)
+
+    return {
+        "count": len(latencies),
+        "p50_ms": _percentile(0.5),
+        "p95_ms": _percentile(0.95),
+        "max_ms": round(latencies[-1], 1),
+    }
+
+
+def diff_traffic(recorded: list[list], replayed: list[list]) -> dict:
+    """Compare the frames each light received and the latency profiles of two recordings."""
+    def _frames(records):
+        frames: dict[str, list[str]] = {}
+        for _offset, kind, target, data in records:
+            # Status queries depend on idle time, not on the commands
+            if kind == KIND_FRAME and not data.startswith(QUERY_PREFIX):
+                frames.setdefault(device_key(target), []).append(data)
+        return frames
+
+    before = _frames(recorded)
+    after = _frames(replayed)
+    devices = {}
+    for device in sorted(set(before) | set(after)):
+        old = before.get(device, [])
+        new = after.get(device, [])
+        missing = extra = 0
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag in ("replace", "delete"):
+                missing += i2 - i1
+            if tag in ("replace", "insert"):
+                extra += j2 - j1
+        devices[device] = {"recorded": len(old), "replayed": len(new), "missing": missing, "extra": extra}
+
+    return {
+        "identical": all(d["missing"] == 0 and d["extra"] == 0 for d in devices.values()),
+        "devices": devices,
+        "latency": {"recorded": latency_profile(recorded), "replayed": latency_profile(replayed)},
+    }
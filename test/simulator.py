@@ -0,0 +1,249 @@
+"""In-process simulator of Govee BLE lights for load tests."""
+
+from __future__ import annotations
+import asyncio
+from collections.abc import Callable
+import random
+
+from bleak.exc import BleakError
+
+from custom_components.goveeble2mqtt.models import LedCommand, LedMode
+from custom_components.goveeble2mqtt.protocol import FRAME_COMMAND, FRAME_QUERY, MODE_1501_ALL_SEGMENTS, build_frame, is_valid_frame
+from custom_components.goveeble2mqtt.registry import REGISTRY
+from custom_components.goveeble2mqtt.warmup import DEFAULT_ADAPTER
+
+
+class SimulatedLight:
+    """State machine of one light speaking the Govee frame protocol."""
+
+    def __init__(self, address: str, model: str = "default", adapter: str = DEFAULT_ADAPTER) -> None:
+        """Initialize the light switched off and white."""
+        self.address = address.upper()
+        self.adapter = adapter
+        self.capabilities = REGISTRY.get(model)
+        self.power = False
+        self.brightness = 0
+        self.rgb = (255, 255, 255)
+        self.kelvin = 0
+        self.segments: dict[int, tuple[int, int, int]] = {}
+        self.received = 0
+        self.commands = 0
+        self.rejected = 0
+
+    def handle(self, frame: bytes) -> bytes | None:
+        """Apply a command or answer a query, returning the reply frame.
+
+        Frames with a bad length or checksum are dropped without a reply,
+        like the real lights do.
+        """
+        frame = bytes(frame)
+        if not is_valid_frame(frame):
+            self.rejected += 1
+            return None
+        self.received += 1
+
+        head, cmd = frame[0], frame[1]
+        if head == FRAME_QUERY:
+            return build_frame(cmd, self._status(cmd), FRAME_QUERY)
+        if head != FRAME_COMMAND:
+            self.rejected += 1
+            return None
+        self.commands += 1
+
+        if cmd == LedCommand.POWER:
+            self.power = frame[2] == 0x01
+        elif cmd == LedCommand.BRIGHTNESS:
+            self.brightness = min(frame[2], self.capabilities.brightness_max)
+        elif cmd == LedCommand.COLOR:
+            self._apply_color(frame)
+        return build_frame(cmd, [], head)
+
+    def _apply_color(self, frame: bytes) -> None:
+        if self.capabilities.led_mode == LedMode.MODE_1501:
+            rgb = tuple(frame[4:7])
+            self.kelvin = frame[7] << 8 | frame[8]
+            mask = list(frame[12:14])
+            if mask != MODE_1501_ALL_SEGMENTS and self.capabilities.segments:
+                bits = mask[0] | mask[1] << 8
+                for index in range(self.capabilities.segments):
+                    if bits & (1 << index):
+                        self.segments[index] = rgb
+                return
+        else:
+            rgb = tuple(frame[3:6])
+            self.kelvin = frame[6] << 8 | frame[7]
+
+        self.rgb = rgb
+        self.segments = dict.fromkeys(range(self.capabilities.segments), rgb)
+
+    def _status(self, cmd: int) -> list[int]:
+        if cmd == LedCommand.POWER:
+            return [0x01 if self.power else 0x00]
+        if cmd == LedCommand.BRIGHTNESS:
+            return [self.brightness]
+        if cmd == LedCommand.COLOR:
+            if self.capabilities.led_mode == LedMode.MODE_1501:
+                return [self.capabilities.led_mode, 0x01, *self.rgb]
+            return [self.capabilities.led_mode, *self.rgb]
+        return []
+
+
+class GoveeSimulator:
+    """A fleet of simulated lights behind simulated adapters.
+
+    Every adapter only holds `connection_slots` connections at a time.
+    Connects take a random time within `connect_jitter`, a written frame is
+    lost with probability `packet_loss` and a write drops the connection
+    with probability `disconnect_rate`. Replies arrive `ack_delay` seconds
+    after the write. `client_class` plugs in wherever BleakClient is used.
+    """
+
+    def __init__(
+        self,
+        connection_slots: int = 3,
+        connect_jitter: tuple[float, float] = (0.05, 0.5),
+        packet_loss: float = 0.0,
+        disconnect_rate: float = 0.0,
+        ack_delay: float = 0.03,
+        seed: int | None = None,
+    ) -> None:
+        """Initialize the simulator."""
+        self.connection_slots = connection_slots
+        self.connect_jitter = connect_jitter
+        self.packet_loss = packet_loss
+        self.disconnect_rate = disconnect_rate
+        self.ack_delay = ack_delay
+        self.random = random.Random(seed)
+        self.lights: dict[str, SimulatedLight] = {}
+        self.connected: dict[str, set[str]] = {}
+        self.stats = {"connects": 0, "no_slot": 0, "frames": 0, "lost": 0, "disconnects": 0}
+        self._clients: dict[str, SimulatedBleakClient] = {}
+
+        simulator = self
+
+        class _BoundClient(SimulatedBleakClient):
+            _simulator = simulator
+
+        self.client_class = _BoundClient
+
+    def add_light(self, address: str, model: str = "default", adapter: str = DEFAULT_ADAPTER) -> SimulatedLight:
+        """Add a light to the fleet."""
+        light = SimulatedLight(address, model, adapter)
+        self.lights[light.address] = light
+        return light
+
+    def drop(self, address: str) -> bool:
+        """Drop the connection to a light as if it went out of range, return whether it was connected."""
+        client = self._clients.get(address.upper())
+        if client is None or not client.is_connected:
+            return False
+        self.stats["disconnects"] += 1
+        client._drop()
+        return True
+
+    def add_fleet(self, count: int, model: str = "default", adapters: int = 1) -> list[SimulatedLight]:
+        """Add count lights spread round robin over the given number of adapters."""
+        return [
+            self.add_light(
+                f"A4:C1:38:{index >> 16 & 0xFF:02X}:{index >> 8 & 0xFF:02X}:{index & 0xFF:02X}",
+                model,
+                f"hci{index % adapters}",
+            )
+            for index in range(count)
+        ]
+
+    def as_dict(self) -> dict:
+        """Return the simulator statistics."""
+        return {
+            **self.stats,
+            "connected": {adapter: len(addresses) for adapter, addresses in self.connected.items()},
+        }
+
+
+class SimulatedBleakClient:
+    """The parts of BleakClient the integration uses, backed by a GoveeSimulator."""
+
+    _simulator: GoveeSimulator
+
+    def __init__(self, address_or_ble_device, disconnected_callback: Callable | None = None, **kwargs) -> None:
+        """Initialize the client."""
+        self.address = str(getattr(address_or_ble_device, "address", address_or_ble_device)).upper()
+        self._disconnected_callback = disconnected_callback
+        self._notify: Callable | None = None
+        self._connected = False
+
+    @property
+    def is_connected(self) -> bool:
+        """Return true while connected."""
+        return self._connected
+
+    def _light(self) -> SimulatedLight:
+        if (light := self._simulator.lights.get(self.address)) is None:
+            raise BleakError("Device with address " + self.address + " was not found")
+        return light
+
+    async def connect(self, **kwargs) -> bool:
+        """Connect after a random delay if the light's adapter has a free slot."""
+        simulator = self._simulator
+        light = self._light()
+        await asyncio.sleep(simulator.random.uniform(*simulator.connect_jitter))
+
+        slots = simulator.connected.setdefault(light.adapter, set())
+        if len(slots) >= simulator.connection_slots and self.address not in slots:
+            simulator.stats["no_slot"] += 1
+            raise BleakError("No free connection slot on " + light.adapter)
+
+        slots.add(self.address)
+        self._connected = True
+        simulator._clients[self.address] = self
+        simulator.stats["connects"] += 1
+        return True
+
+    async def disconnect(self) -> bool:
+        """Disconnect and free the slot."""
+        self._release()
+        return True
+
+    def _release(self) -> None:
+        if not self._connected:
+            return
+        self._connected = False
+        light = self._simulator.lights.get(self.address)
+        if light is not None:
+            self._simulator.connected.get(light.adapter, set()).discard(self.address)
+
+    def _drop(self) -> None:
+        """Lose the connection on the light's side."""
+        self._release()
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+    async def start_notify(self, char, callback: Callable, **kwargs) -> None:
+        """Register the notification callback."""
+        if not self._connected:
+            raise BleakError("Not connected")
+        self._notify = callback
+
+    async def stop_notify(self, char) -> None:
+        """Unregister the notification callback."""
+        self._notify = None
+
+    async def write_gatt_char(self, char, data, response: bool | None = None) -> None:
+        """Hand a frame to the light, subject to loss and disconnects."""
+        simulator = self._simulator
+        if not self._connected:
+            raise BleakError("Not connected")
+
+        if simulator.random.random() < simulator.disconnect_rate:
+            simulator.stats["disconnects"] += 1
+            self._drop()
+            raise BleakError("Disconnected")
+
+        simulator.stats["frames"] += 1
+        if simulator.random.random() < simulator.packet_loss:
+            simulator.stats["lost"] += 1
+            return
+
+        reply = self._light().handle(data)
+        if reply is not None and self._notify is not None:
+            asyncio.get_running_loop().call_later(simulator.ack_delay, self._notify, char, bytearray(reply))
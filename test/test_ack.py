@@ -0,0 +1,107 @@
+"""Tests for matching acknowledgements to frames, across disconnects."""
+import asyncio
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.goveeble2mqtt.ack import AckTracker
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_ble_light import Client
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+from custom_components.goveeble2mqtt.models import LedCommand
+from custom_components.goveeble2mqtt.protocol import build_frame
+from custom_components.goveeble2mqtt.transport import get_transport
+
+from .replay import FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:02"
+# Replies slow enough to disconnect while a frame waits for one
+ACK_DELAY = 0.5
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_reset_answers_waiters_with_no_reply():
+    """Dropping the in-flight frames ends their waits without a reply."""
+    tracker = AckTracker(timeout=5)
+    future = tracker.expect(build_frame(LedCommand.POWER, [0x01]))
+    waiter = asyncio.create_task(tracker.async_wait(future))
+    await asyncio.sleep(0)
+
+    tracker.reset()
+
+    assert await waiter is None
+    assert tracker.in_flight == 0
+    assert tracker.timeouts == 0
+
+
+async def test_cancelling_a_waiter_still_cancels_it():
+    """Only a dropped frame counts as no reply, a cancelled waiter stays cancelled."""
+    tracker = AckTracker(timeout=5)
+    future = tracker.expect(build_frame(LedCommand.POWER, [0x01]))
+    waiter = asyncio.create_task(tracker.async_wait(future))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_bridge_survives_disconnect_during_ack_wait(hass, enable_bluetooth):
+    """The MQTT client keeps serving its light after the link drops under a waiting frame."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), ack_delay=ACK_DELAY, seed=1)
+    simulated = simulator.add_light(ADDRESS)
+    client = Client(
+        hass, ADDRESS, "default", FakeMqttClient(), light_topic(ADDRESS, "default") + "/state",
+        client_class=simulator.client_class,
+    )
+
+    try:
+        client.SetPower(1)
+        link = get_transport(hass).get(ADDRESS)
+        await _wait_for(lambda: link.tracker.in_flight)
+        assert simulator.drop(ADDRESS)
+        await asyncio.sleep(0.05)
+
+        assert not client._task.done()
+
+        # The next command reconnects and goes through
+        client.SetBrightness(0.5)
+        await _wait_for(lambda: simulated.brightness == 50 and not client.DirtyProperties)
+        assert link.connects == 2
+    finally:
+        client.Close()
+        await hass.async_block_till_done()
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_controller_survives_disconnect_during_ack_wait(hass, enable_bluetooth):
+    """The controller's worker treats a frame dropped by a disconnect as unacknowledged."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), ack_delay=ACK_DELAY, seed=1)
+    simulated = simulator.add_light(ADDRESS)
+    controller = GoveeBluetoothController(hass, ADDRESS, client_class=simulator.client_class)
+    entry = MockConfigEntry(domain=DOMAIN, data={"address": ADDRESS, "model": "default", "name": "test"})
+    entity = HACSGoveeBleLight(hass, None, ADDRESS, None, entry, controller)
+
+    try:
+        await entity.async_turn_on()
+        await _wait_for(lambda: (link := get_transport(hass).get(ADDRESS)) is not None and link.tracker.in_flight)
+        assert simulator.drop(ADDRESS)
+
+        # The unacknowledged power frame is resent over a new connection
+        await _wait_for(lambda: not entity.is_dirty())
+        assert simulated.power
+    finally:
+        await controller.async_stop()
+        controller.unregister_light(entity)
+        await hass.async_block_till_done()
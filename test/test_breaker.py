@@ -0,0 +1,140 @@
+"""Tests for the per-light circuit breaker."""
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.goveeble2mqtt.breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker
+
+
+class _Clock:
+    """Monotonic clock of the breaker module, moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Let the backoffs elapse without sleeping through them."""
+    clock = _Clock()
+    with patch("custom_components.goveeble2mqtt.breaker.time", clock):
+        yield clock
+
+
+def _tripped(failures=3, jitter=0):
+    breaker = CircuitBreaker(jitter=jitter)
+    for _ in range(failures):
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_three_consecutive_failures(clock):
+    """Two failures still allow attempts, the third rejects them for the backoff."""
+    breaker = _tripped(failures=2)
+
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+    assert breaker.seconds_until_retry() == 0
+
+    breaker.record_failure()
+
+    assert breaker.is_open
+    assert not breaker.allow_request()
+    assert breaker.seconds_until_retry() == 5
+    assert breaker.as_dict() == {"state": STATE_OPEN, "failures": 3, "retry_in": 5.0}
+
+
+def test_success_resets_the_failure_count(clock):
+    """Failures only count while they are consecutive."""
+    breaker = _tripped(failures=2)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == STATE_CLOSED
+    assert breaker.failures == 2
+
+
+def test_elapsed_backoff_lets_a_single_probe_through(clock):
+    """Once open long enough one attempt is allowed, a failed probe reopens at once."""
+    breaker = _tripped()
+    clock.now += 4.9
+    assert not breaker.allow_request()
+
+    clock.now += 0.1
+
+    assert not breaker.is_open
+    assert breaker.allow_request()
+    assert breaker.is_probe
+    assert not breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.is_open
+    assert breaker.seconds_until_retry() == 10
+
+
+def test_successful_probe_closes_the_breaker(clock):
+    """The light answered, attempts are no longer limited and the backoff starts over."""
+    breaker = _tripped()
+    clock.now += 5
+    assert breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+    assert (breaker.failures, breaker.trips) == (0, 0)
+
+
+def test_advertisement_moves_an_open_breaker_to_half_open(clock):
+    """A light heard advertising is probed without waiting for the backoff."""
+    breaker = _tripped()
+
+    assert breaker.on_advertisement()
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.is_probe
+    assert breaker.seconds_until_retry() == 0
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    # Only an open breaker schedules a probe
+    assert not breaker.on_advertisement()
+    assert not CircuitBreaker().on_advertisement()
+
+
+def test_backoff_doubles_up_to_the_cap(clock):
+    """Every failed probe doubles the backoff until it reaches max_backoff."""
+    breaker = _tripped()
+    backoffs = [breaker.seconds_until_retry()]
+    for _ in range(8):
+        clock.now = breaker.retry_at
+        assert breaker.allow_request()
+        breaker.record_failure()
+        backoffs.append(breaker.seconds_until_retry())
+
+    assert backoffs == [5, 10, 20, 40, 80, 160, 300, 300, 300]
+
+
+@pytest.mark.parametrize(("spread", "expected"), [(0.7, 210), (1.3, 390)])
+def test_jitter_spreads_the_capped_backoff(clock, spread, expected):
+    """Lights that all reached the cap do not retry at the same instant."""
+    breaker = CircuitBreaker(max_backoff=300, jitter=0.3)
+    breaker.trips = 10
+
+    with patch("custom_components.goveeble2mqtt.breaker.random.uniform", return_value=spread) as uniform:
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_failure()
+
+    uniform.assert_called_once_with(pytest.approx(0.7), pytest.approx(1.3))
+    assert breaker.seconds_until_retry() == pytest.approx(expected)
+
+
+def test_real_jitter_stays_within_its_bounds(clock):
+    """Unpatched, the backoff lands within the jitter around the base backoff."""
+    for _ in range(50):
+        assert 3.5 <= _tripped(jitter=0.3).seconds_until_retry() <= 6.5
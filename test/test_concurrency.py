@@ -0,0 +1,96 @@
+"""Tests for the adaptive connection concurrency of the Bluetooth adapters."""
+from datetime import timedelta
+
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.goveeble2mqtt.concurrency import (
+    INITIAL_LIMIT,
+    MAX_LIMIT,
+    SAVE_DELAY,
+    SLOW_CONNECT,
+    STORAGE_KEY,
+    AdapterLimits,
+)
+
+
+def _connect(limits, adapter, count, connected=True, seconds=1.0):
+    for _ in range(count):
+        limits.record_connect(adapter, connected, seconds)
+
+
+async def test_fast_connects_raise_the_limit_by_one(hass, hass_storage):
+    """An adapter earns one more slot once it connected as many lights in a row as it is allowed."""
+    limits = AdapterLimits(hass)
+    assert limits.limit("hci0") == INITIAL_LIMIT
+
+    _connect(limits, "hci0", 1)
+    assert limits.limit("hci0") == 2
+    _connect(limits, "hci0", 1)
+    assert limits.limit("hci0") == 3
+    _connect(limits, "hci0", 3)
+    assert limits.limit("hci0") == 4
+    # Other adapters learn on their own
+    assert limits.limit("proxy") == INITIAL_LIMIT
+
+
+async def test_failed_or_slow_connect_halves_the_limit(hass, hass_storage):
+    """Congestion cuts the limit down to one connection at a time, never below."""
+    limits = AdapterLimits(hass)
+    _connect(limits, "hci0", 2 + 3 + 4)
+    assert limits.limit("hci0") == 5
+
+    limits.record_connect("hci0", False, 0.5)
+    assert limits.limit("hci0") == 2
+    limits.record_connect("hci0", True, SLOW_CONNECT + 0.1)
+    assert limits.limit("hci0") == 1
+    limits.record_connect("hci0", False, 0.5)
+    assert limits.limit("hci0") == 1
+
+    assert limits.as_dict() == {
+        "hci0": {"limit": 1, "connects": 12, "failed": 2, "slow": 1, "last_connect_s": 0.5},
+    }
+
+
+async def test_congestion_restarts_the_streak(hass, hass_storage):
+    """Fast connects before a failure do not count towards the next raise."""
+    limits = AdapterLimits(hass)
+    _connect(limits, "hci0", 2 + 3)
+    _connect(limits, "hci0", 3)
+    limits.record_connect("hci0", False, 1.0)
+    assert limits.limit("hci0") == 2
+
+    _connect(limits, "hci0", 1)
+    assert limits.limit("hci0") == 2
+    _connect(limits, "hci0", 1)
+    assert limits.limit("hci0") == 3
+
+
+async def test_limit_stops_at_the_maximum(hass, hass_storage):
+    """A strong proxy climbs no further than MAX_LIMIT."""
+    limits = AdapterLimits(hass)
+    _connect(limits, "proxy", 100)
+
+    assert limits.limit("proxy") == MAX_LIMIT
+
+
+async def test_learned_limits_survive_a_restart(hass, hass_storage):
+    """Changed limits are saved after a delay and restored, clamped to the allowed range."""
+    limits = AdapterLimits(hass)
+    _connect(limits, "hci0", 2)
+    limits.record_connect("proxy", False, 1.0)
+    await hass.async_block_till_done()
+    assert STORAGE_KEY not in hass_storage
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=SAVE_DELAY))
+    await hass.async_block_till_done()
+    assert hass_storage[STORAGE_KEY]["data"] == {"limits": {"hci0": 3, "proxy": 1}}
+
+    restored = AdapterLimits(hass)
+    await restored.async_load()
+    assert (restored.limit("hci0"), restored.limit("proxy")) == (3, 1)
+
+    hass_storage[STORAGE_KEY]["data"] = {"limits": {"hci0": 50, "proxy": 0}}
+    clamped = AdapterLimits(hass)
+    await clamped.async_load()
+    assert (clamped.limit("hci0"), clamped.limit("proxy")) == (MAX_LIMIT, 1)
@@ -0,0 +1,143 @@
+"""Tests for the debounce of rapidly changing light attributes."""
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
+
+from homeassistant.util import dt as dt_util
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry, async_fire_time_changed_exact
+
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.debounce import AttributeDebouncer
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:05"
+WINDOW = 0.2
+TIMER_SLACK = 0.01
+
+
+class _Clock:
+    """Monotonic clock of the debounce module, advanced together with the loop timers."""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._started = dt_util.utcnow()
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        # The loop timer was scheduled a moment after the clock started
+        async_fire_time_changed_exact(self._hass, self._started + timedelta(seconds=self.now - 1000.0 + TIMER_SLACK))
+
+
+@pytest.fixture
+def clock(hass):
+    """Drive the debounce windows by hand instead of sleeping through them."""
+    clock = _Clock(hass)
+    with patch("custom_components.goveeble2mqtt.debounce.time", clock):
+        yield clock
+
+
+def _recorder(clock):
+    applied = []
+    return applied, lambda value, trailing: applied.append((value, trailing, clock.monotonic()))
+
+
+async def test_leading_value_is_applied_at_once(hass, clock):
+    """The first value after a quiet window is not held back."""
+    applied, apply = _recorder(clock)
+    debouncer = AttributeDebouncer(hass, apply, WINDOW)
+
+    debouncer.async_offer(10)
+
+    assert applied == [(10, False, clock.now)]
+    assert not debouncer.pending
+
+
+async def test_trailing_value_is_applied_within_one_window(hass, clock):
+    """The last value of a burst lands when the window of the leading one ends."""
+    applied, apply = _recorder(clock)
+    debouncer = AttributeDebouncer(hass, apply, WINDOW)
+    started = clock.now
+
+    for value in range(10, 60, 10):
+        debouncer.async_offer(value)
+    clock.advance(WINDOW / 2)
+    assert debouncer.pending
+
+    clock.advance(WINDOW / 2)
+
+    assert applied == [(10, False, started), (50, True, started + WINDOW)]
+    assert not debouncer.pending
+
+
+async def test_saved_counts_replaced_values(hass, clock):
+    """Only values replaced before being applied are saved writes, a pending or dropped one is not."""
+    applied, apply = _recorder(clock)
+    debouncer = AttributeDebouncer(hass, apply, WINDOW)
+
+    for value in range(5):
+        debouncer.async_offer(value)
+    assert debouncer.saved == 3
+
+    clock.advance(WINDOW)
+
+    assert debouncer.as_dict() == {"window": WINDOW, "offered": 5, "applied": 2, "saved": 3}
+
+    # The trailing apply opened the next window, 5 is replaced by 6
+    debouncer.async_offer(5)
+    debouncer.async_offer(6)
+    assert debouncer.saved == 4
+
+    debouncer.async_cancel()
+
+    assert debouncer.as_dict() == {"window": WINDOW, "offered": 6, "applied": 2, "saved": 4}
+    clock.advance(WINDOW)
+    assert [value for value, _, _ in applied] == [0, 4]
+
+
+async def test_zero_window_disables_the_debounce(hass, clock):
+    """Without a window every value is applied as it is offered."""
+    applied, apply = _recorder(clock)
+    debouncer = AttributeDebouncer(hass, apply, 0)
+
+    for value in range(5):
+        debouncer.async_offer(value)
+
+    assert [(value, trailing) for value, trailing, _ in applied] == [(value, False) for value in range(5)]
+    assert debouncer.saved == 0
+    assert not debouncer.pending
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_turn_off_drops_a_held_back_value(hass, enable_bluetooth):
+    """A brightness still in its window is not sent after the light was turned off."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    simulator.add_light(ADDRESS)
+    controller = GoveeBluetoothController(hass, ADDRESS, client_class=simulator.client_class)
+    entry = MockConfigEntry(domain=DOMAIN, data={"address": ADDRESS, "model": "default", "name": "test"})
+    entity = HACSGoveeBleLight(hass, None, ADDRESS, None, entry, controller)
+    entity.hass = hass
+    entity.entity_id = "light.test"
+    hass.data.setdefault(DOMAIN, {})["debounce_window"] = WINDOW
+    await entity.async_added_to_hass()
+
+    try:
+        await entity.async_turn_on(brightness=64)
+        await entity.async_turn_on(brightness=192)
+        await entity.async_turn_off()
+        await asyncio.sleep(WINDOW * 2)
+
+        assert not entity._debouncers["brightness"].pending
+        assert entity._debouncers["brightness"].applied == 1
+    finally:
+        await entity.async_will_remove_from_hass()
+        await controller.async_stop()
+        await hass.async_block_till_done()
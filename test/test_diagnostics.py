@@ -0,0 +1,119 @@
+"""Tests for keeping high-churn link diagnostics off the recorded light state."""
+import asyncio
+import json
+
+from homeassistant.const import Platform
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.discovery import async_load_platform
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+from custom_components.goveeble2mqtt.sensor import GoveeLinkTimestampSensor
+
+from .recorderbench import async_run_recorder_benchmark
+from .replay import FakeMessage, FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:40"
+# Values that change with every connection attempt or frame
+HIGH_CHURN = {
+    "last_connection_attempt",
+    "last_packet_attempt",
+    "power_data",
+    "rgb_color_data",
+    "dirty_state",
+    "dirty_brightness",
+    "dirty_rgb_color",
+}
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_link_diagnostics_are_not_state_attributes(hass, enable_bluetooth):
+    """The link details are kept as diagnostics, the state only has attributes the recorder skips."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    simulated = simulator.add_light(ADDRESS)
+    controller = GoveeBluetoothController(hass, ADDRESS, client_class=simulator.client_class)
+    entry = MockConfigEntry(domain=DOMAIN, data={"address": ADDRESS, "model": "default", "name": "test"})
+    light = HACSGoveeBleLight(hass, None, ADDRESS, None, entry, controller)
+
+    try:
+        await light.async_turn_on(rgb_color=(255, 0, 0))
+        await _wait_for(lambda: simulated.power and not light.is_dirty())
+
+        assert set(light.diagnostics) >= HIGH_CHURN
+        assert not HIGH_CHURN & set(light.extra_state_attributes)
+        # Only changes on a reconnect
+        assert set(light.extra_state_attributes) - HACSGoveeBleLight._unrecorded_attributes == {"reconnect_attempts"}
+        assert controller.light_diagnostics()[ADDRESS]["last_packet_attempt"] is not None
+    finally:
+        await controller.async_stop()
+        controller.unregister_light(light)
+        await hass.async_block_till_done()
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_recorder_benchmark_shows_fewer_rows_without_inline_diagnostics(hass, enable_bluetooth):
+    """The same commands write fewer and smaller recorded states than with the diagnostics inline."""
+    report = await async_run_recorder_benchmark(hass, commands=3, spacing=0.05, seed=1)
+
+    assert report["split"]["state_rows"] < report["inline"]["state_rows"]
+    assert report["split"]["attribute_bytes"] < report["inline"]["attribute_bytes"]
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_bridge_lights_get_link_timestamp_sensors(hass, enable_bluetooth, enable_custom_integrations):
+    """The bridge's clients keep their link times for the sensors of the configured lights."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    simulated = simulator.add_light(ADDRESS)
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "devices": [{"address": ADDRESS, "name": "Desk"}],
+        "warmup_budget": 1,
+        "warmup_wave_size": 1,
+        "stream_timeout": 5,
+    }
+    bridge = hass.data[DOMAIN]["bridge"] = govee2mqtt.Govee2Mqtt(hass)
+    bridge.client_class = simulator.client_class
+    topic = light_topic(ADDRESS, "default") + "/command"
+
+    try:
+        await async_load_platform(hass, Platform.SENSOR, DOMAIN, {}, {})
+        await hass.async_block_till_done()
+        registry = er.async_get(hass)
+        # Disabled by default, as on the config entry lights
+        assert registry.async_get("sensor.desk_last_connection_attempt").disabled
+        assert registry.async_get("sensor.desk_last_packet_attempt").disabled
+
+        sensor = GoveeLinkTimestampSensor(bridge, ADDRESS, "last_packet_attempt", "Last packet attempt", "Desk")
+        assert sensor.name == "Desk Last packet attempt"
+        assert not sensor.available
+
+        govee2mqtt.MESSAGE_QUEUE.append(FakeMessage(topic, json.dumps({"state": "ON"}).encode()))
+        bridge._process_queue(FakeMqttClient())
+        await _wait_for(lambda: simulated.power and govee2mqtt.CLIENTS[ADDRESS].LastPacketAttempt is not None)
+
+        diagnostics = bridge.light_diagnostics()[ADDRESS]
+        assert diagnostics["last_connection_attempt"] <= diagnostics["last_packet_attempt"]
+        assert sensor.available
+        assert sensor.native_value == diagnostics["last_packet_attempt"]
+    finally:
+        for client in govee2mqtt.CLIENTS.values():
+            client.Close()
+        govee2mqtt.CLIENTS.clear()
+        govee2mqtt.MESSAGE_QUEUE.clear()
+        await hass.async_block_till_done()
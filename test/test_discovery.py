@@ -0,0 +1,118 @@
+"""Tests for publishing the Home Assistant MQTT discovery configs of the configured lights."""
+import json
+
+import pytest
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import (
+    BIRTH_TOPIC,
+    STORAGE_KEY,
+    DiscoveryPublisher,
+    discovery_config,
+    light_topic,
+)
+
+from .replay import FakeMessage, FakeMqttClient
+
+DESK = {"address": "a4:c1:38:00:00:80", "model": "H6076", "name": "Desk", "area": "Office"}
+SHELF = {"address": "A4:C1:38:00:00:81"}
+
+
+def _topics(mqttclient):
+    return [topic for topic, _ in mqttclient.published]
+
+
+def test_discovery_config_of_a_light():
+    """Commands and state use the light's topic, the color temperature range comes from its model."""
+    topic, config = discovery_config(DESK)
+    base = light_topic("A4:C1:38:00:00:80", "H6076")
+
+    assert topic == "homeassistant/light/goveeble2mqtt_a4c138000080/config"
+    assert base == "goveeble2mqtt/light/A4C138000080_H6076"
+    assert config["command_topic"] == base + "/command"
+    assert config["state_topic"] == base + "/state"
+    assert (config["min_mireds"], config["max_mireds"]) == (111, 500)
+    assert config["device"]["name"] == "Desk"
+    assert config["device"]["suggested_area"] == "Office"
+    assert config["device"]["connections"] == [["bluetooth", "A4:C1:38:00:00:80"]]
+
+
+def test_light_without_name_or_area_uses_its_address():
+    """Unset options are left out, the default model is used."""
+    _, config = discovery_config(SHELF)
+
+    assert config["device"]["name"] == "A4:C1:38:00:00:81"
+    assert config["device"]["model"] == "default"
+    assert "suggested_area" not in config["device"]
+
+
+async def test_restart_only_publishes_changed_configs(hass, hass_storage):
+    """The digests kept in the store let a restart skip the configs the broker already has."""
+    first = FakeMqttClient()
+    assert await DiscoveryPublisher(hass, [DESK, SHELF]).async_publish(first) == 2
+    assert STORAGE_KEY in hass_storage
+
+    unchanged = FakeMqttClient()
+    assert await DiscoveryPublisher(hass, [DESK, SHELF]).async_publish(unchanged) == 0
+    assert not unchanged.published
+
+    renamed = FakeMqttClient()
+    publisher = DiscoveryPublisher(hass, [{**DESK, "name": "Standing desk"}, SHELF])
+    assert await publisher.async_publish(renamed) == 1
+    [(topic, payload)] = renamed.published
+    assert topic == discovery_config(DESK)[0]
+    assert json.loads(payload)["device"]["name"] == "Standing desk"
+
+    # Nothing changed since, the second call of the same publisher skips everything
+    assert await publisher.async_publish(renamed) == 0
+
+
+async def test_removed_light_config_is_cleared(hass, hass_storage):
+    """A light dropped from the configuration gets an empty retained config, once."""
+    await DiscoveryPublisher(hass, [DESK, SHELF]).async_publish(FakeMqttClient())
+
+    mqttclient = FakeMqttClient()
+    publisher = DiscoveryPublisher(hass, [DESK])
+    assert await publisher.async_publish(mqttclient) == 1
+    assert mqttclient.published == [(discovery_config(SHELF)[0], "")]
+
+    assert await publisher.async_publish(FakeMqttClient()) == 0
+
+
+async def test_forced_publish_sends_every_config(hass, hass_storage):
+    """Forcing ignores the digests."""
+    publisher = DiscoveryPublisher(hass, [DESK, SHELF])
+    await publisher.async_publish(FakeMqttClient())
+
+    mqttclient = FakeMqttClient()
+    assert await publisher.async_publish(mqttclient, force=True) == 2
+    assert sorted(_topics(mqttclient)) == sorted(discovery_config(device)[0] for device in (DESK, SHELF))
+
+
+@pytest.mark.parametrize(("payload", "expected"), [(b"online", 2), (b"offline", 0)])
+async def test_birth_message_republishes_every_config(hass, hass_storage, payload, expected):
+    """A restarted Home Assistant may have lost configs that were not retained."""
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "devices": [DESK, SHELF],
+        "warmup_budget": 1,
+        "warmup_wave_size": 1,
+        "stream_timeout": 5,
+    }
+    bridge = govee2mqtt.Govee2Mqtt(hass)
+    mqttclient = FakeMqttClient()
+    bridge._on_connect(mqttclient, None, None, None)
+    await hass.async_block_till_done()
+    assert len(mqttclient.published) == 2
+
+    mqttclient.published.clear()
+    bridge._on_message(mqttclient, None, FakeMessage(BIRTH_TOPIC, payload))
+    await hass.async_block_till_done()
+
+    assert len(mqttclient.published) == expected
+    # The birth message is not a command
+    assert not govee2mqtt.MESSAGE_QUEUE
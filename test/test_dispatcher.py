@@ -0,0 +1,173 @@
+"""Tests for the controller's dispatcher of light workers."""
+import asyncio
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.goveeble2mqtt.concurrency import INITIAL_LIMIT
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+
+from .simulator import GoveeSimulator
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+class _Workers:
+    """Stand-in for the light update, every run waits until it is released."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.runs = []
+        self._release = asyncio.Event()
+
+    def release(self):
+        self._release.set()
+
+    async def __call__(self, light):
+        self.runs.append(light.mac_address)
+        await self._release.wait()
+        if self.fail:
+            raise RuntimeError("connect failed")
+        for property_name in ("state", "brightness", "rgb_color", "segments"):
+            light.mark_clean(property_name)
+
+
+@pytest.fixture
+async def dispatcher(hass, enable_bluetooth):
+    """Return a controller whose workers are stand-ins, and a factory of dirty lights."""
+    simulator = GoveeSimulator(connection_slots=10, seed=1)
+    controller = GoveeBluetoothController(hass, "A4:C1:38:00:00:00", client_class=simulator.client_class)
+    lights = []
+
+    def _light(index):
+        address = f"A4:C1:38:00:00:{index + 0x10:02X}"
+        entry = MockConfigEntry(domain=DOMAIN, data={"address": address, "model": "default", "name": address})
+        light = HACSGoveeBleLight(hass, None, address, None, entry, controller)
+        light._mark_dirty("state", True)
+        lights.append(light)
+        return light
+
+    yield controller, _light
+    await controller.async_stop()
+    for light in lights:
+        controller.unregister_light(light)
+    await hass.async_block_till_done()
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_request_for_active_light_is_coalesced(hass, dispatcher):
+    """A second request while the light's worker runs only wakes that worker."""
+    controller, make_light = dispatcher
+    controller._async_process_light_update = workers = _Workers()
+    light = make_light(0)
+
+    controller.queue_update(light)
+    await _wait_for(lambda: workers.runs)
+    controller.queue_update(light)
+    await _wait_for(lambda: controller.as_dict()["coalesced"] == 1)
+
+    assert light.mac_address in controller._active
+    assert light.mac_address in controller._rerun
+    assert controller._wake_event(light).is_set()
+
+    # The worker brought the light up to date, the rerun finds nothing to do
+    workers.release()
+    await _wait_for(lambda: not controller._active)
+    await asyncio.sleep(0.05)
+
+    assert workers.runs == [light.mac_address]
+    assert controller.as_dict()["workers"] == 1
+    assert not controller._rerun
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_light_still_dirty_after_its_worker_is_requeued(hass, dispatcher):
+    """A request the worker did not see is not left waiting for the next one."""
+    controller, make_light = dispatcher
+    workers = _Workers()
+    light = make_light(0)
+    finished = []
+
+    async def _leave_dirty_once(light):
+        await workers(light)
+        if len(workers.runs) == 1:
+            # Changed after the worker's last look at the light
+            light._mark_dirty("brightness", 128)
+        finished.append(light.mac_address)
+
+    controller._async_process_light_update = _leave_dirty_once
+
+    controller.queue_update(light)
+    await _wait_for(lambda: workers.runs)
+    controller.queue_update(light)
+    workers.release()
+    await _wait_for(lambda: len(finished) == 2)
+    await _wait_for(lambda: not controller._active)
+
+    assert workers.runs == [light.mac_address] * 2
+    assert not light.is_dirty()
+    assert not controller._rerun
+    assert not controller._waiting
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_failed_worker_releases_its_adapter_slot(hass, dispatcher):
+    """A worker that raises gives its slot to the next waiting light."""
+    controller, make_light = dispatcher
+    controller._async_process_light_update = workers = _Workers(fail=True)
+    lights = [make_light(index) for index in range(INITIAL_LIMIT + 1)]
+    adapter = controller.presence.adapter(lights[0].mac_address)
+
+    for light in lights:
+        controller.queue_update(light)
+    await _wait_for(lambda: len(workers.runs) == INITIAL_LIMIT)
+
+    assert controller._adapter_load[adapter] == INITIAL_LIMIT
+    assert len(controller._waiting) == 1
+
+    workers.release()
+    await _wait_for(lambda: controller.as_dict()["completed"] == len(lights))
+
+    assert sorted(workers.runs) == sorted(light.mac_address for light in lights)
+    assert controller._adapter_load[adapter] == 0
+    assert not controller._active
+    assert not controller._active_adapters
+    assert not controller._waiting
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_failed_connect_is_retried_after_a_backoff(hass, enable_bluetooth):
+    """A connect that fails with the breaker still closed does not lose the command."""
+    address = "A4:C1:38:00:00:20"
+    # No free slot makes the first connect fail
+    simulator = GoveeSimulator(connection_slots=0, connect_jitter=(0.01, 0.02), seed=1)
+    simulated = simulator.add_light(address)
+    controller = GoveeBluetoothController(hass, address, client_class=simulator.client_class)
+    controller._RETRY_BACKOFF = 0.2
+    entry = MockConfigEntry(domain=DOMAIN, data={"address": address, "model": "default", "name": "test"})
+    entity = HACSGoveeBleLight(hass, None, address, None, entry, controller)
+
+    try:
+        await entity.async_turn_on()
+        await _wait_for(lambda: controller.as_dict()["completed"] == 1)
+
+        assert entity.is_dirty()
+        assert not controller.breaker(entity).is_open
+        assert address in controller._retry_timers
+
+        simulator.connection_slots = 1
+        await _wait_for(lambda: not entity.is_dirty())
+
+        assert simulated.power
+        assert simulator.stats["connects"] == 1
+    finally:
+        await controller.async_stop()
+        controller.unregister_light(entity)
+        await hass.async_block_till_done()
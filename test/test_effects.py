@@ -0,0 +1,193 @@
+"""Tests for the fleet-wide light effects."""
+import asyncio
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.effects import EFFECTS, Effect, EffectsEngine
+from custom_components.goveeble2mqtt.kelvin_rgb import kelvin_to_rgb_array
+
+from .replay import FakeMqttClient
+from .simulator import GoveeSimulator
+
+LIGHTS = ["A", "B", "C", "D"]
+
+
+class _Clock:
+    """Monotonic clock of the effects module, moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return 0.0
+
+
+@pytest.fixture
+def clock():
+    """Put effects at a given phase without waiting for it."""
+    clock = _Clock()
+    with patch("custom_components.goveeble2mqtt.effects.time", clock):
+        yield clock
+
+
+class _Client:
+    """Records the colors streamed to a light."""
+
+    def __init__(self):
+        self.streamed = []
+
+    def Stream(self, red, green, blue):
+        self.streamed.append((red, green, blue))
+
+
+def _colors(effect, now):
+    return [tuple(row) for row in effect.colors(now).tolist()]
+
+
+def test_unknown_effect_is_rejected(clock):
+    """Only the listed effects exist."""
+    assert EFFECTS == ("breathe", "rainbow", "chase")
+    with pytest.raises(ValueError):
+        Effect("strobe", LIGHTS)
+
+
+def test_rainbow_spreads_the_lights_around_the_color_wheel(clock):
+    """Three lights start on red, green and blue, a quarter period later the wheel turned."""
+    effect = Effect("rainbow", LIGHTS[:3], period=4)
+
+    assert _colors(effect, clock.now) == [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+    assert _colors(effect, clock.now + 1)[0] == (128, 255, 0)
+    # One full turn later everything is back
+    assert _colors(effect, clock.now + 4) == _colors(effect, clock.now)
+
+
+def test_breathe_scales_the_base_color(clock):
+    """Every light breathes together, from the minimum level to the full color."""
+    effect = Effect("breathe", LIGHTS, period=4, rgb_color=(200, 100, 0))
+
+    assert _colors(effect, clock.now) == [(10, 5, 0)] * 4
+    assert _colors(effect, clock.now + 2) == [(200, 100, 0)] * 4
+
+
+def test_breathe_of_a_color_temperature(clock):
+    """A temperature breathes its white at the peak."""
+    effect = Effect("breathe", LIGHTS[:1], period=4, kelvin=2700)
+
+    assert _colors(effect, clock.now + 2) == [tuple(kelvin_to_rgb_array(np.array([2700]))[0].tolist())]
+
+
+def test_chase_lights_the_lights_around_its_head(clock):
+    """The head moves along the lights, the ones within the width fade in and out."""
+    effect = Effect("chase", LIGHTS, period=4, rgb_color=(0, 0, 200), width=0.25)
+
+    assert _colors(effect, clock.now) == [(0, 0, 200), (0, 0, 0), (0, 0, 0), (0, 0, 0)]
+    assert _colors(effect, clock.now + 0.5) == [(0, 0, 100), (0, 0, 100), (0, 0, 0), (0, 0, 0)]
+    assert _colors(effect, clock.now + 1) == [(0, 0, 0), (0, 0, 200), (0, 0, 0), (0, 0, 0)]
+
+
+def test_effect_without_some_lights_keeps_its_phase(clock):
+    """The remaining lights carry on where they were, no light left means no effect."""
+    effect = Effect("breathe", LIGHTS, period=4)
+    clock.now += 1
+
+    remaining = effect.without({"A", "B"})
+
+    assert remaining.addresses == ["C", "D"]
+    assert _colors(remaining, clock.now) == _colors(effect, clock.now)[2:]
+    assert effect.without(set(LIGHTS)) is None
+
+
+async def test_tick_streams_only_the_changed_colors(hass, clock):
+    """A color that did not change since the last tick is not streamed again."""
+    clients = {address: _Client() for address in LIGHTS}
+    engine = EffectsEngine(hass, clients.get, tick=3600)
+    engine.start("room", Effect("chase", LIGHTS, period=4, rgb_color=(0, 0, 200), width=0.25))
+
+    try:
+        assert engine.tick(clock.now) == 4
+        assert engine.tick(clock.now) == 0
+        assert engine.tick(clock.now + 0.5) == 2
+        assert clients["A"].streamed == [(0, 0, 200), (0, 0, 100)]
+        assert clients["B"].streamed == [(0, 0, 0), (0, 0, 100)]
+
+        stats = engine.as_dict()
+        assert stats["effects"] == {"room": 4}
+        assert (stats["ticks"], stats["frames"], stats["unchanged"]) == (3, 6, 6)
+    finally:
+        engine.stop()
+
+
+async def test_starting_an_effect_takes_its_lights_from_the_others(hass, clock):
+    """A light runs one effect at a time, lights without a client are skipped and returned."""
+    clients = {address: _Client() for address in LIGHTS}
+    engine = EffectsEngine(hass, clients.get, tick=3600)
+
+    try:
+        assert engine.start("house", Effect("breathe", LIGHTS)) == []
+        assert engine.start("desk", Effect("rainbow", ["C", "D", "E"])) == ["E"]
+        assert engine.as_dict()["effects"] == {"house": 2, "desk": 2}
+
+        engine.start("house", Effect("breathe", ["C", "D"]))
+        assert engine.as_dict()["effects"] == {"house": 2}
+
+        assert engine.start("desk", Effect("rainbow", ["E"])) == ["E"]
+        assert engine.as_dict()["effects"] == {"house": 2}
+
+        assert engine.stop("house")["effects"] == {}
+        engine.tick(clock.now)
+        assert not any(client.streamed for client in clients.values())
+    finally:
+        engine.stop()
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_bridge_streams_a_rainbow_to_its_lights(hass, enable_bluetooth):
+    """Every light of a running rainbow shows a different, fully saturated color."""
+    simulator = GoveeSimulator(connection_slots=3, connect_jitter=(0.01, 0.02), seed=1)
+    lights = [simulator.add_light(f"A4:C1:38:00:00:C{index}") for index in range(3)]
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "warmup_budget": 1,
+        "warmup_wave_size": 3,
+        "stream_timeout": 0.2,
+    }
+    bridge = govee2mqtt.Govee2Mqtt(hass)
+    bridge.client_class = simulator.client_class
+    mqttclient = FakeMqttClient()
+    for light in lights:
+        bridge._get_client(mqttclient, light.address.replace(":", ""), "default", light_topic(light.address, "default") + "/state")
+
+    try:
+        # A slow rainbow, the colors stay apart while the lights catch up
+        assert bridge.start_effect("rainbow", "rainbow", period=60) == []
+        # The lights start out white
+        await _wait_for(lambda: all(0 in light.rgb for light in lights))
+
+        assert len({light.rgb for light in lights}) == 3
+        assert all(sum(light.rgb) >= 255 for light in lights)
+        assert bridge.effects.stop()["frames"] >= 3
+        await _wait_for(lambda: not any(client.Streaming for client in govee2mqtt.CLIENTS.values()))
+    finally:
+        bridge.effects.stop()
+        for client in govee2mqtt.CLIENTS.values():
+            client.Close()
+        govee2mqtt.CLIENTS.clear()
+        await hass.async_block_till_done()
@@ -0,0 +1,124 @@
+"""Tests for dropping MQTT commands that outlived their time to live."""
+import asyncio
+import json
+import logging
+
+import pytest
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_ble_light import Client
+from custom_components.goveeble2mqtt.response import CommandReply
+
+from .replay import FakeMessage, FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:04"
+TOPIC = light_topic(ADDRESS, "default")
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def _replies(mqttclient):
+    return [json.loads(payload) for topic, payload in mqttclient.published if topic == TOPIC + "/response"]
+
+
+@pytest.fixture
+async def bridge(hass):
+    """Return a bridge whose commands expire after 2 seconds, and its simulated light."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light(ADDRESS)
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "warmup_budget": 1,
+        "warmup_wave_size": 1,
+        "stream_timeout": 5,
+        "command_ttl": 2,
+    }
+    bridge = govee2mqtt.Govee2Mqtt(hass)
+    bridge.client_class = simulator.client_class
+    yield bridge, light
+    for client in govee2mqtt.CLIENTS.values():
+        client.Close()
+    govee2mqtt.CLIENTS.clear()
+    govee2mqtt.MESSAGE_QUEUE.clear()
+    await hass.async_block_till_done()
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_stale_queued_command_is_answered_expired(hass, enable_bluetooth, bridge):
+    """A queued command older than its time to live is discarded, one with a longer one still runs."""
+    bridge, light = bridge
+    mqttclient = FakeMqttClient()
+    stale = FakeMessage(TOPIC + "/command", json.dumps({"state": "ON", "correlation_id": 1}).encode())
+    stale.timestamp -= 5
+    kept = FakeMessage(TOPIC + "/command", json.dumps({"brightness": 128, "ttl": 10}).encode())
+    kept.timestamp -= 5
+    govee2mqtt.MESSAGE_QUEUE.extend([stale, kept])
+
+    bridge._process_queue(mqttclient)
+    await _wait_for(lambda: light.brightness == 50)
+
+    assert not light.power
+    assert _replies(mqttclient)[0]["status"] == "expired"
+    assert _replies(mqttclient)[0]["correlation_id"] == 1
+    assert bridge.expired_commands() == {"queue": 1, "lights": 0}
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+@pytest.mark.parametrize("payload", [b'"ON"', b"1", b"[]", b"{"])
+async def test_payload_that_is_not_an_object_is_rejected(hass, enable_bluetooth, bridge, caplog, payload):
+    """Valid JSON that is not an object is an invalid payload, not a handler error."""
+    bridge, light = bridge
+    govee2mqtt.MESSAGE_QUEUE.append(FakeMessage(TOPIC + "/command", payload))
+
+    with caplog.at_level(logging.ERROR):
+        bridge._process_queue(FakeMqttClient())
+
+    assert "Invalid payload on " + TOPIC + "/command" in caplog.text
+    assert not govee2mqtt.MESSAGE_QUEUE
+    assert not govee2mqtt.CLIENTS
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_property_expired_while_disconnected_is_not_sent(hass, enable_bluetooth):
+    """After a reconnect, properties whose command expired are dropped and the rest is sent."""
+    # No free slot keeps the light unreachable until the commands are queued
+    simulator = GoveeSimulator(connection_slots=0, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light(ADDRESS)
+    mqttclient = FakeMqttClient()
+    client = Client(
+        hass, ADDRESS, "default", mqttclient, TOPIC + "/state", client_class=simulator.client_class, command_ttl=0.5,
+    )
+    replies = []
+
+    try:
+        client.SetPower(1)
+        client.Stamp({"state"})
+        client.Track(CommandReply({"state"}, replies.append))
+        # A later command with a longer time to live survives the wait
+        client.SetBrightness(0.5)
+        client.Stamp({"brightness"}, ttl=float("inf"))
+
+        await asyncio.sleep(1)
+        simulator.connection_slots = 1
+        await _wait_for(lambda: not client.DirtyProperties, timeout=30)
+
+        assert not light.power
+        assert light.brightness == 50
+        assert client.State == 0
+        assert client.ExpiredCommands == 1
+        assert [reply["status"] for reply in replies] == ["expired"]
+        assert (TOPIC + "/expiry/stats", json.dumps({"expired": 1})) in mqttclient.published
+    finally:
+        client.Close()
+        await hass.async_block_till_done()
@@ -0,0 +1,97 @@
+"""Tests for the synthetic MQTT load generator."""
+import json
+
+import pytest
+
+from custom_components.goveeble2mqtt.const import DOMAIN
+
+from .loadtest import SCENE_FAN_OUT, SLIDER_STEPS, InProcessBroker, LoadGenerator, _percentiles, async_run_load_test
+
+TOPICS = [DOMAIN + f"/light/A4C1380000{index:02X}_default/command" for index in range(20)]
+
+
+def test_broker_routes_to_matching_subscriptions():
+    """Clients get the messages of their subscriptions on their next loop, listeners at once."""
+    broker = InProcessBroker()
+    received = []
+    heard = []
+
+    client = broker.client_class()
+    client.on_connect = lambda mqttclient, *_: mqttclient.subscribe([(DOMAIN + "/light/+/command", 0)])
+    client.on_message = lambda _client, _userdata, message: received.append((message.topic, message.payload))
+    client.connect("localhost")
+    broker.listen(DOMAIN + "/light/+/response", lambda topic, payload: heard.append(payload))
+
+    assert not broker.has_subscriber(TOPICS[0])
+    client.loop()
+    assert broker.has_subscriber(TOPICS[0])
+
+    broker.publish(TOPICS[0], "{}")
+    broker.publish("other/topic", b"{}")
+    client.publish(DOMAIN + "/light/x/response", '{"status": "ok"}')
+    assert not received
+    client.loop()
+
+    assert received == [(TOPICS[0], b"{}")]
+    assert heard == [b'{"status": "ok"}']
+    assert broker.routed == 3
+
+    client.disconnect()
+    assert not broker.has_subscriber(TOPICS[0])
+
+
+def test_latency_percentiles():
+    """Percentiles are in milliseconds, an empty run only reports its count."""
+    assert _percentiles([]) == {"count": 0}
+    assert _percentiles([index / 1000 for index in range(100, 0, -1)]) == {
+        "count": 100, "p50_ms": 51.0, "p95_ms": 96.0, "p99_ms": 100.0, "max_ms": 100.0,
+    }
+
+
+@pytest.mark.parametrize(
+    ("scenario", "expected"),
+    [("toggle", 1), ("slider", SLIDER_STEPS), ("scene", SCENE_FAN_OUT)],
+)
+async def test_scenarios_publish_their_burst_with_correlation_ids(scenario, expected):
+    """Every message is counted as unanswered until its reply comes back."""
+    broker = InProcessBroker()
+    sent = []
+    broker.listen(DOMAIN + "/light/+/command", lambda topic, payload: sent.append((topic, json.loads(payload))))
+    generator = LoadGenerator(broker, TOPICS, rate=1000, mix={scenario: 1}, seed=1)
+
+    await generator.async_run(0)
+    assert not sent
+    await generator.async_run(0.0001)
+
+    assert generator.published == len(sent) == expected
+    assert generator.unanswered == expected
+    if scenario == "slider":
+        assert len({topic for topic, _ in sent}) == 1
+    if scenario == "scene":
+        assert len({topic for topic, _ in sent}) == SCENE_FAN_OUT
+        assert len({json.dumps(payload["color"]) for _, payload in sent}) == 1
+
+    for _, payload in sent:
+        broker.publish(DOMAIN + "/light/x/response", json.dumps({"correlation_id": payload["correlation_id"], "status": "ok"}))
+    # Replies the generator did not ask for still count towards the statuses
+    broker.publish(DOMAIN + "/light/x/response", json.dumps({"status": "timeout"}))
+
+    assert generator.unanswered == 0
+    assert len(generator.latencies) == expected
+    assert generator.statuses == {"ok": expected, "timeout": 1}
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_short_load_test_answers_every_message(hass, enable_bluetooth):
+    """A light load against a few lights is answered in full and coalesces."""
+    report = await async_run_load_test(hass, devices=3, rate=40, duration=1, settle=5, seed=1)
+    await hass.async_block_till_done()
+
+    assert report["devices"] == 3
+    assert report["published"] >= 30
+    assert report["unanswered"] == 0
+    assert report["latency"]["count"] == report["published"]
+    assert report["command_frames"] > 0
+    assert report["coalescing_ratio"] >= 1
+    assert report["queue_depth"]["samples"]
@@ -0,0 +1,124 @@
+"""Tests for the adaptive status polling of lights changed outside Home Assistant."""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_ble_light import Client
+from custom_components.goveeble2mqtt.poller import StatePoller
+
+from .replay import FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:50"
+TOPIC = light_topic(ADDRESS, "default") + "/state"
+
+
+class _Clock:
+    """Monotonic clock of the poller module, moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Let polling intervals elapse without sleeping through them."""
+    clock = _Clock()
+    with patch("custom_components.goveeble2mqtt.poller.time", clock):
+        yield clock
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_quiet_polls_stretch_the_interval_up_to_the_maximum(clock):
+    """Every poll that finds nothing new backs off, an outside change polls at the minimum again."""
+    poller = StatePoller(min_interval=30, max_interval=100, backoff=2)
+
+    assert poller.is_due(ADDRESS)
+    assert poller.interval(ADDRESS) == 30
+
+    intervals = []
+    for _ in range(3):
+        poller.record(ADDRESS, changed=False)
+        intervals.append(poller.interval(ADDRESS))
+    assert intervals == [60, 100, 100]
+
+    poller.record(ADDRESS, changed=True)
+    assert poller.interval(ADDRESS) == 30
+
+
+def test_light_is_due_once_its_interval_elapsed(clock):
+    """A disconnected light, polled with an overdue factor, waits that many intervals."""
+    poller = StatePoller(min_interval=30)
+    poller.record(ADDRESS, changed=True)
+
+    clock.now += 29
+    assert not poller.is_due(ADDRESS)
+    clock.now += 1
+    assert poller.is_due(ADDRESS)
+    assert not poller.is_due(ADDRESS, overdue_factor=3)
+    clock.now += 60
+    assert poller.is_due(ADDRESS, overdue_factor=3)
+
+    poller.forget(ADDRESS)
+    assert poller.is_due(ADDRESS)
+    assert poller.interval(ADDRESS) == 30
+
+
+def test_airtime_budget_is_kept_per_adapter(clock):
+    """A drained adapter refuses polls until its bucket refills, other adapters are not affected."""
+    poller = StatePoller(airtime_budget=0.5)
+    # Five queries in a burst, one more every two seconds
+    assert poller.try_consume("hci0", 3)
+    assert poller.try_consume("hci0", 2)
+    assert not poller.try_consume("hci0", 1)
+    assert poller.try_consume("hci1", 3)
+
+    clock.now += 1.9
+    assert not poller.try_consume("hci0", 1)
+    clock.now += 0.1
+    assert poller.try_consume("hci0", 1)
+
+    # The bucket does not fill past its size while idle
+    clock.now += 3600
+    assert not poller.try_consume("hci0", 6)
+    assert poller.try_consume("hci0", 5)
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_client_adopts_a_change_made_outside_home_assistant(hass, enable_bluetooth):
+    """An idle connection polls the light and publishes the state it reports."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light(ADDRESS)
+    poller = StatePoller(min_interval=0.1, max_interval=0.1)
+    mqttclient = FakeMqttClient()
+
+    with patch("custom_components.goveeble2mqtt.govee_ble_light.KEEP_ALIVE_INTERVAL", 0.05):
+        client = Client(hass, ADDRESS, "default", mqttclient, TOPIC, poller=poller, client_class=simulator.client_class)
+        try:
+            client.SetPower(1)
+            client.SetBrightness(1)
+            await _wait_for(lambda: light.power and light.brightness == 100 and not client.DirtyProperties)
+
+            # Turned down with the Govee app
+            light.brightness = 20
+            await _wait_for(lambda: client.Brightness == 0.2)
+
+            assert client.State == 1
+            assert poller.interval(ADDRESS) == 0.1
+            published = [json.loads(payload) for topic, payload in mqttclient.published if topic == TOPIC]
+            assert published[-1]["brightness"] == 51
+        finally:
+            client.Close()
+            await hass.async_block_till_done()
@@ -0,0 +1,206 @@
+"""Tests for advertisement presence tracking and the scheduling it steers."""
+import asyncio
+import itertools
+import time
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+from homeassistant.components.bluetooth import BluetoothServiceInfoBleak, async_get_advertisement_callback
+from homeassistant.const import Platform
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.discovery import async_load_platform
+from homeassistant.helpers.entity_component import async_update_entity
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.concurrency import INITIAL_LIMIT
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+from custom_components.goveeble2mqtt.presence import PresenceTracker
+
+from .simulator import GoveeSimulator
+
+SOURCE = "AA:BB:CC:DD:EE:FF"
+# Unchanged advertisements are not passed on, every one gets its own payload
+_PAYLOADS = itertools.count()
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def _advertise(hass, address, rssi):
+    """Feed an advertisement of a light to the bluetooth integration."""
+    manufacturer_data = {0x0BAD: next(_PAYLOADS).to_bytes(4, "little")}
+    advertisement = AdvertisementData(
+        local_name=None, manufacturer_data=manufacturer_data, service_data={}, service_uuids=[],
+        tx_power=None, rssi=rssi, platform_data=(),
+    )
+    async_get_advertisement_callback(hass)(
+        BluetoothServiceInfoBleak(
+            name=address, address=address, rssi=rssi, manufacturer_data=manufacturer_data, service_data={},
+            service_uuids=[], source=SOURCE, device=BLEDevice(address, None, None),
+            advertisement=advertisement, connectable=True, time=time.monotonic(), tx_power=None,
+        )
+    )
+
+
+class _Workers:
+    """Stand-in for the light update, every run waits until it is released."""
+
+    def __init__(self):
+        self.runs = []
+        self._release = asyncio.Event()
+
+    def release(self):
+        self._release.set()
+
+    async def __call__(self, light):
+        self.runs.append(light.mac_address)
+        await self._release.wait()
+        for property_name in ("state", "brightness", "rgb_color", "segments"):
+            light.mark_clean(property_name)
+
+
+@pytest.fixture
+async def dispatcher(hass, enable_bluetooth):
+    """Return a controller whose workers are stand-ins, and a factory of dirty lights."""
+    simulator = GoveeSimulator(connection_slots=10, seed=1)
+    controller = GoveeBluetoothController(hass, "A4:C1:38:00:00:00", client_class=simulator.client_class)
+    controller._async_process_light_update = workers = _Workers()
+    lights = []
+
+    def _light(index):
+        address = f"A4:C1:38:00:00:{index + 0x30:02X}"
+        entry = MockConfigEntry(domain=DOMAIN, data={"address": address, "model": "default", "name": address})
+        light = HACSGoveeBleLight(hass, None, address, None, entry, controller)
+        light._mark_dirty("state", True)
+        lights.append(light)
+        return light
+
+    yield controller, workers, _light
+    workers.release()
+    await controller.async_stop()
+    for light in lights:
+        controller.unregister_light(light)
+    await hass.async_block_till_done()
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_rssi_is_averaged_and_silence_makes_a_light_absent(hass, enable_bluetooth):
+    """The first advertisement seeds the average, later ones move it by the smoothing factor."""
+    address = "A4:C1:38:00:00:21"
+    tracker = PresenceTracker(hass, absent_after=0.2, rssi_smoothing=0.5)
+    heard = []
+    tracker.async_track(address.lower())
+    tracker.async_add_listener(address, lambda: heard.append(address))
+
+    # Never heard, but the tracker has not listened long enough to tell
+    assert tracker.is_present(address)
+    assert tracker.rssi(address) is None
+    assert tracker.as_dict(address)["advertisements"] == 0
+
+    _advertise(hass, address, -80)
+    _advertise(hass, address, -60)
+
+    assert tracker.rssi(address) == -70
+    assert tracker.adapter(address) == SOURCE
+    assert heard == [address] * 2
+    assert tracker.as_dict(address)["advertisements"] == 2
+
+    await asyncio.sleep(0.25)
+    assert not tracker.is_present(address)
+    assert not tracker.is_present("A4:C1:38:00:00:22")
+
+    _advertise(hass, address, -60)
+    assert tracker.is_present(address)
+
+    tracker.async_untrack(address)
+    _advertise(hass, address, -40)
+    assert tracker.get(address) is None
+    assert len(heard) == 3
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_absent_light_is_deferred_until_it_advertises(hass, dispatcher):
+    """An update of a silent light spends no connection attempt, its next advertisement resumes it."""
+    controller, workers, make_light = dispatcher
+    controller._presence = PresenceTracker(hass, absent_after=0.1)
+    light = make_light(0)
+    workers.release()
+    await asyncio.sleep(0.15)
+
+    controller.queue_update(light)
+    await _wait_for(lambda: light.mac_address in controller._deferred_absent)
+
+    assert not workers.runs
+    assert not controller._waiting
+    assert light.is_dirty()
+
+    _advertise(hass, light.mac_address, -70)
+    await _wait_for(lambda: not light.is_dirty())
+
+    assert workers.runs == [light.mac_address]
+    assert not controller._deferred_absent
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_waiting_lights_start_strongest_signal_first(hass, dispatcher):
+    """With more lights than slots of their adapter the strongest signals connect first."""
+    controller, workers, make_light = dispatcher
+    lights = [make_light(index) for index in range(INITIAL_LIMIT + 2)]
+    for light, rssi in zip(lights, [-90, -60, -80, -75]):
+        _advertise(hass, light.mac_address, rssi)
+
+    for light in lights:
+        controller.queue_update(light)
+    await _wait_for(lambda: len(workers.runs) == INITIAL_LIMIT)
+
+    assert workers.runs == [lights[1].mac_address, lights[3].mac_address]
+    assert list(controller._waiting) == [lights[0].mac_address, lights[2].mac_address]
+
+    workers.release()
+    await _wait_for(lambda: controller.as_dict()["completed"] == len(lights))
+
+    assert workers.runs[INITIAL_LIMIT:] == [lights[2].mac_address, lights[0].mac_address]
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_bridge_lights_get_presence_sensors(hass, enable_bluetooth, enable_custom_integrations):
+    """Without config entries the bridge's configured lights get their sensors by discovery."""
+    address = "A4:C1:38:00:00:23"
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "devices": [{"address": address.lower(), "name": "Desk"}],
+        "warmup_budget": 1,
+        "warmup_wave_size": 1,
+        "stream_timeout": 5,
+    }
+    bridge = hass.data[DOMAIN]["bridge"] = govee2mqtt.Govee2Mqtt(hass)
+    bridge.presence.async_track(address)
+
+    await async_load_platform(hass, Platform.SENSOR, DOMAIN, {}, {})
+    await hass.async_block_till_done()
+
+    last_seen = hass.states.get("sensor.desk_last_seen")
+    assert last_seen is not None
+    assert last_seen.state == "unavailable"
+    # Signal strength is disabled by default, as on the config entry lights
+    assert er.async_get(hass).async_get("sensor.desk_signal_strength").disabled
+
+    _advertise(hass, address, -64)
+    await async_update_entity(hass, "sensor.desk_last_seen")
+
+    last_seen = hass.states.get("sensor.desk_last_seen")
+    assert last_seen.state == bridge.presence.get(address).last_seen_at.isoformat(timespec="seconds")
+    assert last_seen.attributes["present"]
+
+    bridge.presence.async_untrack(address)
@@ -0,0 +1,124 @@
+"""Tests for the Govee BLE frame encoding and the segment helpers."""
+import pytest
+
+from custom_components.goveeble2mqtt.models import LedCommand, LedMode
+from custom_components.goveeble2mqtt.protocol import (
+    FRAME_LENGTH,
+    MODE_1501_ALL_SEGMENTS,
+    build_frame,
+    checksum,
+    is_valid_frame,
+    pack_segment_colors,
+    segment_mask,
+)
+
+
+def _segment_frame(rgb, segments):
+    """Return the MODE_1501 frame painting segments, laid out as the segment service sends it."""
+    red, green, blue = rgb
+    return build_frame(LedCommand.COLOR, [LedMode.MODE_1501, 0x01, red, green, blue, 0, 0, 0, 0, 0, *segment_mask(segments)])
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        (b"", 0x00),
+        (b"\x33\x01\x01", 0x33),
+        (b"\xaa\xaa", 0x00),
+        (b"\x33\x05\x15\x01\xff\x00\x00\x00\x00\x00\x00\x00\xff\x74", 0x56),
+        ([0xFF, 0x0F, 0xF0], 0x00),
+    ],
+)
+def test_checksum_is_xor_of_the_bytes(data, expected):
+    """The last frame byte is the XOR of the ones before it."""
+    assert checksum(data) == expected
+
+
+@pytest.mark.parametrize(
+    ("cmd", "payload", "expected"),
+    [
+        (LedCommand.POWER, [0x01], "3301010000000000000000000000000000000033"),
+        (LedCommand.POWER, [0x00], "3301000000000000000000000000000000000032"),
+        (LedCommand.BRIGHTNESS, [0x64], "3304640000000000000000000000000000000053"),
+        (LedCommand.COLOR, [LedMode.MODE_D, 0x12, 0x34, 0x56], "33050d123456000000000000000000000000004b"),
+        (
+            LedCommand.COLOR,
+            [LedMode.MODE_1501, 0x01, 0xFF, 0x00, 0x00, 0, 0, 0, 0, 0, *MODE_1501_ALL_SEGMENTS],
+            "33051501ff00000000000000ff74000000000056",
+        ),
+    ],
+)
+def test_build_frame_pads_and_checksums(cmd, payload, expected):
+    """Frames are 20 bytes: head, command, payload, zero padding and the checksum."""
+    frame = build_frame(cmd, payload)
+
+    assert frame.hex() == expected
+    assert len(frame) == FRAME_LENGTH
+    assert is_valid_frame(frame)
+
+
+def test_build_frame_rejects_bad_payloads():
+    """Payloads that are not bytes, or too long for a frame, are refused."""
+    with pytest.raises(ValueError):
+        build_frame(LedCommand.POWER, [0x01] * 18)
+    with pytest.raises(ValueError):
+        build_frame(LedCommand.POWER, "on")
+    with pytest.raises(TypeError):
+        build_frame("power", [0x01])
+
+
+@pytest.mark.parametrize(
+    ("segments", "expected"),
+    [
+        ([], [0x00, 0x00]),
+        ([0], [0x01, 0x00]),
+        ([0, 1, 2], [0x07, 0x00]),
+        ([7, 8], [0x80, 0x01]),
+        ([14], [0x00, 0x40]),
+        (range(15), [0xFF, 0x7F]),
+        ([2, 4, 5, 6, 8, 9, 10, 12, 13, 14, 0, 1, 3, 7], [0xFF, 0x77]),
+    ],
+)
+def test_segment_mask(segments, expected):
+    """Bit n of the little-endian mask selects segment n."""
+    assert segment_mask(segments) == expected
+
+
+def test_all_segments_mask_is_unchanged():
+    """The whole-device MODE_1501 color frame keeps the mask it always sent."""
+    assert list(MODE_1501_ALL_SEGMENTS) == [0xFF, 0x74]
+
+
+@pytest.mark.parametrize(
+    ("colors", "expected"),
+    [
+        ({}, []),
+        ({0: (255, 0, 0)}, [((255, 0, 0), [0])]),
+        ({2: [0, 0, 255], 0: [0, 0, 255], 1: [0, 0, 255]}, [((0, 0, 255), [0, 1, 2])]),
+        (
+            {3: (0, 255, 0), 0: (255, 0, 0), 1: (0, 255, 0), 2: (255, 0, 0)},
+            [((255, 0, 0), [0, 2]), ((0, 255, 0), [1, 3])],
+        ),
+    ],
+)
+def test_pack_segment_colors(colors, expected):
+    """Segments sharing a color are grouped, in order of their first segment."""
+    assert pack_segment_colors(colors) == expected
+
+
+@pytest.mark.parametrize(
+    ("colors", "expected"),
+    [
+        ({index: (255, 0, 0) for index in range(15)}, ["33051501ff00000000000000ff7f00000000005d"]),
+        (
+            {0: (0, 0, 255), 1: (0, 0, 255), 2: (0, 0, 255), 14: (0, 255, 0)},
+            ["330515010000ff000000000007000000000000da", "3305150100ff000000000000004000000000009d"],
+        ),
+    ],
+)
+def test_segment_frames(colors, expected):
+    """One 20-byte frame per distinct color, its mask selecting the segments painted with it."""
+    frames = [_segment_frame(rgb, segments) for rgb, segments in pack_segment_colors(colors)]
+
+    assert [frame.hex() for frame in frames] == expected
+    assert all(is_valid_frame(frame) for frame in frames)
@@ -0,0 +1,126 @@
+"""Tests for the model registry and its precompiled frames."""
+import json
+
+import pytest
+
+from custom_components.goveeble2mqtt.models import LedCommand, LedMode
+from custom_components.goveeble2mqtt.protocol import build_frame, segment_mask
+from custom_components.goveeble2mqtt.registry import DEFAULT_MODEL, MODELS_FILE, REGISTRY
+
+with open(MODELS_FILE, encoding="utf-8") as _file:
+    MODELS = json.load(_file)
+
+COLORS = [(0, 0, 0), (255, 255, 255), (255, 0, 0), (0x12, 0x34, 0x56), (1, 128, 254)]
+KELVINS = [0, 2000, 6500, 9000]
+
+
+def _legacy_color_frame(led_mode, rgb, kelvin=0, mask=(0xFF, 0x74)):
+    """Return the color frame as it was built by hand before the registry."""
+    red, green, blue = rgb
+    if led_mode == LedMode.MODE_1501:
+        payload = [led_mode, 0x01, red, green, blue, (kelvin >> 8) & 0xFF, kelvin & 0xFF, 0, 0, 0, *mask]
+    else:
+        payload = [led_mode, red, green, blue, (kelvin >> 8) & 0xFF, kelvin & 0xFF, 0, 0, 0]
+    return build_frame(LedCommand.COLOR, payload)
+
+
+@pytest.mark.parametrize(
+    ("model", "led_mode", "brightness_max", "segments"),
+    [
+        (DEFAULT_MODEL, LedMode.MODE_D, 100, 0),
+        ("H6008", LedMode.MODE_D, 100, 0),
+        ("H6046", LedMode.MODE_1501, 100, 15),
+        ("H6072", LedMode.MODE_1501, 100, 15),
+        ("H6076", LedMode.MODE_1501, 100, 15),
+        ("MODE2", LedMode.MODE_2, 255, 0),
+    ],
+)
+def test_entries_are_merged_over_the_defaults(model, led_mode, brightness_max, segments):
+    """An entry only lists what differs, everything else comes from the default entry."""
+    capabilities = REGISTRY.get(model)
+
+    assert capabilities.led_mode == led_mode
+    assert capabilities.brightness_max == brightness_max
+    assert capabilities.segments == segments
+    assert (capabilities.min_color_temp_kelvin, capabilities.max_color_temp_kelvin) == (2000, 9000)
+    assert capabilities.keep_connection
+
+
+def test_every_model_of_the_data_file_is_registered():
+    """Lookups ignore case and unknown models get the defaults."""
+    for model in MODELS:
+        if model != DEFAULT_MODEL:
+            assert model in REGISTRY
+        assert REGISTRY.get(model.lower()).model == model
+    assert "H0000" not in REGISTRY
+    assert REGISTRY.get("H0000") is REGISTRY.get(DEFAULT_MODEL)
+    assert REGISTRY.get(None) is REGISTRY.get(DEFAULT_MODEL)
+
+
+@pytest.mark.parametrize("model", list(MODELS))
+def test_power_and_brightness_frames_match_the_hand_built_ones(model):
+    """The templates give the frames build_frame gave for the same values."""
+    capabilities = REGISTRY.get(model)
+
+    assert capabilities.encode_power(True) == build_frame(LedCommand.POWER, [0x01])
+    assert capabilities.encode_power(False) == build_frame(LedCommand.POWER, [0x00])
+    for value in range(capabilities.brightness_max + 1):
+        assert capabilities.encode_brightness(value) == build_frame(LedCommand.BRIGHTNESS, [value])
+    # Values past the model's scale are clamped, not wrapped
+    assert capabilities.encode_brightness(capabilities.brightness_max + 1) == build_frame(
+        LedCommand.BRIGHTNESS, [capabilities.brightness_max]
+    )
+    assert capabilities.encode_brightness(-1) == build_frame(LedCommand.BRIGHTNESS, [0])
+
+
+@pytest.mark.parametrize("model", list(MODELS))
+def test_color_frames_match_the_hand_built_ones(model):
+    """Every led mode keeps its color payload layout, kelvin included."""
+    capabilities = REGISTRY.get(model)
+
+    for rgb in COLORS:
+        for kelvin in KELVINS:
+            assert capabilities.encode_color(rgb, kelvin) == _legacy_color_frame(capabilities.led_mode, rgb, kelvin)
+
+
+@pytest.mark.parametrize("model", [model for model, entry in MODELS.items() if entry.get("segments")])
+@pytest.mark.parametrize("segments", [[0], [0, 1, 2], [14], list(range(15))])
+def test_segment_frames_match_the_hand_built_ones(model, segments):
+    """A masked color frame is the segment payload frame, the whole-device mask the default."""
+    capabilities = REGISTRY.get(model)
+    mask = segment_mask(segments)
+
+    for rgb in COLORS:
+        assert capabilities.encode_color(rgb, 0, mask) == _legacy_color_frame(capabilities.led_mode, rgb, 0, mask)
+        assert capabilities.encode_color(rgb) == _legacy_color_frame(capabilities.led_mode, rgb)
+
+
+@pytest.mark.parametrize(
+    ("model", "expected"),
+    [
+        ("H6008", "33050d123456000000000000000000000000004b"),
+        ("MODE2", "3305021234560000000000000000000000000044"),
+        ("H6076", "330515011234560000000000ff740000000000d9"),
+    ],
+)
+def test_color_frame_bytes(model, expected):
+    """The exact bytes of a color frame of every led mode."""
+    assert REGISTRY.get(model).encode_color((0x12, 0x34, 0x56)).hex() == expected
+
+
+@pytest.mark.parametrize(
+    ("model", "advertised_name", "expected"),
+    [
+        ("H6076", None, "H6076"),
+        ("h6076", "ihoment_H6008_1A2B", "H6076"),
+        (DEFAULT_MODEL, "ihoment_H6008_1A2B", "H6008"),
+        (None, "Govee_H6076_1A2B", "H6076"),
+        (DEFAULT_MODEL, "Govee_H9999_1A2B", DEFAULT_MODEL),
+        (DEFAULT_MODEL, "ihoment_H60081_1A2B", DEFAULT_MODEL),
+        ("H0000", None, "H0000"),
+        (None, None, DEFAULT_MODEL),
+    ],
+)
+def test_resolve(model, advertised_name, expected):
+    """A configured model wins, otherwise the one in the advertised name."""
+    assert REGISTRY.resolve(model, advertised_name) == expected
@@ -0,0 +1,191 @@
+"""Tests for answering MQTT commands once they reached the light."""
+import asyncio
+import json
+from unittest.mock import patch
+
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+import pytest
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.response import (
+    REPLY_TIMEOUT,
+    STATUS_ACKNOWLEDGED,
+    STATUS_UNCHANGED,
+    CommandReply,
+    command_expired,
+)
+
+from .replay import FakeMessage, FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:70"
+TOPIC = light_topic(ADDRESS, "default")
+
+
+class _Clock:
+    """Monotonic clock of the response module, moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Time replies without sleeping."""
+    clock = _Clock()
+    with patch("custom_components.goveeble2mqtt.response.time", clock):
+        yield clock
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def bridge(hass):
+    """Return a bridge and its simulated light."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light(ADDRESS)
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "warmup_budget": 1,
+        "warmup_wave_size": 1,
+        "stream_timeout": 5,
+    }
+    bridge = govee2mqtt.Govee2Mqtt(hass)
+    bridge.client_class = simulator.client_class
+    yield bridge, light
+    for client in govee2mqtt.CLIENTS.values():
+        client.Close()
+    govee2mqtt.CLIENTS.clear()
+    govee2mqtt.MESSAGE_QUEUE.clear()
+    await hass.async_block_till_done()
+
+
+def _published(mqttclient, topic):
+    return [json.loads(payload) for published_topic, payload in mqttclient.published if published_topic == topic]
+
+
+@pytest.mark.parametrize(
+    ("created", "ttl", "now", "expected"),
+    [
+        (None, 5, 100, False),
+        (90, None, 100, False),
+        (96, 5, 100, False),
+        (95, 5, 100, True),
+        (0, 0, 0, True),
+    ],
+)
+def test_command_expired(created, ttl, now, expected):
+    """Commands without a creation time or a time to live never expire."""
+    assert command_expired(created, ttl, now) == expected
+
+
+def test_reply_splits_the_time_spent(clock):
+    """The reply is sent once every property resolved, the time not connecting or writing was queued."""
+    replies = []
+    reply = CommandReply({"state", "brightness"}, replies.append)
+    reply.connect = 0.1
+    reply.write = 0.05
+    clock.now += 0.5
+
+    assert not reply.resolve("state")
+    assert reply.resolve("brightness")
+    reply.send(STATUS_ACKNOWLEDGED)
+
+    assert replies == [{
+        "status": STATUS_ACKNOWLEDGED,
+        "queue_ms": 350.0,
+        "connect_ms": 100.0,
+        "write_ms": 50.0,
+        "total_ms": 500.0,
+    }]
+
+
+def test_reply_expires_after_the_reply_timeout(clock):
+    """A command that never reached the light is answered with a timeout, counted from its arrival."""
+    reply = CommandReply({"state"}, lambda _: None, received=clock.now - 1)
+    clock.now += REPLY_TIMEOUT - 1.1
+
+    assert not reply.expired
+    clock.now += 0.1
+    assert reply.expired
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_command_is_answered_once_all_its_frames_are_acknowledged(hass, enable_bluetooth, bridge):
+    """An MQTT v3 caller gets one reply with its correlation id on the response topic."""
+    bridge, light = bridge
+    mqttclient = FakeMqttClient()
+    govee2mqtt.MESSAGE_QUEUE.append(
+        FakeMessage(TOPIC + "/command", json.dumps({"state": "ON", "brightness": 255, "correlation_id": "a"}).encode())
+    )
+
+    bridge._process_queue(mqttclient)
+    await _wait_for(lambda: _published(mqttclient, TOPIC + "/response"))
+    await asyncio.sleep(0.1)
+
+    assert light.power
+    assert light.brightness == 100
+    [reply] = _published(mqttclient, TOPIC + "/response")
+    assert reply["correlation_id"] == "a"
+    assert reply["status"] == STATUS_ACKNOWLEDGED
+    assert reply["connect_ms"] > 0
+    assert reply["total_ms"] >= reply["connect_ms"] + reply["write_ms"]
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_command_that_changes_nothing_is_answered_at_once(hass, enable_bluetooth, bridge):
+    """Turning off a light that is off sends no frame and needs no wait."""
+    bridge, light = bridge
+    mqttclient = FakeMqttClient()
+    govee2mqtt.MESSAGE_QUEUE.append(
+        FakeMessage(TOPIC + "/command", json.dumps({"state": "OFF", "correlation_id": 7}).encode())
+    )
+
+    bridge._process_queue(mqttclient)
+
+    [reply] = _published(mqttclient, TOPIC + "/response")
+    assert reply["correlation_id"] == 7
+    assert reply["status"] == STATUS_UNCHANGED
+    assert reply["connect_ms"] == reply["write_ms"] == 0
+    assert not light.power
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_mqtt5_reply_goes_to_the_response_topic(hass, enable_bluetooth, bridge):
+    """An MQTT v5 caller names the response topic and gets its correlation data back."""
+    bridge, light = bridge
+    sent = []
+
+    class _Client(FakeMqttClient):
+        def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+            sent.append((topic, payload, properties))
+            super().publish(topic, payload, qos, retain, properties)
+
+    message = FakeMessage(TOPIC + "/command", json.dumps({"state": "ON"}).encode())
+    message.properties = Properties(PacketTypes.PUBLISH)
+    message.properties.ResponseTopic = "caller/replies"
+    message.properties.CorrelationData = b"\x01\x02"
+    govee2mqtt.MESSAGE_QUEUE.append(message)
+
+    bridge._process_queue(_Client())
+    await _wait_for(lambda: any(topic == "caller/replies" for topic, _, _ in sent))
+
+    [(_, payload, properties)] = [entry for entry in sent if entry[0] == "caller/replies"]
+    assert json.loads(payload)["status"] == STATUS_ACKNOWLEDGED
+    assert "correlation_id" not in json.loads(payload)
+    assert properties.CorrelationData == b"\x01\x02"
+    assert light.power
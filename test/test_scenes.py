@@ -0,0 +1,193 @@
+"""Tests for capturing and activating scene snapshots."""
+import asyncio
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.scenes import STORAGE_KEY, SceneStore
+
+from .replay import FakeMessage, FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADAPTERS = {"A": "hci0", "B": "hci0", "C": "hci0", "D": "proxy"}
+
+
+class _Light:
+    """Scene client stand-in that records how many restores ran at once."""
+
+    def __init__(self, address, running, delivered=True, error=None):
+        self.address = address
+        self.delivered = delivered
+        self.error = error
+        self.restored = None
+        self._running = running
+
+    def Snapshot(self):
+        return {"model": "default", "values": {"state": 1}, "frames": [b"\x33\x01\x01", self.address.encode()]}
+
+    async def async_restore(self, values, frames, group=None):
+        self._running["now"] = self._running.get("now", 0) + 1
+        self._running["max"] = max(self._running.get("max", 0), self._running["now"])
+        await asyncio.sleep(0.01)
+        self._running["now"] -= 1
+        if self.error is not None:
+            raise self.error
+        self.restored = (values, frames)
+        return self.delivered
+
+
+class _Unacknowledged:
+    """A light that never acknowledged anything."""
+
+    def Snapshot(self):
+        return None
+
+
+@pytest.fixture
+def adapters():
+    """Spread the lights over two adapters by their first letter."""
+    with patch("custom_components.goveeble2mqtt.scenes.adapter_for", lambda _hass, address: ADAPTERS[address[0]]):
+        yield
+
+
+def _lights(running, **kwargs):
+    return {address: _Light(address, running, **kwargs.get(address, {})) for address in ("A1", "B1", "C1", "D1")}
+
+
+async def test_capture_groups_the_lights_by_adapter(hass, hass_storage, adapters):
+    """Lights without an acknowledged state are skipped."""
+    store = SceneStore(hass, wave_size=1)
+    clients = {**_lights({}), "E1": _Unacknowledged()}
+
+    result = store.capture("evening", clients)
+
+    assert result == {"scene": "evening", "lights": 4, "frames": 8, "skipped": ["E1"]}
+    assert store.get("evening").adapters == {"hci0": ["A1", "B1", "C1"], "proxy": ["D1"]}
+    assert store.as_dict()["evening"] == {
+        "lights": 4, "frames": 8, "adapters": {"hci0": 3, "proxy": 1}, "last_activation": None,
+    }
+
+
+async def test_snapshots_survive_a_restart(hass, hass_storage, adapters, caplog):
+    """Frames are stored as hex and restored as bytes, unreadable scenes are dropped."""
+    store = SceneStore(hass, wave_size=1)
+    store.capture("evening", _lights({}))
+    hass_storage[STORAGE_KEY] = {
+        "version": 1,
+        "key": STORAGE_KEY,
+        "data": {"scenes": {
+            "evening": store.get("evening").as_dict(),
+            "broken": {"lights": {"A1": {"frames": ["zz"]}}, "adapters": {}},
+        }},
+    }
+
+    restored = SceneStore(hass, wave_size=1)
+    await restored.async_load()
+
+    assert restored.get("evening").lights["D1"]["frames"] == [b"\x33\x01\x01", b"D1"]
+    assert restored.get("evening").adapters == store.get("evening").adapters
+    assert restored.get("broken") is None
+    assert "Dropping unreadable scene broken" in caplog.text
+
+
+async def test_activation_runs_adapters_at_once_and_waves_within_each(hass, hass_storage, adapters):
+    """One light per adapter restores at a time with a wave size of one."""
+    running = {}
+    lights = _lights(running)
+    store = SceneStore(hass, wave_size=1)
+    store.capture("evening", lights)
+
+    activation = await store.async_activate("evening", lambda address, model: lights[address])
+
+    assert running["max"] == 2
+    assert activation["lights"] == 4
+    assert activation["failed"] == []
+    assert set(activation["adapters_ms"]) == {"hci0", "proxy"}
+    assert activation["sync"] is None
+    assert lights["A1"].restored == ({"state": 1}, [b"\x33\x01\x01", b"A1"])
+    assert store.as_dict()["evening"]["last_activation"] == activation
+
+
+async def test_failed_lights_do_not_stop_the_others(hass, hass_storage, adapters, caplog):
+    """Undelivered and raising restores are reported as failed."""
+    caplog.set_level(logging.ERROR)
+    lights = _lights({}, B1={"delivered": False}, D1={"error": RuntimeError("gone")})
+    store = SceneStore(hass, wave_size=3)
+    store.capture("evening", lights)
+
+    activation = await store.async_activate("evening", lambda address, model: lights[address])
+
+    assert sorted(activation["failed"]) == ["B1", "D1"]
+    assert lights["C1"].restored is not None
+    assert "Failed to restore D1 for scene evening: gone" in caplog.text
+
+
+async def test_unknown_or_removed_scene_is_not_activated(hass, hass_storage, adapters):
+    """Removing a scene twice reports that it is gone."""
+    store = SceneStore(hass, wave_size=1)
+    store.capture("evening", _lights({}))
+
+    assert store.remove("evening")
+    assert not store.remove("evening")
+    assert await store.async_activate("evening", lambda address, model: None) is None
+    assert await store.async_activate("morning", lambda address, model: None) is None
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_bridge_restores_the_captured_state(hass, enable_bluetooth, hass_storage):
+    """Lights changed after the capture are put back by activating the scene."""
+    simulator = GoveeSimulator(connection_slots=2, connect_jitter=(0.01, 0.02), seed=1)
+    lights = [simulator.add_light(f"A4:C1:38:00:00:B{index}") for index in range(2)]
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "warmup_budget": 1,
+        "warmup_wave_size": 2,
+        "stream_timeout": 5,
+    }
+    bridge = govee2mqtt.Govee2Mqtt(hass)
+    bridge.client_class = simulator.client_class
+    bridge._mqttclient = mqttclient = FakeMqttClient()
+
+    def _command(light, payload):
+        govee2mqtt.MESSAGE_QUEUE.append(FakeMessage(light_topic(light.address, "default") + "/command", json.dumps(payload).encode()))
+        bridge._process_queue(mqttclient)
+
+    try:
+        for light in lights:
+            _command(light, {"state": "ON", "brightness": 255, "color": {"r": 255, "g": 0, "b": 0}})
+        await _wait_for(lambda: all(light.rgb == (255, 0, 0) and light.brightness == 100 for light in lights))
+        await _wait_for(lambda: not any(client.DirtyProperties for client in govee2mqtt.CLIENTS.values()))
+
+        # The third light was never used, it has no client to snapshot
+        captured = bridge.capture_scene("evening", [light.address for light in lights] + ["A4:C1:38:00:00:B9"])
+        assert (captured["lights"], captured["skipped"]) == (2, ["A4:C1:38:00:00:B9"])
+
+        for light in lights:
+            _command(light, {"state": "OFF"})
+        await _wait_for(lambda: not any(light.power for light in lights))
+
+        activation = await bridge.async_activate_scene("evening")
+
+        assert activation["failed"] == []
+        assert all(light.power and light.rgb == (255, 0, 0) and light.brightness == 100 for light in lights)
+    finally:
+        for client in govee2mqtt.CLIENTS.values():
+            client.Close()
+        govee2mqtt.CLIENTS.clear()
+        govee2mqtt.MESSAGE_QUEUE.clear()
+        await hass.async_block_till_done()
@@ -0,0 +1,144 @@
+"""Tests for the throttled state writes of light entities."""
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
+
+from homeassistant.util import dt as dt_util
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry, async_fire_time_changed_exact
+
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+from custom_components.goveeble2mqtt.state_writer import ThrottledStateWriter
+
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:A0"
+INTERVAL = 1.0
+TIMER_SLACK = 0.01
+
+
+class _Clock:
+    """Monotonic clock of the state writer module, advanced together with the loop timers."""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._started = dt_util.utcnow()
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        # The loop timer was scheduled a moment after the clock started
+        async_fire_time_changed_exact(self._hass, self._started + timedelta(seconds=self.now - 1000.0 + TIMER_SLACK))
+
+
+@pytest.fixture
+def clock(hass):
+    """Drive the write intervals by hand instead of sleeping through them."""
+    clock = _Clock(hass)
+    with patch("custom_components.goveeble2mqtt.state_writer.time", clock):
+        yield clock
+
+
+def _writer(hass, clock):
+    writes = []
+    return writes, ThrottledStateWriter(hass, lambda: writes.append(clock.monotonic()), INTERVAL)
+
+
+async def test_burst_is_written_once_per_interval(hass, clock):
+    """The first change is written at once, the rest of the burst when the interval ends."""
+    writes, writer = _writer(hass, clock)
+    started = clock.now
+
+    for _ in range(5):
+        writer.async_schedule()
+    assert writes == [started]
+
+    clock.advance(INTERVAL / 2)
+    writer.async_schedule()
+    assert writes == [started]
+
+    clock.advance(INTERVAL / 2)
+
+    assert writes == [started, started + INTERVAL]
+    assert (writer.requested, writer.written) == (6, 2)
+
+
+async def test_change_after_a_quiet_interval_is_written_at_once(hass, clock):
+    """Nothing is held back once an interval passed without writes."""
+    writes, writer = _writer(hass, clock)
+    writer.async_schedule()
+    clock.advance(INTERVAL * 3)
+
+    writer.async_schedule()
+
+    assert writes == [1000.0, clock.now]
+
+
+async def test_flush_writes_a_stale_state_early(hass, clock):
+    """A completed burst is shown right away, its timer no longer writes."""
+    writes, writer = _writer(hass, clock)
+    writer.async_schedule()
+    writer.async_schedule()
+    clock.advance(INTERVAL / 4)
+
+    writer.async_flush()
+    assert writes == [1000.0, clock.now]
+
+    # Nothing is stale, flushing again or the end of the interval writes nothing
+    writer.async_flush()
+    clock.advance(INTERVAL)
+    assert writer.written == 2
+
+
+async def test_cancel_drops_the_pending_write(hass, clock):
+    """A removed entity is not written."""
+    writes, writer = _writer(hass, clock)
+    writer.async_schedule()
+    writer.async_schedule()
+
+    writer.async_cancel()
+    writer.async_flush()
+    clock.advance(INTERVAL)
+
+    assert writes == [1000.0]
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_light_writes_its_final_state_once_the_burst_is_sent(hass, enable_bluetooth):
+    """The many dirty and clean marks of a command are coalesced, the flushed write shows the result."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light(ADDRESS)
+    controller = GoveeBluetoothController(hass, ADDRESS, client_class=simulator.client_class)
+    entry = MockConfigEntry(domain=DOMAIN, data={"address": ADDRESS, "model": "default", "name": "test"})
+    entity = HACSGoveeBleLight(hass, None, ADDRESS, None, entry, controller)
+    entity.hass = hass
+    entity.entity_id = "light.test"
+    hass.data.setdefault(DOMAIN, {}).update({"state_write_interval": 60, "debounce_window": 0})
+    written = []
+    entity.async_write_ha_state = lambda: written.append((entity.is_on, entity.brightness, entity.pending_frame_count()))
+    await entity.async_added_to_hass()
+
+    try:
+        await entity.async_turn_on(brightness=255, rgb_color=(255, 0, 0))
+        await _wait_for(lambda: light.rgb == (255, 0, 0) and not entity.pending_frame_count())
+        await _wait_for(lambda: written[-1][2] == 0)
+
+        writer = entity._state_writer
+        assert writer.written < writer.requested
+        assert written[-1][:2] == (True, 255)
+    finally:
+        await entity.async_will_remove_from_hass()
+        await controller.async_stop()
+        await hass.async_block_till_done()
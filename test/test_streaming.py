@@ -0,0 +1,153 @@
+"""Tests for the real-time color streaming mode."""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_ble_light import Client
+from custom_components.goveeble2mqtt.streaming import StreamSession, parse_stream_payload
+
+from .replay import FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:60"
+BASE = light_topic(ADDRESS, "default")
+
+
+class _Clock:
+    """Monotonic and wall clock of the streaming module, moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.wall = 1_700_000_000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.wall
+
+    def advance(self, seconds):
+        self.now += seconds
+        self.wall += seconds
+
+
+@pytest.fixture
+def clock():
+    """Let a stream go quiet without sleeping through its timeout."""
+    clock = _Clock()
+    with patch("custom_components.goveeble2mqtt.streaming.time", clock):
+        yield clock
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.parametrize(
+    ("payload", "expected"),
+    [
+        (bytes([255, 0, 16]), (255, 0, 16, None)),
+        (b'{"r": 1, "g": 2, "b": 3}', (1, 2, 3, None)),
+        (b'{"color": {"r": 1, "g": 2, "b": 3}, "ts": 1700000000.5}', (1, 2, 3, 1700000000.5)),
+    ],
+)
+def test_stream_payloads(payload, expected):
+    """Three raw bytes or a JSON color, with an optional sender timestamp."""
+    assert parse_stream_payload(payload) == expected
+
+
+@pytest.mark.parametrize("payload", [b'{"r": 256, "g": 0, "b": 0}', b'{"r": -1, "g": 0, "b": 0}', b'{"r": 1.5, "g": 0, "b": 0}'])
+def test_stream_payload_out_of_range_is_rejected(payload):
+    """Channels are whole bytes."""
+    with pytest.raises(ValueError):
+        parse_stream_payload(payload)
+
+
+def test_mailbox_keeps_only_the_newest_frame(clock):
+    """A frame that was not sent yet is replaced and counted as dropped."""
+    session = StreamSession(timeout=5)
+    session.offer((1, 0, 0))
+    session.offer((2, 0, 0))
+    clock.advance(0.5)
+    session.offer((3, 0, 0))
+
+    assert session.take() == ((3, 0, 0), clock.now)
+    assert session.take() is None
+    assert (session.received, session.replaced) == (3, 2)
+
+
+def test_sender_timestamp_moves_the_arrival_back(clock):
+    """Latency is measured from when the sender sent the frame, never from the future."""
+    session = StreamSession()
+    session.offer((1, 2, 3), sent_at=clock.wall - 0.25)
+    assert session.take() == ((1, 2, 3), clock.now - 0.25)
+
+    session.offer((1, 2, 3), sent_at=clock.wall + 10)
+    assert session.take() == ((1, 2, 3), clock.now)
+
+
+def test_session_expires_once_quiet_for_its_timeout(clock):
+    """A frame still in the mailbox keeps the session alive."""
+    session = StreamSession(timeout=2)
+    session.offer((1, 2, 3))
+    clock.advance(1.5)
+
+    assert session.remaining() == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert not session.expired
+    session.take()
+    assert session.expired
+    assert session.remaining() == 0
+
+
+def test_sent_frames_report_rate_and_latency(clock):
+    """The first frame seeds the latency average, later ones move the averages."""
+    session = StreamSession()
+    for latency in (0.02, 0.04):
+        session.offer((1, 2, 3))
+        received_at = session.take()[1]
+        clock.advance(latency)
+        session.record_sent((1, 2, 3), received_at)
+
+    stats = session.as_dict()
+    assert stats["sent"] == 2
+    assert stats["latency_ms"] == pytest.approx(22.0)
+    assert stats["max_latency_ms"] == pytest.approx(40.0)
+    # One frame every 40ms, smoothed from zero
+    assert stats["fps"] == pytest.approx(2.5)
+    assert session.last_sent == (1, 2, 3)
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_stream_ends_with_the_last_color_as_the_state(hass, enable_bluetooth):
+    """A burst of frames leaves the light on the newest one, the quiet stream reports and hands over."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light(ADDRESS)
+    mqttclient = FakeMqttClient()
+    client = Client(
+        hass, ADDRESS, "default", mqttclient, BASE + "/state", stream_timeout=0.2, client_class=simulator.client_class,
+    )
+
+    try:
+        for value in range(50):
+            client.Stream(value, 0, 255 - value)
+        assert client.Streaming
+        await _wait_for(lambda: not client.Streaming)
+
+        assert light.rgb == (49, 0, 206)
+        assert (client.R, client.G, client.B) == (49, 0, 206)
+        stats = [json.loads(payload) for topic, payload in mqttclient.published if topic == BASE + "/stream/stats"]
+        assert stats[-1]["received"] == 50
+        assert stats[-1]["sent"] + stats[-1]["dropped"] == 50
+        assert not stats[-1]["active"]
+        state = [json.loads(payload) for topic, payload in mqttclient.published if topic == BASE + "/state"]
+        assert state[-1]["color"] == {"r": 49, "g": 0, "b": 206}
+    finally:
+        client.Close()
+        await hass.async_block_till_done()
@@ -0,0 +1,135 @@
+"""Tests for releasing the final frames of a group of lights at one instant."""
+import asyncio
+import time
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.goveeble2mqtt.concurrency import INITIAL_LIMIT
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+from custom_components.goveeble2mqtt.synchronized import SyncGroup
+
+from .simulator import GoveeSimulator
+
+LEAD = 0.05
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_group_is_released_once_every_member_is_primed():
+    """No member is released before the last one is primed, then all get the same instant."""
+    group = SyncGroup(["a", "b", "c"], lead=LEAD)
+    first = asyncio.create_task(group.async_primed("a"))
+    second = asyncio.create_task(group.async_primed("b"))
+    await asyncio.sleep(0.05)
+
+    assert not first.done()
+    assert group.release_at is None
+
+    primed = time.monotonic()
+    release_at = await group.async_primed("c")
+
+    assert await first == await second == release_at
+    assert primed + LEAD <= release_at <= time.monotonic() + LEAD
+
+
+async def test_withdrawn_member_does_not_hold_the_group_back():
+    """A light that could not be primed drops out, the others are released without it."""
+    group = SyncGroup(["a", "b"], lead=LEAD)
+    waiting = asyncio.create_task(group.async_primed("a"))
+    await asyncio.sleep(0)
+
+    group.withdraw("b")
+
+    assert await waiting == group.release_at
+    assert group.as_dict()["withdrawn"] == 1
+
+
+async def test_straggler_is_left_behind_after_the_prime_timeout():
+    """The primed lights wait for a member that never reports at most the timeout."""
+    group = SyncGroup(["a", "b"], lead=LEAD, timeout=0.1)
+    started = time.monotonic()
+
+    release_at = await group.async_primed("a")
+
+    assert release_at - started >= 0.1 + LEAD
+    group.written("a", release_at)
+    assert not group.complete
+    group.withdraw("b")
+    assert group.complete
+
+
+def test_skew_is_reported_from_the_write_times():
+    """The skew is the spread of the last frames, lateness is measured from the release instant."""
+    group = SyncGroup(["a", "b", "c"], lead=LEAD)
+    group._release()
+
+    group.written("a", group.release_at + 0.001)
+    group.written("b", group.release_at + 0.004)
+    group.withdraw("c")
+    # A member that wrote its frame is not withdrawn afterwards
+    group.withdraw("a")
+
+    result = group.as_dict()
+    assert result["lights"] == 3
+    assert result["written"] == 2
+    assert result["withdrawn"] == 1
+    assert result["skew_ms"] == 3.0
+    assert result["late_ms"] == 4.0
+    assert group.complete
+
+
+def test_unreleased_group_reports_no_skew():
+    """Nothing written, nothing to measure."""
+    result = SyncGroup(["a"]).as_dict()
+
+    assert result["skew_ms"] is None
+    assert result["late_ms"] is None
+    assert result["prime_ms"] is None
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+@pytest.mark.parametrize("synchronized", [True, False])
+async def test_configured_controller_releases_a_group_toggle_together(hass, enable_bluetooth, synchronized):
+    """With the synchronized option the lights turned on together form one group and report its skew."""
+    hass.data[DOMAIN] = {"synchronized": synchronized}
+    simulator = GoveeSimulator(connection_slots=INITIAL_LIMIT, connect_jitter=(0.01, 0.2), seed=1)
+    # As many lights as a new adapter connects at once, they start together
+    lights = simulator.add_fleet(INITIAL_LIMIT)
+    controller = GoveeBluetoothController(hass, "A4:C1:38:00:00:00", client_class=simulator.client_class)
+    entities = [
+        HACSGoveeBleLight(
+            hass, None, light.address, None,
+            MockConfigEntry(domain=DOMAIN, data={"address": light.address, "model": "default", "name": light.address}),
+            controller,
+        )
+        for light in lights
+    ]
+
+    try:
+        for entity in entities:
+            await entity.async_turn_on()
+        await _wait_for(lambda: all(light.power for light in lights))
+
+        sync = controller.as_dict()["sync"]
+        if not synchronized:
+            assert sync is None
+            return
+        await _wait_for(lambda: controller.as_dict()["sync"]["groups"] == 1)
+        sync = controller.as_dict()["sync"]
+        assert sync["last"]["lights"] == INITIAL_LIMIT
+        assert sync["last"]["written"] == INITIAL_LIMIT
+        # Connects spread over 200ms, the frames do not
+        assert sync["max_skew_ms"] < 50
+    finally:
+        await controller.async_stop()
+        for entity in entities:
+            controller.unregister_light(entity)
+        await hass.async_block_till_done()
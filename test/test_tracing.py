@@ -0,0 +1,141 @@
+"""Tests for the per-device event tracing."""
+import asyncio
+import logging
+from unittest.mock import patch
+
+from bleak.exc import BleakError
+import pytest
+
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_ble_light import Client
+from custom_components.goveeble2mqtt.tracing import TRACER, Tracer
+
+from .replay import FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:90"
+
+
+class _Clock:
+    """Monotonic and wall clock of the tracing module, moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.wall = 1_700_000_000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.wall
+
+    def advance(self, seconds):
+        self.now += seconds
+        self.wall += seconds
+
+
+@pytest.fixture
+def clock():
+    """Let summary intervals elapse without sleeping through them."""
+    clock = _Clock()
+    with patch("custom_components.goveeble2mqtt.tracing.time", clock):
+        yield clock
+
+
+@pytest.fixture
+def tracer(clock):
+    """Return an enabled tracer."""
+    tracer = Tracer(buffer_size=3, summary_interval=60)
+    tracer.enabled = True
+    return tracer
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_disabled_tracer_records_nothing(clock):
+    """Tracing is off until enabled."""
+    tracer = Tracer()
+    tracer.event(ADDRESS, "connect")
+
+    assert tracer.dump() == {}
+
+
+def test_buffer_keeps_the_latest_events_of_each_device(tracer, clock):
+    """Old events fall out of a full buffer, other devices keep theirs."""
+    for index in range(5):
+        tracer.event(ADDRESS, "send", index=index)
+        clock.advance(1)
+    tracer.event("A4:C1:38:00:00:91", "connect")
+
+    events = tracer.dump(ADDRESS)[ADDRESS]
+    assert [event["index"] for event in events] == [2, 3, 4]
+    assert events[0] == {"time": 1_700_000_002.0, "event": "send", "index": 2}
+    assert list(tracer.dump()) == [ADDRESS, "A4:C1:38:00:00:91"]
+    assert tracer.dump("A4:C1:38:00:00:92") == {"A4:C1:38:00:00:92": []}
+
+
+def test_dump_makes_the_fields_json_friendly(tracer):
+    """Frames are hex, anything else that is not plain data becomes its string."""
+    tracer.event(ADDRESS, "write_failed", frame=bytearray(b"\x33\x01\x01"), error=BleakError("gone"), payload={"state": "ON"})
+
+    [event] = tracer.dump(ADDRESS)[ADDRESS]
+    assert event["frame"] == "330101"
+    assert event["error"] == "gone"
+    assert event["payload"] == {"state": "ON"}
+
+
+def test_summary_is_logged_once_per_interval(tracer, clock, caplog):
+    """The main log gets the event counts since the last summary, not the events."""
+    caplog.set_level(logging.INFO, logger="custom_components.goveeble2mqtt.tracing")
+    tracer.event(ADDRESS, "send")
+    tracer.event(ADDRESS, "send")
+    clock.advance(59)
+    tracer.event(ADDRESS, "connect")
+    assert not caplog.records
+
+    clock.advance(1)
+    tracer.event(ADDRESS, "send")
+    [record] = caplog.records
+    assert record.getMessage() == "Trace summary for the last 60s over 1 devices: connect=1, send=3"
+
+    caplog.clear()
+    clock.advance(60)
+    tracer.event(ADDRESS, "unacked")
+    assert caplog.records[0].getMessage().endswith(": unacked=1")
+
+
+def test_clear_drops_every_event(tracer):
+    """Cleared devices are gone from the dump."""
+    tracer.event(ADDRESS, "connect")
+    tracer.clear()
+
+    assert tracer.dump() == {}
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_light_traces_its_connection_and_frames(hass, enable_bluetooth):
+    """A command leaves its connection, the frames sent and the published state in the trace."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light(ADDRESS)
+    topic = light_topic(ADDRESS, "default") + "/state"
+    TRACER.enabled = True
+    client = Client(hass, ADDRESS, "default", FakeMqttClient(), topic, client_class=simulator.client_class)
+
+    try:
+        client.SetPower(1)
+        await _wait_for(lambda: light.power and not client.DirtyProperties)
+
+        events = [event["event"] for event in TRACER.dump(ADDRESS)[ADDRESS]]
+        assert events.index("connect") < events.index("connected") < events.index("send")
+        [frame] = [event["frame"] for event in TRACER.dump(ADDRESS)[ADDRESS] if event["event"] == "send"]
+        assert frame.startswith("3301")
+    finally:
+        TRACER.enabled = False
+        TRACER.clear()
+        client.Close()
+        await hass.async_block_till_done()
@@ -0,0 +1,126 @@
+"""Tests for the BLE transport shared by the light entities and the MQTT bridge."""
+import asyncio
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_ble_light import Client
+from custom_components.goveeble2mqtt.govee_controller import GoveeBluetoothController
+from custom_components.goveeble2mqtt.light import HACSGoveeBleLight
+from custom_components.goveeble2mqtt.transport import get_transport
+
+from .replay import FakeMqttClient
+from .simulator import GoveeSimulator
+
+ADDRESS = "A4:C1:38:00:00:01"
+
+
+async def _wait_for(condition, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_mqtt_and_entity_share_one_connection(hass, enable_bluetooth):
+    """A light behind both front ends is connected once and takes commands from both."""
+    # A single connection slot makes a second stack fail to connect
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    simulated = simulator.add_light(ADDRESS)
+
+    controller = GoveeBluetoothController(hass, ADDRESS, client_class=simulator.client_class)
+    entry = MockConfigEntry(domain=DOMAIN, data={"address": ADDRESS, "model": "default", "name": "test"})
+    entity = HACSGoveeBleLight(hass, None, ADDRESS, None, entry, controller)
+
+    mqttclient = FakeMqttClient()
+    client = Client(
+        hass, ADDRESS, "default", mqttclient, light_topic(ADDRESS, "default") + "/state",
+        client_class=simulator.client_class,
+    )
+
+    try:
+        # MQTT path
+        client.SetPower(1)
+        await _wait_for(lambda: simulated.power)
+
+        # Entity path, over the connection the bridge opened
+        await entity.async_turn_on(brightness=128)
+        await _wait_for(lambda: not entity.is_dirty())
+
+        # Back to the MQTT path
+        link = get_transport(hass).get(ADDRESS)
+        client.SetPower(0)
+        await _wait_for(lambda: not simulated.power and not link.tracker.in_flight)
+
+        assert link.users == {client, controller}
+        assert link.connects == 1
+        assert simulator.stats["connects"] == 1
+        assert simulator.stats["no_slot"] == 0
+        assert simulated.brightness == 51
+        assert entity.client is link.client
+    finally:
+        client.Close()
+        await controller.async_stop()
+        controller.unregister_light(entity)
+        await hass.async_block_till_done()
+
+    # The last front end to let go closes the connection
+    assert get_transport(hass).get(ADDRESS) is None
+    assert simulator.connected["default"] == set()
+
+
+class _CountingEvent(asyncio.Event):
+    """An event that counts how often it was set."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sets = 0
+
+    def set(self) -> None:
+        self.sets += 1
+        super().set()
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+@pytest.mark.parametrize("bridge_first", [True, False])
+async def test_advertisement_wakes_both_front_ends(hass, enable_bluetooth, bridge_first):
+    """An advertisement ending an open breaker wakes the bridge and the entity, whichever heard it."""
+    simulator = GoveeSimulator(connection_slots=1, seed=1)
+    simulator.add_light(ADDRESS)
+
+    controller = GoveeBluetoothController(hass, ADDRESS, client_class=simulator.client_class)
+    entry = MockConfigEntry(domain=DOMAIN, data={"address": ADDRESS, "model": "default", "name": "test"})
+    entity = HACSGoveeBleLight(hass, None, ADDRESS, None, entry, controller)
+    client = Client(
+        hass, ADDRESS, "default", FakeMqttClient(), light_topic(ADDRESS, "default") + "/state",
+        client_class=simulator.client_class,
+    )
+    client._advertised = _CountingEvent()
+    queued = []
+    controller.queue_update = queued.append
+
+    try:
+        link = get_transport(hass).get(ADDRESS)
+        while not link.breaker.is_open:
+            link.breaker.record_failure()
+        entity._mark_dirty("state", True)
+
+        # Both front ends hear the same advertisement, only one moves the breaker
+        if bridge_first:
+            client._onAdvertisement(None, None)
+            controller._on_advertisement(entity)
+        else:
+            controller._on_advertisement(entity)
+            client._onAdvertisement(None, None)
+
+        assert link.breaker.is_probe
+        assert client._advertised.sets == 1
+        assert queued == [entity]
+    finally:
+        client.Close()
+        await controller.async_stop()
+        controller.unregister_light(entity)
+        await hass.async_block_till_done()
@@ -0,0 +1,85 @@
+"""Tests for the staggered warm-up of the configured lights."""
+import asyncio
+import time
+
+import pytest
+
+from custom_components.goveeble2mqtt import govee2mqtt
+from custom_components.goveeble2mqtt.const import DOMAIN
+from custom_components.goveeble2mqtt.discovery import light_topic
+from custom_components.goveeble2mqtt.govee_ble_light import Client
+
+from .replay import FakeMqttClient
+from .simulator import GoveeSimulator
+
+LIGHTS = 12
+WAVE_SIZE = 3
+BUDGET = 2.0
+
+
+# The bluetooth scanner schedules its device expiry past the end of the test
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_configured_lights_connect_one_wave_at_a_time(hass, enable_bluetooth):
+    """Every configured light connects in its own wave's slot, not as soon as its client exists."""
+    simulator = GoveeSimulator(connection_slots=LIGHTS, connect_jitter=(0.01, 0.02), seed=1)
+    lights = simulator.add_fleet(LIGHTS)
+    connected_at = []
+
+    class _RecordingClient(simulator.client_class):
+        async def connect(self, **kwargs):
+            result = await super().connect(**kwargs)
+            connected_at.append(time.monotonic())
+            return result
+
+    hass.data[DOMAIN] = {
+        "mqtt_ip": "localhost",
+        "mqtt_port": 1883,
+        "mqtt_user": None,
+        "mqtt_password": None,
+        "devices": [{"address": light.address, "model": "default", "name": light.address} for light in lights],
+        "warmup_budget": BUDGET,
+        "warmup_wave_size": WAVE_SIZE,
+        "stream_timeout": 5,
+    }
+    bridge = govee2mqtt.Govee2Mqtt(hass)
+    bridge.client_class = _RecordingClient
+
+    try:
+        started = time.monotonic()
+        await bridge._async_warm_up(FakeMqttClient())
+        # Clients connect on their own only after warm-up reached them
+        await asyncio.sleep(1)
+
+        slot = BUDGET / (LIGHTS // WAVE_SIZE)
+        per_wave = [0] * (LIGHTS // WAVE_SIZE)
+        for connected in connected_at:
+            per_wave[min(int((connected - started) / slot), len(per_wave) - 1)] += 1
+        assert per_wave == [WAVE_SIZE] * (LIGHTS // WAVE_SIZE)
+    finally:
+        for client in govee2mqtt.CLIENTS.values():
+            client.Close()
+        govee2mqtt.CLIENTS.clear()
+        await hass.async_block_till_done()
+
+
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_command_starts_a_light_warm_up_has_not_reached(hass, enable_bluetooth):
+    """A deferred client connects for its first command without waiting for its wave."""
+    simulator = GoveeSimulator(connection_slots=1, connect_jitter=(0.01, 0.02), seed=1)
+    light = simulator.add_light("A4:C1:38:00:00:03")
+    client = Client(
+        hass, light.address, "default", FakeMqttClient(), light_topic(light.address, "default") + "/state",
+        client_class=simulator.client_class, deferred=True,
+    )
+
+    try:
+        await asyncio.sleep(1)
+        assert simulator.stats["connects"] == 0
+
+        client.SetPower(1)
+        async with asyncio.timeout(5):
+            while not light.power:
+                await asyncio.sleep(0.01)
+    finally:
+        client.Close()
+        await hass.async_block_till_done()